@@ -1,65 +1,152 @@
 from __future__ import annotations
 import os
-import pandas as pd
+import time
+from io import BytesIO
 import streamlit as st
-import asyncio
-from core.utils import async_process_dataframe, to_excel_bytes
+from core.utils import (
+    EXPORT_FORMATS,
+    INPUT_FORMATS,
+    RESULT_COLUMNS,
+    ExportCache,
+    async_process_incremental,
+    input_format,
+    read_columns,
+    read_preview,
+)
+from core.jobs import JobManager
 from core import db
+from core.cache import CacheBackend, open_cache
+
+# seconds between progress refreshes while a job is running
+POLL_INTERVAL = 0.5
+
+
+@st.cache_resource
+def get_job_manager() -> JobManager:
+    """Process-wide job manager shared by all sessions and reruns."""
+    return JobManager()
+
+
+@st.cache_resource
+def get_connections() -> db.ConnectionManager:
+    """Process-wide cache connections; the schema is set up only once."""
+    return db.ConnectionManager()
+
+
+@st.cache_resource
+def get_shared_cache() -> CacheBackend | None:
+    """Cache shared by all app instances (``FURIGANA_CACHE_URL``), if any."""
+    return open_cache(os.getenv("FURIGANA_CACHE_URL"))
 
-EXCEL_MIME = (
-    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-)
 
 st.set_page_config(page_title="Furigana Checker")
 st.title("Excel フリガナ信頼度チェッカー")
-DB_CONN = db.init_db()
+jobs = get_job_manager()
+connections = get_connections()
+shared_cache = get_shared_cache()
 
 if not os.getenv("OPENAI_API_KEY"):
     st.warning("OPENAI_API_KEY環境変数が設定されていません")
 
-uploaded = st.file_uploader("Excelを選択", type=["xlsx"])
+uploaded = st.file_uploader(
+    "Excel / CSV / Parquet を選択", type=list(INPUT_FORMATS)
+)
 
-if "df" not in st.session_state and uploaded:
-    st.session_state.template_bytes = uploaded.getvalue()
-    st.session_state.df = pd.read_excel(uploaded)
+if "preview" not in st.session_state and uploaded:
+    # only the header and a few rows are parsed until the analysis starts
+    st.session_state.source_bytes = uploaded.getvalue()
+    st.session_state.source_name = uploaded.name
+    st.session_state.source_format = input_format(uploaded)
+    if st.session_state.source_format == "xlsx":
+        st.session_state.template_bytes = st.session_state.source_bytes
+    st.session_state.preview = read_preview(
+        BytesIO(st.session_state.source_bytes), fmt=st.session_state.source_format
+    )
 
-if "df" in st.session_state:
-    df = st.session_state.df
+if "preview" in st.session_state:
+    preview = st.session_state.preview
     st.write("アップロードしたデータ:")
-    st.dataframe(df.head())
+    st.dataframe(preview)
 
-    columns = list(df.columns)
+    columns = list(preview.columns)
     name_col = st.selectbox("名前列を選択", columns, key="name_col")
     furi_col = st.selectbox("フリガナ列を選択", columns, key="furi_col")
 
-    if st.button("解析実行"):
-        progress = st.progress(0.0)
-
-        def on_progress(done: int, total: int) -> None:
-            progress.progress(done / total)
-
-        with st.spinner("解析中..."):
-            out_df = asyncio.run(
-                async_process_dataframe(
-                    df,
-                    name_col,
-                    furi_col,
-                    on_progress,
-                    db_conn=DB_CONN,
-                    concurrency=10,
-                )
+    source_bytes = st.session_state.source_bytes
+    source_format = st.session_state.source_format
+    # re-uploads of the same file only re-check rows changed since last run
+    manifest_key = f"{st.session_state.source_name}|{name_col}|{furi_col}"
+    # result columns are appended to the uploaded workbook unless it already
+    # has them, in which case the whole sheet must be rewritten
+    append = not set(RESULT_COLUMNS) & set(columns)
+    load_columns = list(dict.fromkeys([name_col, furi_col]))
+
+    def load_source():
+        # exports that rewrite the whole table need every input column
+        return read_columns(BytesIO(source_bytes), None, fmt=source_format)
+
+    def run_job(on_progress):
+        # runs on the job thread: the pipeline only needs the selected columns
+        df = read_columns(BytesIO(source_bytes), load_columns, fmt=source_format)
+        return async_process_incremental(
+            df,
+            name_col,
+            furi_col,
+            manifest_key,
+            # each job thread gets its own connection from the manager
+            connections.connection(),
+            on_progress,
+            concurrency=10,
+            # verdicts and candidates go to the shared store when configured;
+            # the run manifests stay in the local file
+            cache=shared_cache,
+        )
+
+    job = jobs.get(st.session_state.get("job_id"))
+    if st.button("解析実行", disabled=bool(job and job.running)):
+        job = jobs.submit(run_job)
+        st.session_state.job_id = job.id
+        st.session_state.pop("out_df", None)
+        st.session_state.pop("exports", None)
+
+    if job and job.running:
+        st.progress(job.fraction, text=f"解析中... {job.done}/{job.total}")
+        if st.button("キャンセル"):
+            job.cancel()
+        time.sleep(POLL_INTERVAL)
+        st.rerun()
+    elif job and job.status == "done":
+        st.session_state.out_df = job.result
+        exports = st.session_state.get("exports")
+        if exports is None or exports.key != job.id:
+            # artifacts are encoded once per result, not on every rerun
+            st.session_state.exports = ExportCache(
+                job.id,
+                job.result,
+                template_bytes=st.session_state.get("template_bytes"),
+                append=append,
+                source=load_source,
             )
-        progress.empty()
-        st.session_state.out_df = out_df
+    elif job and job.status == "cancelled":
+        st.info("解析をキャンセルしました")
+    elif job and job.status == "error":
+        st.error(f"解析に失敗しました: {job.error}")
 
 if "out_df" in st.session_state:
     st.write("結果プレビュー:")
     st.dataframe(st.session_state.out_df.head())
-    tmpl = st.session_state.get("template_bytes")
-    bytes_data = to_excel_bytes(st.session_state.out_df, template_bytes=tmpl)
-    st.download_button(
-        label="保存してダウンロード",
-        data=bytes_data,
-        file_name="判定結果.xlsx",
-        mime=EXCEL_MIME,
+    exports = st.session_state.exports
+    fmt = st.radio(
+        "出力形式",
+        list(EXPORT_FORMATS),
+        horizontal=True,
+        help="大きなファイルは CSV / Parquet の方が高速です",
     )
+    ext, mime = EXPORT_FORMATS[fmt]
+    if fmt in exports or st.button("ダウンロード用ファイルを作成"):
+        st.download_button(
+            label="保存してダウンロード",
+            data=exports.get(fmt),
+            file_name=f"判定結果.{ext}",
+            mime=mime,
+        )
@@ -0,0 +1,375 @@
+from __future__ import annotations
+import json
+import socket
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Iterable, Optional
+from urllib.parse import urlsplit
+
+from . import db
+
+# ``(name, reading)`` -> ``(confidence, reason)``
+Verdicts = dict[tuple[str, str], tuple[int, str]]
+
+
+class CacheBackend(ABC):
+    """Bulk get/put interface of the verdict, candidate and Sudachi caches.
+
+    The pipeline only talks to this interface, so the SQLite file can be
+    swapped for a store shared by several app instances.  Backends must be
+    safe to use from several threads and picklable, so the sharded first
+    pass can read them from worker processes (see :meth:`worker_cache`).
+    Backends missing one of the abstract methods cannot be instantiated.
+    """
+
+    @abstractmethod
+    def get_readings(
+        self, keys: Iterable[tuple[str, str]], version: db.Version
+    ) -> Verdicts:
+        """Return the cached verdicts of ``version`` found for ``keys``."""
+
+    @abstractmethod
+    def put_readings(
+        self,
+        rows: Iterable[tuple[str, str, int, str]],
+        version: db.Version,
+        source: str = "",
+    ) -> None:
+        """Store ``(name, reading, confidence, reason)`` verdicts."""
+
+    def touch_readings(self, keys: Iterable[tuple[str, str]]) -> None:
+        """Mark cache hits as recently used (no-op unless the backend evicts)."""
+
+    @abstractmethod
+    def get_candidates(
+        self, names: Iterable[str], version: db.Version
+    ) -> dict[str, list[str]]:
+        """Return the cached candidate lists of ``version`` found for ``names``."""
+
+    @abstractmethod
+    def put_candidates(
+        self, rows: Iterable[tuple[str, list[str]]], version: db.Version
+    ) -> None:
+        """Store ``(name, candidates)`` lists."""
+
+    @abstractmethod
+    def get_sudachi(self, names: Iterable[str]) -> dict[str, Optional[str]]:
+        """Return stored Sudachi readings (``None`` if Sudachi had none)."""
+
+    @abstractmethod
+    def put_sudachi(self, rows: Iterable[tuple[str, Optional[str]]]) -> None:
+        """Store ``(name, Sudachi reading)`` pairs."""
+
+    def worker_cache(self) -> CacheBackend | None:
+        """Return a read view for worker processes or ``None`` if unavailable."""
+        return self
+
+    def close(self) -> None:
+        """Release connections opened by the backend."""
+
+
+class SQLiteCache(CacheBackend):
+    """Cache kept in a SQLite connection created by :func:`core.db.init_db`.
+
+    The connection stays owned by the caller and is used from the calling
+    thread only, as before.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, read_only: bool = False):
+        self.conn = conn
+        self.read_only = read_only
+
+    def get_readings(self, keys, version):
+        return db.get_many_readings(keys, self.conn, version)
+
+    def put_readings(self, rows, version, source=""):
+        db.save_many_readings(rows, self.conn, version, source)
+
+    def touch_readings(self, keys):
+        db.touch_readings(keys, self.conn)
+
+    def get_candidates(self, names, version):
+        return db.get_many_candidates(
+            names, self.conn, version, touch=not self.read_only
+        )
+
+    def put_candidates(self, rows, version):
+        db.save_many_candidates(rows, self.conn, version)
+
+    def get_sudachi(self, names):
+        return db.get_sudachi_readings(names, self.conn, touch=not self.read_only)
+
+    def put_sudachi(self, rows):
+        db.save_sudachi_readings(rows, self.conn)
+
+    def worker_cache(self):
+        # in-memory databases cannot be opened by another process
+        path = self.conn.execute("PRAGMA database_list").fetchone()[2]
+        return _SQLiteFile(path) if path else None
+
+    def close(self) -> None:
+        if self.read_only:
+            self.conn.close()
+
+
+class _SQLiteFile:
+    """Picklable reference opening a read-only :class:`SQLiteCache`."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __reduce__(self):
+        return _open_read_only, (self.path,)
+
+
+def _open_read_only(path: str) -> SQLiteCache:
+    return SQLiteCache(
+        sqlite3.connect(f"file:{path}?mode=ro", uri=True), read_only=True
+    )
+
+
+class MemoryCache(CacheBackend):
+    """Process-local cache in plain dictionaries, e.g. for tests or demos."""
+
+    def __init__(self):
+        self.readings: dict[tuple, tuple[int, str, str]] = {}
+        self.candidates: dict[tuple, list[str]] = {}
+        self.sudachi: dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get_readings(self, keys, version):
+        with self._lock:
+            found: Verdicts = {}
+            for name, reading in keys:
+                hit = self.readings.get((*version, name, reading))
+                if hit:
+                    found[(name, reading)] = hit[:2]
+            return found
+
+    def put_readings(self, rows, version, source=""):
+        with self._lock:
+            for name, reading, conf, reason in rows:
+                self.readings[(*version, name, reading)] = (int(conf), reason, source)
+
+    def get_candidates(self, names, version):
+        with self._lock:
+            return {
+                n: list(self.candidates[(*version, n)])
+                for n in names
+                if (*version, n) in self.candidates
+            }
+
+    def put_candidates(self, rows, version):
+        with self._lock:
+            for name, cands in rows:
+                self.candidates[(*version, name)] = list(cands)
+
+    def get_sudachi(self, names):
+        with self._lock:
+            return {n: self.sudachi[n] for n in names if n in self.sudachi}
+
+    def put_sudachi(self, rows):
+        with self._lock:
+            self.sudachi.update(rows)
+
+
+class RespError(Exception):
+    """Error reply of a Redis-protocol server."""
+
+
+def _encode(*args: str | bytes | int) -> bytes:
+    out = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, int):
+            arg = str(arg)
+        if isinstance(arg, str):
+            arg = arg.encode("utf-8")
+        out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(out)
+
+
+def _read_reply(f) -> Any:
+    line = f.readline()
+    if not line:
+        raise ConnectionError("connection closed by the cache server")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        raise RespError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        size = int(rest)
+        if size < 0:
+            return None
+        data = f.read(size + 2)
+        return data[:-2]
+    if kind == b"*":
+        size = int(rest)
+        return None if size < 0 else [_read_reply(f) for _ in range(size)]
+    raise ConnectionError(f"invalid reply from the cache server: {line!r}")
+
+
+class KVCache(CacheBackend):
+    """Cache in a networked key-value store speaking the Redis protocol.
+
+    All app instances pointing at the same server share one warm cache and
+    no file locks are involved.  Entries are JSON values under readable keys
+    prefixed with ``prefix``; with ``ttl`` (seconds) they expire, otherwise
+    eviction is left to the server's memory policy.  Each thread keeps its
+    own connection and commands of one call are pipelined.  Only the
+    standard library is used (``MGET``/``MSET``/``SET ... EX``).
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 6379,
+        prefix: str = "furigana",
+        ttl: int | None = None,
+        timeout: float = 5.0,
+        chunk_size: int = 500,
+    ):
+        self.host = host
+        self.port = port
+        self.prefix = prefix
+        self.ttl = ttl
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self._local = threading.local()
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _file(self):
+        f = getattr(self._local, "file", None)
+        if f is None:
+            sock = socket.create_connection((self.host, self.port), self.timeout)
+            f = self._local.file = sock.makefile("rwb")
+            sock.close()  # the file object keeps the socket open
+        return f
+
+    def _execute(self, commands: list[tuple]) -> list[Any]:
+        """Send ``commands`` in one pipeline and return their replies."""
+        if not commands:
+            return []
+        f = self._file()
+        replies: list[Any] = []
+        error = None
+        try:
+            f.write(b"".join(_encode(*c) for c in commands))
+            f.flush()
+            for _ in commands:
+                # read every reply so the connection stays in sync
+                try:
+                    replies.append(_read_reply(f))
+                except RespError as exc:
+                    error = error or exc
+                    replies.append(None)
+        except (OSError, ConnectionError):
+            self.close()
+            raise
+        if error:
+            raise error
+        return replies
+
+    def _key(self, kind: str, *parts: Any) -> str:
+        return f"{self.prefix}:{kind}:" + json.dumps(parts, ensure_ascii=False)
+
+    def _mget(self, keys: list[str]) -> list[Any]:
+        commands = [
+            ("MGET", *keys[i:i + self.chunk_size])
+            for i in range(0, len(keys), self.chunk_size)
+        ]
+        values = []
+        for reply in self._execute(commands):
+            values.extend(None if v is None else json.loads(v) for v in reply)
+        return values
+
+    def _mset(self, items: list[tuple[str, Any]]) -> None:
+        values = [(k, json.dumps(v, ensure_ascii=False)) for k, v in items]
+        if self.ttl:
+            commands = [("SET", k, v, "EX", self.ttl) for k, v in values]
+        else:
+            commands = [
+                ("MSET", *(x for kv in values[i:i + self.chunk_size] for x in kv))
+                for i in range(0, len(values), self.chunk_size)
+            ]
+        self._execute(commands)
+
+    def ping(self) -> bool:
+        return self._execute([("PING",)]) == ["PONG"]
+
+    def get_readings(self, keys, version):
+        keys = list(dict.fromkeys(keys))
+        values = self._mget([self._key("r", *version, n, r) for n, r in keys])
+        return {k: (v[0], v[1]) for k, v in zip(keys, values) if v}
+
+    def put_readings(self, rows, version, source=""):
+        self._mset([
+            (self._key("r", *version, n, r), [int(c), reason, source])
+            for n, r, c, reason in rows
+        ])
+
+    def get_candidates(self, names, version):
+        names = list(dict.fromkeys(names))
+        values = self._mget([self._key("c", *version, n) for n in names])
+        return {n: v for n, v in zip(names, values) if v is not None}
+
+    def put_candidates(self, rows, version):
+        self._mset([(self._key("c", *version, n), list(c)) for n, c in rows])
+
+    def get_sudachi(self, names):
+        names = list(dict.fromkeys(names))
+        # Sudachi finding no reading is stored as [null]
+        values = self._mget([self._key("s", n) for n in names])
+        return {n: v[0] for n, v in zip(names, values) if v is not None}
+
+    def put_sudachi(self, rows):
+        self._mset([(self._key("s", n), [r]) for n, r in rows])
+
+    def close(self) -> None:
+        f = getattr(self._local, "file", None)
+        if f is not None:
+            self._local.file = None
+            f.close()
+
+
+def open_cache(url: str | None) -> CacheBackend | None:
+    """Return the shared cache configured by ``url`` or ``None``.
+
+    ``memory://`` selects a :class:`MemoryCache` and
+    ``redis://host:port/prefix`` a :class:`KVCache` (``?ttl=seconds``
+    enables expiry).  Without a URL callers keep the SQLite cache.
+    """
+    if not url:
+        return None
+    parts = urlsplit(url)
+    if parts.scheme == "memory":
+        return MemoryCache()
+    if parts.scheme == "redis":
+        query = dict(p.split("=", 1) for p in parts.query.split("&") if "=" in p)
+        return KVCache(
+            parts.hostname or "127.0.0.1",
+            parts.port or 6379,
+            prefix=parts.path.strip("/") or "furigana",
+            ttl=int(query["ttl"]) if "ttl" in query else None,
+        )
+    raise ValueError(f"unsupported cache URL: {url}")
@@ -0,0 +1,123 @@
+from __future__ import annotations
+import json
+import subprocess
+import sys
+import time
+import urllib.request
+import warnings
+from pathlib import Path
+from typing import Any
+
+from .db import cache_path
+
+# Kept free of pandas/Sudachi imports so one-off CLI checks start instantly.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# confidence from which a verdict is reported as "success" (first candidate)
+SUCCESS_CONFIDENCE = 85
+
+
+def scorer_response(result: dict[str, Any]) -> dict[str, Any]:
+    """Return a service result in the ``Scorer`` response layout.
+
+    Dictionary and first-candidate matches are reported as ``success``,
+    lower-ranked matches as ``warning`` and misses as ``error``.
+    """
+    conf = result["confidence"]
+    if conf >= SUCCESS_CONFIDENCE:
+        status = "success"
+    elif conf > 0:
+        status = "warning"
+    else:
+        status = "error"
+    return {
+        "status": status,
+        "message": result["reason"],
+        "input_kanji": result["name"],
+        "input_furigana": result["reading"],
+        "confidence": conf,
+        "latency_ms": result["latency_ms"],
+    }
+
+
+def stats(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> dict[str, Any]:
+    """Return the counters (and cache file) reported by a running service."""
+    with urllib.request.urlopen(f"http://{host}:{port}/stats", timeout=5) as res:
+        return json.loads(res.read())
+
+
+def ping(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> bool:
+    """Return ``True`` if a check service answers on ``host:port``."""
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}/stats", timeout=1):
+            return True
+    except OSError:
+        return False
+
+
+def ensure_daemon(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    idle_timeout: float = 600,
+    args: list[str] | None = None,
+    wait: float = 60,
+    db_path: str | Path | None = None,
+) -> bool:
+    """Start ``scripts.serve`` in the background unless it is already running.
+
+    The daemon detaches from the caller and exits after ``idle_timeout``
+    seconds without requests.  It opens the cache at ``db_path`` (default:
+    ``FURIGANA_DB``) resolved against the caller's working directory; a
+    running daemon using another cache file is kept and a warning issued.
+    ``args`` are passed on to ``scripts.serve``.  Waits up to ``wait``
+    seconds for the dictionary to load and returns ``True`` if a new daemon
+    was started.
+    """
+    path = str(cache_path(db_path))
+    if ping(host, port):
+        running = stats(host, port).get("db")
+        if db_path is not None and running != path:
+            warnings.warn(
+                f"check service on {host}:{port} uses the cache {running}, "
+                f"not {path}",
+                stacklevel=2,
+            )
+        return False
+    cmd = [
+        sys.executable, "-m", "scripts.serve",
+        "--host", host, "--port", str(port), "--idle-timeout", str(idle_timeout),
+        "--db", path, *(args or []),
+    ]
+    subprocess.Popen(
+        cmd,
+        cwd=Path(__file__).resolve().parents[1],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + wait
+    while not ping(host, port):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"check service did not start on {host}:{port}")
+        time.sleep(0.1)
+    return True
+
+
+def check_remote(
+    name: str,
+    reading: str,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    timeout: float = 120,
+) -> dict[str, Any]:
+    """Check one pair against a running service and return its result."""
+    body = json.dumps({"name": name, "reading": reading}, ensure_ascii=False)
+    req = urllib.request.Request(
+        f"http://{host}:{port}/check",
+        body.encode("utf-8"),
+        {"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(req, timeout=timeout) as res:
+        return json.loads(res.read())
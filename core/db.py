@@ -1,8 +1,50 @@
 from __future__ import annotations
+import json
 import os
 import sqlite3
+import tempfile
+import threading
+import time
 from pathlib import Path
-from typing import Optional, Tuple, Iterable
+from typing import Optional, Tuple, Iterable, Iterator
+
+# ``(model, prompt_version)`` identifying which generator produced an entry.
+# Lookups only return entries written with the same version.
+Version = Tuple[str, int]
+UNVERSIONED: Version = ("", 0)
+
+# columns added to both cache tables for versioning and eviction
+_VERSION_COLUMNS = {
+    "model": "TEXT NOT NULL DEFAULT ''",
+    "prompt_version": "INTEGER NOT NULL DEFAULT 0",
+    "created_at": "REAL NOT NULL DEFAULT 0",
+    "accessed_at": "REAL NOT NULL DEFAULT 0",
+}
+# timestamps of the Sudachi readings and run manifests (not model-specific)
+_TIME_COLUMNS = ("created_at", "accessed_at")
+
+
+# connection tuning: NORMAL sync is durable enough under WAL, 64 MiB page
+# cache, 256 MiB memory map and waiting on locks instead of failing
+PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -64000,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+
+def _tune(conn: sqlite3.Connection) -> None:
+    for pragma, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma}={value}")
+
+
+def cache_path(path: str | Path | None = None) -> Path:
+    """Return the absolute path of the cache file ``init_db(path)`` opens."""
+    if path is None:
+        path = os.getenv("FURIGANA_DB", "furigana.db")
+    return Path(path).resolve()
 
 
 def init_db(path: str | Path | None = None) -> sqlite3.Connection:
@@ -12,12 +54,12 @@ def init_db(path: str | Path | None = None) -> sqlite3.Connection:
     environment variable and defaults to ``furigana.db``.  Parent directories
     are created automatically.
     """
-    if path is None:
-        path = os.getenv("FURIGANA_DB", "furigana.db")
-
-    path = Path(path)
+    path = cache_path(path)
     path.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(path)
+    _tune(conn)
+    # only effective for new files; ``compact`` converts existing ones
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
     with conn:
         conn.execute("PRAGMA journal_mode=WAL")
         conn.execute(
@@ -32,16 +74,131 @@ def init_db(path: str | Path | None = None) -> sqlite3.Connection:
         conn.execute(
             "CREATE INDEX IF NOT EXISTS idx_readings_name_reading ON readings(name, reading)"
         )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS candidates ("
+            "name TEXT PRIMARY KEY,"
+            "candidates TEXT NOT NULL"
+            ")"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sudachi ("
+            "name TEXT PRIMARY KEY,"
+            "reading TEXT"
+            ")"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS manifests ("
+            "file TEXT NOT NULL,"
+            "hash INTEGER NOT NULL,"
+            "confidence INTEGER NOT NULL,"
+            "reason TEXT NOT NULL,"
+            "model TEXT NOT NULL DEFAULT '',"
+            "prompt_version INTEGER NOT NULL DEFAULT 0,"
+            "PRIMARY KEY(file, hash)"
+            ")"
+        )
+        for table in ("readings", "candidates"):
+            existing = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+            for col, decl in _VERSION_COLUMNS.items():
+                if col not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {decl}")
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_accessed "
+                f"ON {table}(accessed_at)"
+            )
+        for table in ("sudachi", "manifests"):
+            existing = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+            for col in _TIME_COLUMNS:
+                if col not in existing:
+                    decl = _VERSION_COLUMNS[col]
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {decl}")
+        existing = {r[1] for r in conn.execute("PRAGMA table_info(readings)")}
+        if "source" not in existing:
+            # resolution path that produced the verdict (see ``core.utils``)
+            conn.execute(
+                "ALTER TABLE readings ADD COLUMN source TEXT NOT NULL DEFAULT ''"
+            )
     return conn
 
 
+class _Connection(sqlite3.Connection):
+    """Connection whose ``with conn:`` transactions hold a shared writer lock."""
+
+    writer_lock: threading.RLock
+
+    def __enter__(self):
+        self.writer_lock.acquire()
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        try:
+            return super().__exit__(*exc)
+        finally:
+            self.writer_lock.release()
+
+
+class ConnectionManager:
+    """Share one cache file between threads.
+
+    The schema is set up once on construction.  :meth:`connection` hands
+    each thread its own tuned connection, since SQLite connections must not
+    be shared between threads, and the write transactions of all of them
+    are serialized on a single writer lock so concurrent jobs wait for each
+    other instead of failing with ``database is locked``.
+    """
+
+    def __init__(self, path: str | Path | None = None):
+        conn = init_db(path)
+        self.path = conn.execute("PRAGMA database_list").fetchone()[2]
+        conn.close()
+        if not self.path:
+            raise ValueError("ConnectionManager needs a database file")
+        self._writer_lock = threading.RLock()
+        self._lock = threading.Lock()
+        self._conns: dict[int, sqlite3.Connection] = {}
+
+    def connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use."""
+        ident = threading.get_ident()
+        with self._lock:
+            conn = self._conns.get(ident)
+            if conn is None:
+                self._prune()
+                conn = sqlite3.connect(
+                    self.path, factory=_Connection, check_same_thread=False
+                )
+                conn.writer_lock = self._writer_lock
+                _tune(conn)
+                self._conns[ident] = conn
+        return conn
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._conns.values():
+                conn.close()
+            self._conns.clear()
+
+    def _prune(self) -> None:
+        # drop connections of finished threads (e.g. completed jobs)
+        alive = {t.ident for t in threading.enumerate()}
+        for ident in [i for i in self._conns if i not in alive]:
+            self._conns.pop(ident).close()
+
+
 def get_reading(
-    name: str, reading: str, conn: sqlite3.Connection
+    name: str,
+    reading: str,
+    conn: sqlite3.Connection,
+    version: Version = UNVERSIONED,
 ) -> Optional[Tuple[int, str]]:
-    """Retrieve cached confidence and reason for ``name`` and ``reading``."""
+    """Retrieve cached confidence and reason for ``name`` and ``reading``.
+
+    Entries written with a different ``version`` are treated as missing.
+    """
     cur = conn.execute(
-        "SELECT confidence, reason FROM readings WHERE name=? AND reading=?",
-        (name, reading),
+        "SELECT confidence, reason FROM readings WHERE name=? AND reading=? "
+        "AND model=? AND prompt_version=?",
+        (name, reading, *version),
     )
     row = cur.fetchone()
     if row:
@@ -49,33 +206,523 @@ def get_reading(
     return None
 
 
+def get_many_readings(
+    keys: Iterable[tuple[str, str]],
+    conn: sqlite3.Connection,
+    version: Version = UNVERSIONED,
+    chunk_size: int = 500,
+) -> dict[tuple[str, str], Tuple[int, str]]:
+    """Return the cached ``(confidence, reason)`` of ``(name, reading)`` keys.
+
+    Keys without a verdict of ``version`` are left out.
+    """
+    wanted = set(keys)
+    names = list(dict.fromkeys(name for name, _ in wanted))
+    found: dict[tuple[str, str], Tuple[int, str]] = {}
+    for start in range(0, len(names), chunk_size):
+        chunk = names[start:start + chunk_size]
+        marks = ",".join("?" * len(chunk))
+        cur = conn.execute(
+            f"SELECT name, reading, confidence, reason FROM readings "
+            f"WHERE name IN ({marks}) AND model=? AND prompt_version=?",
+            (*chunk, *version),
+        )
+        for name, reading, conf, reason in cur:
+            if (name, reading) in wanted:
+                found[(name, reading)] = (int(conf), reason)
+    return found
+
+
 def save_reading(
     name: str,
     reading: str,
     confidence: int,
     reason: str,
     conn: sqlite3.Connection,
+    version: Version = UNVERSIONED,
 ) -> None:
     """Save result to the database."""
+    save_many_readings([(name, reading, confidence, reason)], conn, version)
+
+
+def save_many_readings(
+    rows: Iterable[tuple[str, str, int, str]],
+    conn: sqlite3.Connection,
+    version: Version = UNVERSIONED,
+    source: str = "",
+) -> None:
+    """Insert multiple readings in a single transaction.
+
+    ``source`` records which resolution path produced the verdicts.
+    """
+    now = time.time()
+    items = [(*row, *version, now, now, source) for row in rows]
+    if not items:
+        return
     with conn:
-        conn.execute(
-            "INSERT OR REPLACE INTO readings (name, reading, confidence, reason) "
+        conn.executemany(
+            "INSERT OR REPLACE INTO readings (name, reading, confidence, reason, "
+            "model, prompt_version, created_at, accessed_at, source) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            items,
+        )
+
+
+def touch_readings(
+    keys: Iterable[tuple[str, str]], conn: sqlite3.Connection
+) -> None:
+    """Mark ``(name, reading)`` cache hits as recently used for eviction."""
+    now = time.time()
+    items = [(now, name, reading) for name, reading in keys]
+    if not items:
+        return
+    with conn:
+        conn.executemany(
+            "UPDATE readings SET accessed_at=? WHERE name=? AND reading=?", items
+        )
+
+
+def get_sudachi_readings(
+    names: Iterable[str],
+    conn: sqlite3.Connection,
+    chunk_size: int = 500,
+    touch: bool = True,
+) -> dict[str, Optional[str]]:
+    """Return stored Sudachi readings (``None`` if Sudachi had none) for ``names``.
+
+    Found names are marked as used unless ``touch`` is false.
+    """
+    unique = list(dict.fromkeys(names))
+    found: dict[str, Optional[str]] = {}
+    for start in range(0, len(unique), chunk_size):
+        chunk = unique[start:start + chunk_size]
+        marks = ",".join("?" * len(chunk))
+        cur = conn.execute(
+            f"SELECT name, reading FROM sudachi WHERE name IN ({marks})", chunk
+        )
+        found.update(cur)
+    if found and touch:
+        now = time.time()
+        with conn:
+            conn.executemany(
+                "UPDATE sudachi SET accessed_at=? WHERE name=?",
+                [(now, name) for name in found],
+            )
+    return found
+
+
+def save_sudachi_readings(
+    rows: Iterable[tuple[str, Optional[str]]], conn: sqlite3.Connection
+) -> None:
+    """Store Sudachi readings per name so warm runs skip the tokenizer."""
+    now = time.time()
+    items = [(name, reading, now, now) for name, reading in rows]
+    if not items:
+        return
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO sudachi (name, reading, created_at, accessed_at) "
             "VALUES (?, ?, ?, ?)",
-            (name, reading, confidence, reason),
+            items,
         )
 
 
-def save_many_readings(
-    rows: Iterable[tuple[str, str, int, str]], conn: sqlite3.Connection
+def iter_readings(
+    conn: sqlite3.Connection,
+    min_confidence: int = 0,
+    version: Version | None = None,
+    exclude_sources: Iterable[str] = (),
+) -> Iterator[tuple[str, str, int]]:
+    """Yield cached ``(name, reading, confidence)`` rows.
+
+    Only rows whose confidence is at least ``min_confidence`` are returned,
+    written by ``version`` when given and not resolved by one of
+    ``exclude_sources``.
+    """
+    sql = "SELECT name, reading, confidence FROM readings WHERE confidence >= ?"
+    params: list = [min_confidence]
+    if version is not None:
+        sql += " AND model=? AND prompt_version=?"
+        params.extend(version)
+    excluded = list(exclude_sources)
+    if excluded:
+        sql += f" AND source NOT IN ({','.join('?' * len(excluded))})"
+        params.extend(excluded)
+    for name, reading, conf in conn.execute(sql, params):
+        yield name, reading, int(conf)
+
+
+def iter_reading_chunks(
+    conn: sqlite3.Connection,
+    version: Version = UNVERSIONED,
+    chunk_size: int = 10_000,
+) -> Iterator[list[tuple[str, str, int, str, str]]]:
+    """Yield cached ``(name, reading, confidence, reason, source)`` rows of ``version``.
+
+    Rows are read in ``rowid`` order, ``chunk_size`` at a time, so the table
+    can be updated between chunks without holding a read cursor open.
+    """
+    last = 0
+    while True:
+        rows = conn.execute(
+            "SELECT rowid, name, reading, confidence, reason, source FROM readings "
+            "WHERE model=? AND prompt_version=? AND rowid > ? ORDER BY rowid LIMIT ?",
+            (*version, last, chunk_size),
+        ).fetchall()
+        if not rows:
+            return
+        last = rows[-1][0]
+        yield [(n, r, int(c), reason, src) for _, n, r, c, reason, src in rows]
+
+
+def update_readings(
+    rows: Iterable[tuple[str, str, int, str, str]], conn: sqlite3.Connection
+) -> None:
+    """Replace ``(name, reading)`` verdicts with ``(confidence, reason, source)``.
+
+    Unlike ``save_many_readings`` the version and timestamps are kept.
+    """
+    items = [(c, reason, src, n, r) for n, r, c, reason, src in rows]
+    if not items:
+        return
+    with conn:
+        conn.executemany(
+            "UPDATE readings SET confidence=?, reason=?, source=? "
+            "WHERE name=? AND reading=?",
+            items,
+        )
+
+
+def delete_readings(
+    keys: Iterable[tuple[str, str]], conn: sqlite3.Connection
 ) -> None:
-    """Insert multiple readings in a single transaction."""
-    items = list(rows)
+    """Remove the cached verdicts of ``(name, reading)`` pairs."""
+    items = list(keys)
     if not items:
         return
     with conn:
+        conn.executemany("DELETE FROM readings WHERE name=? AND reading=?", items)
+
+
+def get_candidates(
+    name: str, conn: sqlite3.Connection, version: Version = UNVERSIONED
+) -> Optional[list[str]]:
+    """Return the cached candidate list for ``name`` if present."""
+    row = conn.execute(
+        "SELECT candidates FROM candidates WHERE name=? "
+        "AND model=? AND prompt_version=?",
+        (name, *version),
+    ).fetchone()
+    if row:
+        return json.loads(row[0])
+    return None
+
+
+def get_many_candidates(
+    names: Iterable[str],
+    conn: sqlite3.Connection,
+    version: Version = UNVERSIONED,
+    chunk_size: int = 500,
+    touch: bool = True,
+) -> dict[str, list[str]]:
+    """Return cached candidate lists for ``names`` and mark them as used.
+
+    Maintenance jobs pass ``touch=False`` to leave the eviction order alone.
+    """
+    unique = list(dict.fromkeys(names))
+    found: dict[str, list[str]] = {}
+    for start in range(0, len(unique), chunk_size):
+        chunk = unique[start:start + chunk_size]
+        marks = ",".join("?" * len(chunk))
+        cur = conn.execute(
+            f"SELECT name, candidates FROM candidates WHERE name IN ({marks}) "
+            "AND model=? AND prompt_version=?",
+            (*chunk, *version),
+        )
+        found.update((name, json.loads(cands)) for name, cands in cur)
+    if found and touch:
+        now = time.time()
+        with conn:
+            conn.executemany(
+                "UPDATE candidates SET accessed_at=? WHERE name=?",
+                [(now, name) for name in found],
+            )
+    return found
+
+
+def save_many_candidates(
+    rows: Iterable[tuple[str, list[str]]],
+    conn: sqlite3.Connection,
+    version: Version = UNVERSIONED,
+) -> None:
+    """Store candidate lists for multiple names in a single transaction."""
+    now = time.time()
+    items = [
+        (name, json.dumps(cands, ensure_ascii=False), *version, now, now)
+        for name, cands in rows
+    ]
+    if not items:
+        return
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO candidates (name, candidates, "
+            "model, prompt_version, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            items,
+        )
+
+
+def missing_candidates(
+    names: Iterable[str],
+    conn: sqlite3.Connection,
+    version: Version = UNVERSIONED,
+    chunk_size: int = 500,
+) -> list[str]:
+    """Return the unique ``names`` without cached candidates, in input order."""
+    unique = list(dict.fromkeys(names))
+    known: set[str] = set()
+    for start in range(0, len(unique), chunk_size):
+        chunk = unique[start:start + chunk_size]
+        marks = ",".join("?" * len(chunk))
+        cur = conn.execute(
+            f"SELECT name FROM candidates WHERE name IN ({marks}) "
+            "AND model=? AND prompt_version=?",
+            (*chunk, *version),
+        )
+        known.update(row[0] for row in cur)
+    return [n for n in unique if n not in known]
+
+
+def load_manifest(
+    key: str, conn: sqlite3.Connection, version: Version = UNVERSIONED
+) -> list[tuple[int, int, str]]:
+    """Return the ``(row hash, confidence, reason)`` rows of the last run of ``key``.
+
+    Manifests written by another version are ignored; a found manifest is
+    marked as used.
+    """
+    rows = conn.execute(
+        "SELECT hash, confidence, reason FROM manifests WHERE file=? "
+        "AND model=? AND prompt_version=?",
+        (key, *version),
+    ).fetchall()
+    if rows:
+        with conn:
+            conn.execute(
+                "UPDATE manifests SET accessed_at=? WHERE file=?", (time.time(), key)
+            )
+    return rows
+
+
+def save_manifest(
+    key: str,
+    rows: Iterable[tuple[int, int, str]],
+    conn: sqlite3.Connection,
+    version: Version = UNVERSIONED,
+) -> None:
+    """Replace the run manifest of ``key`` with ``(row hash, confidence, reason)``."""
+    now = time.time()
+    items = [(key, int(h), int(c), r, *version, now, now) for h, c, r in rows]
+    with conn:
+        conn.execute("DELETE FROM manifests WHERE file=?", (key,))
         conn.executemany(
-            "INSERT OR REPLACE INTO readings (name, reading, confidence, reason) VALUES (?, ?, ?, ?)",
+            "INSERT OR REPLACE INTO manifests (file, hash, confidence, reason, "
+            "model, prompt_version, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
             items,
         )
 
 
+def delete_manifests(conn: sqlite3.Connection, version: Version) -> int:
+    """Remove the run manifests of ``version`` and return how many files had one."""
+    with conn:
+        files = conn.execute(
+            "SELECT COUNT(DISTINCT file) FROM manifests "
+            "WHERE model=? AND prompt_version=?",
+            version,
+        ).fetchone()[0]
+        conn.execute(
+            "DELETE FROM manifests WHERE model=? AND prompt_version=?", version
+        )
+    return files
+
+
+def _trim_manifests(conn: sqlite3.Connection, max_rows: int) -> int:
+    """Drop whole least recently used manifests until ``max_rows`` remain."""
+    excess = conn.execute("SELECT COUNT(*) FROM manifests").fetchone()[0] - max_rows
+    drop = []
+    cur = conn.execute(
+        "SELECT file, COUNT(*) FROM manifests GROUP BY file ORDER BY MAX(accessed_at)"
+    )
+    for file, rows in cur:
+        if excess <= 0:
+            break
+        drop.append((file,))
+        excess -= rows
+    return conn.executemany("DELETE FROM manifests WHERE file=?", drop).rowcount
+
+
+def evict(
+    conn: sqlite3.Connection,
+    max_rows: int | None = None,
+    ttl_days: float | None = None,
+    keep_version: Version | None = None,
+) -> int:
+    """Remove expired, stale and least recently used cache entries.
+
+    Entries older than ``ttl_days`` and, when ``keep_version`` is given,
+    verdicts, candidates and run manifests written by any other version are
+    deleted first (Sudachi readings do not depend on the model).  Each table
+    is then trimmed to ``max_rows`` by dropping the least recently accessed
+    rows; manifests are only dropped per file, as a partial manifest would
+    not match its file.  Returns the number of deleted rows.
+    """
+    deleted = 0
+    with conn:
+        for table in ("readings", "candidates", "sudachi", "manifests"):
+            if ttl_days is not None:
+                cutoff = time.time() - ttl_days * 86400
+                deleted += conn.execute(
+                    f"DELETE FROM {table} WHERE created_at < ?", (cutoff,)
+                ).rowcount
+            if keep_version is not None and table != "sudachi":
+                deleted += conn.execute(
+                    f"DELETE FROM {table} WHERE model!=? OR prompt_version!=?",
+                    keep_version,
+                ).rowcount
+            if max_rows is None:
+                continue
+            if table == "manifests":
+                deleted += _trim_manifests(conn, max_rows)
+                continue
+            count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            if count > max_rows:
+                deleted += conn.execute(
+                    f"DELETE FROM {table} WHERE rowid IN ("
+                    f"SELECT rowid FROM {table} ORDER BY accessed_at LIMIT ?)",
+                    (count - max_rows,),
+                ).rowcount
+    return deleted
+
+
+def compact(conn: sqlite3.Connection, pages: int = 0) -> int:
+    """Return free pages to the file system and report how many were freed.
+
+    Databases created before incremental auto-vacuum was enabled are
+    converted with a one-off full ``VACUUM``; afterwards only up to ``pages``
+    free pages (all when ``0``) are released incrementally.
+    """
+    before = conn.execute("PRAGMA page_count").fetchone()[0]
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    else:
+        # executescript steps the pragma to completion (one page per step)
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    return before - conn.execute("PRAGMA page_count").fetchone()[0]
+
+
+def export_cache(conn: sqlite3.Connection, path: str | Path) -> None:
+    """Write a compacted, self-contained copy of the cache to ``path``."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    conn.execute("VACUUM INTO ?", (str(path),))
+
+
+_MERGE_SQL = {
+    "readings": (
+        "INSERT INTO main.readings (name, reading, confidence, reason, "
+        "model, prompt_version, created_at, accessed_at, source) "
+        "SELECT name, reading, confidence, reason, "
+        "model, prompt_version, created_at, accessed_at, source "
+        "FROM shard.readings WHERE true "
+        "ON CONFLICT(name, reading) DO UPDATE SET "
+        "confidence=excluded.confidence, reason=excluded.reason, "
+        "source=excluded.source, "
+        "model=excluded.model, prompt_version=excluded.prompt_version, "
+        "created_at=excluded.created_at, accessed_at=excluded.accessed_at "
+        "WHERE {newer}"
+    ),
+    "candidates": (
+        "INSERT INTO main.candidates (name, candidates, "
+        "model, prompt_version, created_at, accessed_at) "
+        "SELECT name, candidates, model, prompt_version, created_at, accessed_at "
+        "FROM shard.candidates WHERE true "
+        "ON CONFLICT(name) DO UPDATE SET "
+        "candidates=excluded.candidates, "
+        "model=excluded.model, prompt_version=excluded.prompt_version, "
+        "created_at=excluded.created_at, accessed_at=excluded.accessed_at "
+        "WHERE {newer}"
+    ),
+    "sudachi": (
+        "INSERT OR IGNORE INTO main.sudachi (name, reading, created_at, accessed_at) "
+        "SELECT name, reading, created_at, accessed_at FROM shard.sudachi"
+    ),
+}
+
+
+def _newer(table: str, current: Version | None) -> str:
+    """Return the condition under which a shard row replaces one of ``table``."""
+    newer = (
+        f"excluded.prompt_version > {table}.prompt_version OR "
+        f"(excluded.prompt_version = {table}.prompt_version AND "
+        f"excluded.created_at > {table}.created_at)"
+    )
+    if current is None:
+        return newer
+    # bound to the ``:model`` and ``:prompt_version`` parameters
+    shard_is_current = (
+        "(excluded.model = :model AND excluded.prompt_version = :prompt_version)"
+    )
+    main_is_current = shard_is_current.replace("excluded.", f"{table}.")
+    return (
+        f"{shard_is_current} > {main_is_current} OR "
+        f"({shard_is_current} = {main_is_current} AND ({newer}))"
+    )
+
+
+def merge_cache(
+    conn: sqlite3.Connection,
+    paths: Iterable[str | Path],
+    current: Version | None = None,
+) -> int:
+    """Merge cache shards (or an exported file) into ``conn``.
+
+    Each shard is attached and upserted set-wise.  On conflicts an entry
+    written by the ``current`` version wins over one of any other version;
+    otherwise the entry with the higher prompt version wins, and for equal
+    prompt versions the more recently created one.  Shards are only read:
+    those written by older releases are migrated in a temporary copy.
+    Raises ``FileNotFoundError`` before merging anything if a shard does not
+    exist.  Returns the number of inserted or updated rows.
+    """
+    paths = [Path(p) for p in paths]
+    missing = [str(p) for p in paths if not p.is_file()]
+    if missing:
+        raise FileNotFoundError(f"cache shards not found: {', '.join(missing)}")
+    params = {}
+    if current is not None:
+        params = {"model": current[0], "prompt_version": current[1]}
+    before = conn.total_changes
+    for path in paths:
+        with tempfile.TemporaryDirectory() as tmp:
+            copy = Path(tmp) / "shard.db"
+            src = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+            dst = sqlite3.connect(copy)
+            try:
+                src.backup(dst)
+            finally:
+                src.close()
+                dst.close()
+            # bring shards written by older releases up to the current schema
+            init_db(copy).close()
+            conn.execute("ATTACH DATABASE ? AS shard", (str(copy),))
+            try:
+                with conn:
+                    for table, sql in _MERGE_SQL.items():
+                        newer = _newer(table, current)
+                        conn.execute(sql.format(newer=newer), params)
+            finally:
+                conn.execute("DETACH DATABASE shard")
+    return conn.total_changes - before
@@ -0,0 +1,183 @@
+from __future__ import annotations
+import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from . import db, scorer
+from .utils import RESULT_COLUMNS, name_partitions, process_dataframe
+
+# columns of partition files; the row column keeps the original position
+NAME_COLUMN = "name"
+READING_COLUMN = "reading"
+ROW_COLUMN = "row"
+# cache tables keyed by name that are split into the partition shards
+SHARD_TABLES = ("readings", "candidates", "sudachi")
+# files of a previous run that must not leak into the next one
+_RUN_FILES = ("part-*.parquet", "result-*.parquet", "cache-*.db*")
+
+
+def worker_paths(part: str | Path) -> tuple[Path, Path]:
+    """Return the cache shard and result paths belonging to partition ``part``.
+
+    ``work/part-3.parquet`` maps to ``work/cache-3.db`` and
+    ``work/result-3.parquet``.
+    """
+    part = Path(part)
+    m = re.fullmatch(r"part-(\d+)\.parquet", part.name)
+    if not m:
+        raise ValueError(f"not a partition file: {part}")
+    i = m.group(1)
+    return part.with_name(f"cache-{i}.db"), part.with_name(f"result-{i}.parquet")
+
+
+def split_work(
+    df: pd.DataFrame,
+    name_col: str,
+    furi_col: str,
+    nodes: int,
+    workdir: str | Path,
+    conn: sqlite3.Connection | None = None,
+) -> list[Path]:
+    """Write hash partitions of ``df`` for ``nodes`` workers to ``workdir``.
+
+    Rows are assigned by name, so every occurrence of a name is handled by
+    the same node.  When ``conn`` is given the cache entries of each
+    partition's names are written as its local shard so workers start warm.
+    Files of an earlier run in ``workdir`` are removed first.  Returns the
+    partition paths.
+    """
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    for pattern in _RUN_FILES:
+        for old in workdir.glob(pattern):
+            old.unlink()
+    frame = pd.DataFrame({
+        NAME_COLUMN: df[name_col].astype("string").to_numpy(),
+        READING_COLUMN: (
+            df[furi_col].astype("string").to_numpy()
+            if furi_col in df.columns
+            else pd.array([pd.NA] * len(df), dtype="string")
+        ),
+        ROW_COLUMN: np.arange(len(df)),
+    })
+    part_of = name_partitions(frame[NAME_COLUMN], nodes)
+
+    paths = []
+    for i in range(nodes):
+        path = workdir / f"part-{i}.parquet"
+        frame[part_of == i].to_parquet(path, index=False)
+        paths.append(path)
+    if conn is not None:
+        export_shards(conn, [worker_paths(p)[0] for p in paths])
+    return paths
+
+
+def export_shards(
+    conn: sqlite3.Connection, paths: list[Path], chunk_size: int = 10_000
+) -> None:
+    """Write the cache entries of each name partition to its shard in ``paths``.
+
+    Names are assigned with :func:`core.utils.name_partitions`, exactly like
+    the rows of ``split_work``, so each shard only holds what its node can
+    use.  The cache tables are streamed ``chunk_size`` rows at a time.
+    """
+    shards = [db.init_db(p) for p in paths]
+    try:
+        for table in SHARD_TABLES:
+            cols = [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+            insert = (
+                f"INSERT OR REPLACE INTO {table} ({', '.join(cols)}) "
+                f"VALUES ({', '.join('?' * len(cols))})"
+            )
+            name_at = cols.index("name")
+            cur = conn.execute(f"SELECT {', '.join(cols)} FROM {table}")
+            while rows := cur.fetchmany(chunk_size):
+                names = pd.Series([r[name_at] for r in rows], dtype=object)
+                buckets: list[list[tuple]] = [[] for _ in shards]
+                for row, part in zip(rows, name_partitions(names, len(shards))):
+                    buckets[part].append(row)
+                for shard, bucket in zip(shards, buckets):
+                    if bucket:
+                        with shard:
+                            shard.executemany(insert, bucket)
+    finally:
+        for shard in shards:
+            shard.close()
+
+
+def run_worker(part: str | Path, **kwargs) -> int:
+    """Process one partition file against its local cache shard.
+
+    The row positions and result columns are written next to the partition
+    (see :func:`worker_paths`).  Keyword arguments are passed to
+    ``process_dataframe``.  Returns the number of processed rows.
+    """
+    cache, out = worker_paths(part)
+    frame = pd.read_parquet(part)
+    conn = db.init_db(cache)
+    try:
+        result = process_dataframe(
+            frame, NAME_COLUMN, READING_COLUMN, db_conn=conn, **kwargs
+        )
+    finally:
+        conn.close()
+    result[[ROW_COLUMN, *RESULT_COLUMNS]].to_parquet(out, index=False)
+    return len(result)
+
+
+def merge_work(
+    df: pd.DataFrame,
+    workdir: str | Path,
+    conn: sqlite3.Connection | None = None,
+) -> pd.DataFrame:
+    """Return ``df`` with the worker results found in ``workdir``.
+
+    Fails when a partition has no result yet.  When ``conn`` is given the
+    cache shards written by the workers are merged into it.
+    """
+    workdir = Path(workdir)
+    parts = sorted(workdir.glob("part-*.parquet"))
+    missing = [p.name for p in parts if not worker_paths(p)[1].exists()]
+    if missing:
+        raise ValueError(f"partitions without results: {', '.join(missing)}")
+    combined = pd.concat(
+        [pd.read_parquet(worker_paths(p)[1]) for p in parts], ignore_index=True
+    ).sort_values(ROW_COLUMN)
+    if len(combined) != len(df):
+        raise ValueError(
+            f"results cover {len(combined)} rows, expected {len(df)}"
+        )
+
+    out = df.copy()
+    for col in RESULT_COLUMNS:
+        out[col] = combined[col].to_numpy()
+    if conn is not None:
+        shards = [worker_paths(p)[0] for p in parts]
+        db.merge_cache(
+            conn, [s for s in shards if s.exists()], scorer.CACHE_VERSION
+        )
+    return out
+
+
+def run_local(
+    df: pd.DataFrame,
+    name_col: str,
+    furi_col: str,
+    nodes: int,
+    workdir: str | Path,
+    conn: sqlite3.Connection | None = None,
+    **kwargs,
+) -> pd.DataFrame:
+    """Run split, work and merge with local processes standing in for nodes.
+
+    Keyword arguments are passed to every worker's ``process_dataframe``.
+    """
+    parts = split_work(df, name_col, furi_col, nodes, workdir, conn)
+    with ProcessPoolExecutor(nodes) as pool:
+        for fut in [pool.submit(run_worker, p, **kwargs) for p in parts]:
+            fut.result()
+    return merge_work(df, workdir, conn)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+import bisect
+import itertools
+import mmap
+import sqlite3
+import struct
+from pathlib import Path
+
+from .model import train_model, MIN_TRAIN_CONFIDENCE
+from .normalize import normalize_for_keypuncher_check, split_components
+
+# Confidence and reason for names whose components all match cached readings
+INDEX_CONFIDENCE = 90
+INDEX_REASON = "既知構成一致"
+# Upper bound of reading combinations tried for unspaced readings
+MAX_COMBINATIONS = 64
+
+_MAGIC = b"FGIX"
+_VERSION = 1
+_HEADER = struct.Struct("<4sII")
+_OFFSET = struct.Struct("<I")
+
+
+def build_index(
+    conn: sqlite3.Connection,
+    path: str | Path,
+    min_confidence: int = MIN_TRAIN_CONFIDENCE,
+) -> int:
+    """Compile cached component readings in ``conn`` into an index file.
+
+    The file holds a header, an offset table and a blob of
+    ``component\\treading\\t...`` entries sorted by component so lookups can
+    binary search a memory map without loading the data.  Readings of each
+    component are ordered by frequency.  Returns the number of components.
+    """
+    counts = train_model(conn, min_confidence).counts
+    entries = sorted(
+        "\t".join([comp, *sorted(readings, key=readings.get, reverse=True)]).encode()
+        for comp, readings in counts.items()
+    )
+    offsets = [0]
+    for entry in entries:
+        offsets.append(offsets[-1] + len(entry))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, len(entries)))
+        f.write(b"".join(_OFFSET.pack(o) for o in offsets))
+        f.write(b"".join(entries))
+    return len(entries)
+
+
+class ReadingIndex:
+    """Read-only view of an index written by :func:`build_index`."""
+
+    def __init__(self, path: str | Path):
+        self.path = str(path)
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self._mm.close()
+            raise ValueError(f"not a reading index: {path}")
+        self._offsets = _HEADER.size
+        self._blob = self._offsets + (self._count + 1) * _OFFSET.size
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def _entry(self, i: int) -> bytes:
+        start = _OFFSET.unpack_from(self._mm, self._offsets + i * _OFFSET.size)[0]
+        end = _OFFSET.unpack_from(self._mm, self._offsets + (i + 1) * _OFFSET.size)[0]
+        return self._mm[self._blob + start:self._blob + end]
+
+    def _key(self, i: int) -> bytes:
+        return self._entry(i).split(b"\t", 1)[0]
+
+    def lookup(self, component: str) -> list[str]:
+        """Return cached readings for ``component`` (most frequent first)."""
+        key = component.encode()
+        keys = _Keys(self)
+        i = bisect.bisect_left(keys, key)
+        if i < self._count and keys[i] == key:
+            return self._entry(i).decode().split("\t")[1:]
+        return []
+
+    def match(self, name: str, reading: str) -> bool:
+        """Return ``True`` if ``reading`` is composed of known readings.
+
+        Every component of ``name`` must be present in the index.  Spaced
+        readings are compared component by component; unspaced readings are
+        compared against combinations of the known component readings.
+        """
+        comps = split_components(name)
+        if not comps or not reading:
+            return False
+        known = []
+        for comp in comps:
+            readings = self.lookup(comp)
+            if not readings:
+                return False
+            known.append([normalize_for_keypuncher_check(r) for r in readings])
+
+        parts = split_components(reading)
+        if len(parts) == len(comps):
+            return all(
+                normalize_for_keypuncher_check(p) in k for p, k in zip(parts, known)
+            )
+        target = normalize_for_keypuncher_check(reading)
+        combos = itertools.islice(itertools.product(*known), MAX_COMBINATIONS)
+        return any("".join(c) == target for c in combos)
+
+
+class _Keys:
+    """Sequence adapter exposing index keys to :mod:`bisect`."""
+
+    def __init__(self, index: ReadingIndex):
+        self._index = index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __getitem__(self, i: int) -> bytes:
+        return self._index._key(i)
@@ -0,0 +1,136 @@
+from __future__ import annotations
+import asyncio
+import inspect
+import itertools
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+ProgressCallback = Callable[[int, int], None]
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's progress callback once cancellation is requested."""
+
+
+def throttle_progress(
+    callback: ProgressCallback, interval: float = 0.5
+) -> ProgressCallback:
+    """Wrap ``callback`` so it runs at most once per ``interval`` seconds.
+
+    The final update (``done == total``) is always delivered.
+    """
+    last = 0.0
+
+    def wrapper(done: int, total: int) -> None:
+        nonlocal last
+        now = time.monotonic()
+        if done >= total or now - last >= interval:
+            last = now
+            callback(done, total)
+
+    return wrapper
+
+
+class Job:
+    """State of a pipeline running in the background."""
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = "running"
+        self.done = 0
+        self.total = 0
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.started = time.time()
+        self.finished: float | None = None
+        self._cancel = threading.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def fraction(self) -> float:
+        return self.done / self.total if self.total else 0.0
+
+    @property
+    def running(self) -> bool:
+        return self.status == "running"
+
+    def on_progress(self, done: int, total: int) -> None:
+        """Progress callback handed to the pipeline; only records counters."""
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+        self.done = done
+        self.total = total
+
+    def cancel(self) -> None:
+        """Request cancellation at the next progress update or ``await``."""
+        self._cancel.set()
+        if self._loop is not None and self._task is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+
+
+class JobManager:
+    """Run pipelines on background threads and keep their results.
+
+    Each job gets its own thread and event loop so a Streamlit script can
+    return immediately and poll :meth:`get` on later reruns.  Up to
+    ``keep_finished`` completed jobs are retained.
+    """
+
+    def __init__(self, keep_finished: int = 20):
+        self.keep_finished = keep_finished
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def submit(
+        self, factory: Callable[[ProgressCallback], Awaitable[Any] | Any]
+    ) -> Job:
+        """Start ``factory(on_progress)`` in the background and return its job.
+
+        ``factory`` is called on the worker thread, so resources such as
+        SQLite connections should be created inside it.  It may return a
+        coroutine (e.g. ``async_process_dataframe(...)``) or a plain result.
+        """
+        job = Job(str(next(self._ids)))
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        thread = threading.Thread(
+            target=self._run, args=(job, factory), name=f"job-{job.id}", daemon=True
+        )
+        thread.start()
+        return job
+
+    def get(self, job_id: Optional[str]) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def _run(self, job: Job, factory: Callable) -> None:
+        async def runner() -> Any:
+            job._loop = asyncio.get_running_loop()
+            job._task = asyncio.current_task()
+            if job._cancel.is_set():
+                raise JobCancelled(job.id)
+            result = factory(job.on_progress)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+
+        try:
+            job.result = asyncio.run(runner())
+            job.status = "done"
+        except (JobCancelled, asyncio.CancelledError):
+            job.status = "cancelled"
+        except Exception as exc:
+            job.error = exc
+            job.status = "error"
+        finally:
+            job.finished = time.time()
+            job._loop = job._task = None
+
+    def _prune(self) -> None:
+        finished = [j for j in self._jobs.values() if not j.running]
+        for job in finished[: max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job.id]
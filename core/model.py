@@ -0,0 +1,138 @@
+from __future__ import annotations
+import json
+import sqlite3
+from collections import defaultdict
+from pathlib import Path
+from typing import List
+
+from . import db
+from .normalize import normalize_kana, split_components
+
+# Model file format version written by :meth:`ReadingModel.save`
+MODEL_VERSION = 1
+# Cached verdicts at or above this confidence are used for training
+MIN_TRAIN_CONFIDENCE = 85
+# Predictions whose top probability is below this are escalated to GPT
+DEFAULT_THRESHOLD = 0.9
+# Names with a component verified fewer times than this are escalated to GPT
+MIN_COMPONENT_COUNT = 3
+# Verdict sources (see ``core.utils``) derived from the model or the index
+# built from it; training on them would feed predictions back in
+DERIVED_SOURCES = ("index", "model")
+
+
+class ReadingModel:
+    """Per-component reading statistics learned from the ``readings`` cache.
+
+    Names and readings are split on whitespace (``"野々村　美枝子"`` /
+    ``"ﾉﾉﾑﾗ ﾐｴｺ"``) and each surname/given-name component keeps a count of
+    the readings it was verified with.  Full names are predicted by combining
+    the component distributions.
+    """
+
+    def __init__(self, counts: dict[str, dict[str, int]] | None = None):
+        self.counts: dict[str, dict[str, int]] = counts or {}
+        self._dist: dict[str, list[tuple[str, float]]] = {}
+        self._totals: dict[str, int] = {}
+        for comp, readings in self.counts.items():
+            total = self._totals[comp] = sum(readings.values())
+            self._dist[comp] = sorted(
+                ((r, c / total) for r, c in readings.items()),
+                key=lambda x: x[1],
+                reverse=True,
+            )
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def predict(self, name: str, limit: int = 5) -> list[tuple[str, float]]:
+        """Return up to ``limit`` ranked ``(reading, probability)`` pairs.
+
+        An empty list is returned when any component of ``name`` is unknown.
+        """
+        comps = split_components(name)
+        if not comps:
+            return []
+        beam: list[tuple[str, float]] = [("", 1.0)]
+        for comp in comps:
+            dist = self._dist.get(comp)
+            if not dist:
+                return []
+            beam = sorted(
+                (
+                    (prefix + reading, p * q)
+                    for prefix, p in beam
+                    for reading, q in dist[:limit]
+                ),
+                key=lambda x: x[1],
+                reverse=True,
+            )[:limit]
+        return beam
+
+    def candidates(
+        self,
+        name: str,
+        threshold: float = DEFAULT_THRESHOLD,
+        min_count: int = MIN_COMPONENT_COUNT,
+    ) -> List[str] | None:
+        """Return ranked candidate readings or ``None`` to escalate to GPT.
+
+        The list is only returned when every component was verified at least
+        ``min_count`` times and the top prediction reaches ``threshold``; it
+        can be passed to :func:`core.scorer.calc_confidence` in place of
+        :func:`core.scorer.gpt_candidates`.
+        """
+        comps = split_components(name)
+        if any(self._totals.get(c, 0) < min_count for c in comps):
+            return None
+        preds = self.predict(name)
+        if not preds or preds[0][1] < threshold:
+            return None
+        return [reading for reading, _ in preds]
+
+    def save(self, path: str | Path) -> None:
+        """Write the model to ``path`` as compact JSON."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"version": MODEL_VERSION, "components": self.counts}
+        path.write_text(
+            json.dumps(data, ensure_ascii=False, separators=(",", ":")),
+            encoding="utf-8",
+        )
+
+    @classmethod
+    def load(cls, path: str | Path) -> "ReadingModel":
+        """Load a model written by :meth:`save`."""
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        if data.get("version") != MODEL_VERSION:
+            raise ValueError(f"unsupported model version: {data.get('version')}")
+        return cls(data["components"])
+
+
+def train_model(
+    conn: sqlite3.Connection,
+    min_confidence: int = MIN_TRAIN_CONFIDENCE,
+    version: db.Version | None = None,
+) -> ReadingModel:
+    """Train a :class:`ReadingModel` from cached verdicts in ``conn``.
+
+    Only verdicts of ``version`` (default: the current
+    :data:`core.scorer.CACHE_VERSION`) are used, leaving out those resolved
+    by the model or the component index.  Rows whose name and reading split
+    into a different number of components are skipped since the reading
+    cannot be aligned to the name.
+    """
+    if version is None:
+        from . import scorer
+
+        version = scorer.CACHE_VERSION
+    counts: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    rows = db.iter_readings(conn, min_confidence, version, DERIVED_SOURCES)
+    for name, reading, _ in rows:
+        comps = split_components(name)
+        parts = split_components(reading)
+        if not comps or len(comps) != len(parts):
+            continue
+        for comp, part in zip(comps, parts):
+            counts[comp][normalize_kana(part)] += 1
+    return ReadingModel({c: dict(r) for c, r in counts.items()})
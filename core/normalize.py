@@ -63,3 +63,14 @@ def normalize_for_keypuncher_check(text: str | None) -> str:
 
     # step3: half-width conversion with dakuten split
     return jaconv.z2h(out, kana=True, digit=True, ascii=False)
+
+
+def split_components(text: str | None) -> list[str]:
+    """Return whitespace separated components of a name or reading.
+
+    Full-width spaces and half-width kana are normalized with NFKC first so
+    ``"野々村　美枝子"`` and ``"ﾉﾉﾑﾗ ﾐｴｺ"`` both split into two parts.
+    """
+    if not text:
+        return []
+    return unicodedata.normalize("NFKC", text).split()
@@ -1,18 +1,36 @@
 from __future__ import annotations
+import threading
 from sudachipy import dictionary, tokenizer
 from functools import lru_cache
 
-# Initialize Sudachi tokenizer with full dictionary once
-TOKENIZER = dictionary.Dictionary(dict="full").create()
+# Load the full dictionary once per process; tokenizers are cheap to create
+DICTIONARY = dictionary.Dictionary(dict="full")
+TOKENIZER = DICTIONARY.create()
 MODE = tokenizer.Tokenizer.SplitMode.C
 
+_local = threading.local()
+
+
+def get_tokenizer():
+    """Return this thread's tokenizer over the shared dictionary.
+
+    Sudachi tokenizers cannot be used concurrently, so background jobs and
+    service threads each get their own instance.
+    """
+    if threading.current_thread() is threading.main_thread():
+        return TOKENIZER
+    tok = getattr(_local, "tokenizer", None)
+    if tok is None:
+        tok = _local.tokenizer = DICTIONARY.create()
+    return tok
+
 
 @lru_cache(maxsize=1024)
 def sudachi_reading(name: str) -> str | None:
     """Return katakana reading for `name` using SudachiPy."""
     if not name:
         return None
-    morps = TOKENIZER.tokenize(name, MODE)
+    morps = get_tokenizer().tokenize(name, MODE)
     filtered = [m for m in morps if m.part_of_speech()[0] != "空白"]
     if not filtered:
         return None
@@ -0,0 +1,101 @@
+from __future__ import annotations
+import asyncio
+import sqlite3
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+import pandas as pd
+
+from . import db, scorer
+
+
+class RateLimiter:
+    """Space out API calls so at most ``per_minute`` start each minute."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def read_names(path: str | Path, column: str | None = None) -> list[str]:
+    """Return names listed in ``path``.
+
+    ``.xlsx``/``.csv``/``.parquet`` files are read from ``column`` (the first
+    column by default); any other file is treated as one name per line.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix in (".xlsx", ".csv", ".parquet"):
+        if suffix == ".xlsx":
+            df = pd.read_excel(path, usecols=[column] if column else [0])
+        elif suffix == ".csv":
+            df = pd.read_csv(path, usecols=[column] if column else [0])
+        else:
+            df = pd.read_parquet(path, columns=[column] if column else None)
+        values = df[column] if column else df.iloc[:, 0]
+        names = ["" if pd.isna(v) else str(v) for v in values]
+    else:
+        names = path.read_text(encoding="utf-8").splitlines()
+    return [n.strip() for n in names if n.strip()]
+
+
+async def prefetch_candidates(
+    names: Iterable[str],
+    conn: sqlite3.Connection,
+    rate_per_minute: float = 60,
+    concurrency: int = 5,
+    limit: int | None = None,
+    batch_size: int = 50,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> int:
+    """Populate the ``candidates`` cache for ``names`` ahead of time.
+
+    Names that already have cached candidates (or are too long for the
+    pipeline) are skipped, so an interrupted run resumes where it stopped.
+    At most ``limit`` names are requested and API calls are started no faster
+    than ``rate_per_minute``.  Results are committed after every batch.
+    Returns the number of names whose candidates were stored.
+    """
+    todo = db.missing_candidates(
+        (n for n in names if n and len(n) <= 50), conn, scorer.CACHE_VERSION
+    )
+    if limit is not None:
+        todo = todo[:limit]
+
+    total = len(todo)
+    done = 0
+    stored = 0
+    sem = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate_per_minute)
+
+    async def fetch(name: str) -> tuple[str, list[str] | None]:
+        async with sem:
+            await limiter.wait()
+            try:
+                return name, await scorer.async_gpt_candidates(name)
+            except Exception:
+                return name, None
+
+    for start in range(0, total, batch_size):
+        chunk = todo[start:start + batch_size]
+        rows = []
+        for coro in asyncio.as_completed([fetch(n) for n in chunk]):
+            name, cands = await coro
+            if cands:
+                rows.append((name, cands))
+            done += 1
+            if on_progress:
+                on_progress(done, total)
+        db.save_many_candidates(rows, conn, scorer.CACHE_VERSION)
+        stored += len(rows)
+    return stored
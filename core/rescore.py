@@ -0,0 +1,86 @@
+from __future__ import annotations
+import sqlite3
+from collections import Counter
+from typing import Callable, Optional
+
+from . import db, parser, scorer
+from .utils import SOURCE_CANDIDATES, SOURCE_INDEX, SOURCE_SUDACHI, sudachi_matches
+
+
+def rescore_cache(
+    conn: sqlite3.Connection,
+    version: db.Version | None = None,
+    chunk_size: int = 10_000,
+    drop_missing: bool = False,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> Counter:
+    """Recompute cached verdicts of ``version`` from stored candidates.
+
+    Run after changing ``calc_confidence`` or the keypuncher normalization.
+    The ``readings`` table is streamed ``chunk_size`` rows at a time; each
+    verdict is re-derived the way the pipeline does it, from the stored
+    Sudachi reading and the cached candidate list of its name, without any
+    API call.  Index verdicts do not depend on the scoring rules and are
+    kept.  Verdicts whose name has no stored candidate list (e.g. offline
+    model predictions or staged early exits) cannot be recomputed; they are
+    deleted when ``drop_missing`` is set so the next run checks them again.
+
+    Run manifests only keep row hashes, so their verdicts cannot be
+    re-derived; when any verdict changed or was dropped the manifests of
+    ``version`` are deleted and the next upload of a file is checked
+    against the updated cache instead of copying stale results.
+
+    Returns counts of ``rescored``, ``changed``, ``kept`` (index),
+    ``missing`` and ``dropped`` rows and of deleted ``manifests``.
+    """
+    version = version or scorer.CACHE_VERSION
+    total = conn.execute(
+        "SELECT COUNT(*) FROM readings WHERE model=? AND prompt_version=?", version
+    ).fetchone()[0]
+    counts: Counter = Counter()
+    done = 0
+    for rows in db.iter_reading_chunks(conn, version, chunk_size):
+        names = [r[0] for r in rows if r[4] != SOURCE_INDEX]
+        cands = db.get_many_candidates(names, conn, version, touch=False)
+        sudachi = db.get_sudachi_readings(names, conn, touch=False)
+        tokenized = {
+            n: parser.sudachi_reading(n)
+            for n in dict.fromkeys(names)
+            if n not in sudachi
+        }
+        sudachi.update(tokenized)
+
+        updates = []
+        missing = []
+        for name, reading, conf, reason, source in rows:
+            if source == SOURCE_INDEX:
+                counts["kept"] += 1
+                continue
+            kana = sudachi[name]
+            if sudachi_matches(kana, reading):
+                verdict = (100, "辞書候補一致", SOURCE_SUDACHI)
+            elif name in cands:
+                verdict = (
+                    *scorer.calc_confidence(reading, cands[name], kana),
+                    SOURCE_CANDIDATES,
+                )
+            else:
+                counts["missing"] += 1
+                missing.append((name, reading))
+                continue
+            counts["rescored"] += 1
+            if verdict != (conf, reason, source):
+                counts["changed"] += 1
+                updates.append((name, reading, *verdict))
+
+        db.update_readings(updates, conn)
+        db.save_sudachi_readings(tokenized.items(), conn)
+        if drop_missing:
+            db.delete_readings(missing, conn)
+            counts["dropped"] += len(missing)
+        done += len(rows)
+        if on_progress:
+            on_progress(done, total)
+    if counts["changed"] or counts["dropped"]:
+        counts["manifests"] = db.delete_manifests(conn, version)
+    return counts
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import List
+from typing import Any, Iterable, List, Optional, Sequence, Union
 from .normalize import normalize_kana, normalize_for_keypuncher_check
 from . import parser
 import time
@@ -8,6 +8,7 @@ import asyncio
 import re
 import openai
 import json
+import math
 from collections import Counter
 import Levenshtein
 from functools import lru_cache
@@ -16,8 +17,45 @@ client = openai.OpenAI()
 async_client = openai.AsyncOpenAI()
 # Default model uses GPT-4.1 mini with knowledge cutoff 2025-04-14
 DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini-2025-04-14")
+# Bump whenever the prompt or candidate configuration changes so cached
+# results produced by the previous version are no longer served.
+PROMPT_VERSION = 1
+# Candidate generation: "sampling" issues two sampled completions per name,
+# "logprobs" a single greedy one ranked by its token log probabilities and
+# "staged" samples only when the greedy answer misses the reading to verify
+CANDIDATE_MODE = os.getenv("FURIGANA_CANDIDATE_MODE", "sampling")
+# Version tag stored with cached verdicts and candidate lists
+CACHE_VERSION = (
+    DEFAULT_MODEL
+    if CANDIDATE_MODE == "sampling"
+    else f"{DEFAULT_MODEL}+{CANDIDATE_MODE}",
+    PROMPT_VERSION,
+)
 # Maximum number of unique candidate readings kept
 MAX_CANDIDATES = 9
+# (temperature, n) of the staged mode; later stages run only when needed
+STAGES = [(0.0, 1), (0.7, 5)]
+# Alternatives requested per output token and sequences kept in logprobs mode
+TOP_LOGPROBS = 5
+LOGPROB_BEAM = 16
+# Confidence band of each candidate rank as (rank value) -> (exclusive upper
+# bound).  Logprobs-mode matches are raised within their rank's band by the
+# reading's probability, so a rank never overlaps the next better one and
+# first-rank matches stay below component index verdicts (90).
+RANK_BANDS = {85: 90, 80: 85, 70: 80, 60: 70}
+
+# A candidate reading, or ``[reading, probability]`` in logprobs mode (lists
+# rather than tuples, as they are stored as JSON)
+Candidate = Union[str, Sequence]
+
+# Default ``sudachi`` of the candidate functions: tokenize the name.  Callers
+# that already know Sudachi's reading (``None`` if it had none) pass it in.
+_TOKENIZE: Any = object()
+
+
+def _sudachi_reading(name: str, sudachi: Optional[str]) -> Optional[str]:
+    return parser.sudachi_reading(name) if sudachi is _TOKENIZE else sudachi
+
 
 # regex for the first katakana sequence; also accepts half/full-width digits
 # match contiguous katakana or full/half width digits
@@ -60,15 +98,20 @@ async def _acall_with_backoff(**kwargs):
 
 
 @lru_cache(maxsize=128)
-def gpt_candidates(name: str) -> List[str]:
-    """Return candidate readings for ``name`` using Sudachi and GPT."""
+def gpt_candidates(name: str, sudachi: Optional[str] = _TOKENIZE) -> List[Candidate]:
+    """Return candidate readings for ``name`` using Sudachi and GPT.
+
+    ``sudachi`` is Sudachi's reading of ``name`` if already known.
+    """
+    if CANDIDATE_MODE == "logprobs":
+        return _rank_candidates(name, gpt_ranked_candidates(name), sudachi)
     prompt = f"{name} の読みをカタカナで答えて"
     configs = [(0.0, 3), (0.7, 5)]
 
     cand: List[str] = []
     seen = set()
 
-    sudachi = parser.sudachi_reading(name)
+    sudachi = _sudachi_reading(name, sudachi)
     if sudachi:
         norm = normalize_kana(sudachi)
         seen.add(norm)
@@ -94,8 +137,13 @@ def gpt_candidates(name: str) -> List[str]:
     return cand
 
 
-async def async_gpt_candidates(name: str) -> List[str]:
+async def async_gpt_candidates(
+    name: str, sudachi: Optional[str] = _TOKENIZE
+) -> List[Candidate]:
     """Asynchronous version of ``gpt_candidates``."""
+    if CANDIDATE_MODE == "logprobs":
+        ranked = await async_gpt_ranked_candidates(name)
+        return _rank_candidates(name, ranked, sudachi)
     prompt = f"{name} の読みをカタカナで答えて"
     configs = [(0.0, 3), (0.7, 5)]
 
@@ -114,7 +162,7 @@ async def async_gpt_candidates(name: str) -> List[str]:
     cand: List[str] = []
     seen = set()
 
-    sudachi = parser.sudachi_reading(name)
+    sudachi = _sudachi_reading(name, sudachi)
     if sudachi:
         norm = normalize_kana(sudachi)
         seen.add(norm)
@@ -133,14 +181,172 @@ async def async_gpt_candidates(name: str) -> List[str]:
     return cand
 
 
+def _ranked_readings(tokens) -> List[tuple[str, float]]:
+    """Return readings and probabilities derived from token logprobs.
+
+    ``tokens`` is the ``logprobs.content`` list of one completion.  Sequences
+    are expanded with a beam over the top alternatives of every position
+    (treating positions as independent), cleaned like sampled answers, and
+    the probabilities of identical readings are summed.  Beams are built
+    from the tokens' UTF-8 ``bytes``, since a token may hold only part of a
+    kana, and decoded once complete.
+    """
+    beams = [(b"", 0.0)]
+    for tok in tokens:
+        alts = tok.top_logprobs or [tok]
+        beams = sorted(
+            (
+                (data + _token_bytes(a), lp + a.logprob)
+                for data, lp in beams
+                for a in alts
+            ),
+            key=lambda b: b[1],
+            reverse=True,
+        )[:LOGPROB_BEAM]
+    probs: dict[str, float] = {}
+    for data, lp in beams:
+        norm = _clean_reading(data.decode("utf-8", errors="ignore").strip())
+        if norm:
+            probs[norm] = probs.get(norm, 0.0) + math.exp(lp)
+    ranked = sorted(probs.items(), key=lambda x: x[1], reverse=True)
+    return ranked[:MAX_CANDIDATES]
+
+
+def _token_bytes(tok) -> bytes:
+    raw = getattr(tok, "bytes", None)
+    return bytes(raw) if raw is not None else tok.token.encode("utf-8")
+
+
+def _logprob_request(name: str) -> dict:
+    return dict(
+        model=DEFAULT_MODEL,
+        messages=[{"role": "user", "content": f"{name} の読みをカタカナで答えて"}],
+        temperature=0.0,
+        logprobs=True,
+        top_logprobs=TOP_LOGPROBS,
+        max_tokens=32,
+    )
+
+
+@lru_cache(maxsize=128)
+def gpt_ranked_candidates(name: str) -> List[tuple[str, float]]:
+    """Return GPT readings of ``name`` with probabilities from one request."""
+    res = _call_with_backoff(**_logprob_request(name))
+    return _ranked_readings(res.choices[0].logprobs.content)
+
+
+async def async_gpt_ranked_candidates(name: str) -> List[tuple[str, float]]:
+    """Asynchronous version of ``gpt_ranked_candidates``."""
+    res = await _acall_with_backoff(**_logprob_request(name))
+    return _ranked_readings(res.choices[0].logprobs.content)
+
+
+def _rank_candidates(
+    name: str, ranked: List[tuple[str, float]], sudachi: Optional[str] = _TOKENIZE
+) -> List[Candidate]:
+    """Return Sudachi's reading followed by ``[reading, probability]`` pairs."""
+    cand: List[Candidate] = []
+    seen = set()
+    sudachi = _sudachi_reading(name, sudachi)
+    if sudachi:
+        cand.append(normalize_kana(sudachi))
+        seen.add(cand[0])
+    for reading, prob in ranked:
+        if reading not in seen:
+            seen.add(reading)
+            cand.append([reading, prob])
+    return cand[:MAX_CANDIDATES]
+
+
+def _seed_candidates(name: str, sudachi: Optional[str]) -> tuple[List[str], set]:
+    cand: List[str] = []
+    sudachi = _sudachi_reading(name, sudachi)
+    if sudachi:
+        cand.append(normalize_kana(sudachi))
+    return cand, set(cand)
+
+
+def _add_choices(cand: List[str], seen: set, res) -> None:
+    for c in res.choices:
+        if len(cand) >= MAX_CANDIDATES:
+            break
+        norm = _clean_reading(c.message.content.strip())
+        if norm not in seen:
+            seen.add(norm)
+            cand.append(norm)
+
+
+def _covers(cand: List[str], readings: Iterable[str]) -> bool:
+    known = {normalize_for_keypuncher_check(c) for c in cand}
+    return all(normalize_for_keypuncher_check(r) in known for r in readings)
+
+
+def _stage_request(name: str, temp: float, n: int) -> dict:
+    return dict(
+        model=DEFAULT_MODEL,
+        messages=[{"role": "user", "content": f"{name} の読みをカタカナで答えて"}],
+        temperature=temp,
+        n=n,
+        presence_penalty=1.0,
+    )
+
+
+def staged_candidates(
+    name: str,
+    readings: Iterable[str],
+    stats: Counter | None = None,
+    sudachi: Optional[str] = _TOKENIZE,
+) -> tuple[List[str], bool]:
+    """Return candidates for ``name``, sampling more only when needed.
+
+    The stages of ``STAGES`` run in order and stop early once every reading
+    in ``readings`` is among the candidates.  Stage calls and early exits are
+    counted in ``stats``; ``sudachi`` is Sudachi's reading if already known.
+    Returns the candidates and whether every stage ran; only complete lists
+    should be cached for other readings.
+    """
+    readings = list(readings)
+    stats = stats if stats is not None else Counter()
+    cand, seen = _seed_candidates(name, sudachi)
+    for i, (temp, n) in enumerate(STAGES):
+        if i and _covers(cand, readings):
+            stats["early_exit"] += 1
+            return cand, False
+        _add_choices(cand, seen, _call_with_backoff(**_stage_request(name, temp, n)))
+        stats[f"stage{i + 1}"] += 1
+    return cand, True
+
+
+async def async_staged_candidates(
+    name: str,
+    readings: Iterable[str],
+    stats: Counter | None = None,
+    sudachi: Optional[str] = _TOKENIZE,
+) -> tuple[List[str], bool]:
+    """Asynchronous version of ``staged_candidates``."""
+    readings = list(readings)
+    stats = stats if stats is not None else Counter()
+    cand, seen = _seed_candidates(name, sudachi)
+    for i, (temp, n) in enumerate(STAGES):
+        if i and _covers(cand, readings):
+            stats["early_exit"] += 1
+            return cand, False
+        res = await _acall_with_backoff(**_stage_request(name, temp, n))
+        _add_choices(cand, seen, res)
+        stats[f"stage{i + 1}"] += 1
+    return cand, True
+
+
 def calc_confidence(
-    row_reading: str, candidates: List[str], sudachi: str | None = None
+    row_reading: str, candidates: List[Candidate], sudachi: str | None = None
 ) -> tuple[int, str]:
     """Return confidence percentage and short reason.
 
     ``candidates`` must be in the same order returned by
     :func:`gpt_candidates`, i.e. Sudachi's reading first (if present)
-    followed by GPT results.
+    followed by GPT results.  Candidates carrying the model's probability
+    (logprobs mode) are raised by it within the rank's band, see
+    ``RANK_BANDS``.
     """
 
     target = normalize_for_keypuncher_check(row_reading)
@@ -155,6 +361,7 @@ def calc_confidence(
 
     gpt_index = 0
     for cand in candidates:
+        cand, prob = (cand, None) if isinstance(cand, str) else cand
         cand_norm = normalize_for_keypuncher_check(cand)
         if sudachi_norm and cand_norm == sudachi_norm:
             # skip sudachi candidate already handled
@@ -162,14 +369,19 @@ def calc_confidence(
         gpt_index += 1
         if target == cand_norm:
             if gpt_index == 1:
-                return 85, "候補1位一致"
+                conf, reason = 85, "候補1位一致"
             elif gpt_index == 2:
-                return 80, "候補2位一致"
+                conf, reason = 80, "候補2位一致"
             elif gpt_index == 3:
-                return 70, "候補3位一致"
+                conf, reason = 70, "候補3位一致"
             elif gpt_index <= 5:
-                return 60, "5位内一致"
-            break
+                conf, reason = 60, "5位内一致"
+            else:
+                break
+            if prob is not None:
+                width = RANK_BANDS[conf] - conf
+                conf += min(width - 1, int(width * min(max(prob, 0.0), 1.0)))
+            return conf, reason
 
     return 0, "候補外･要確認"
 
@@ -198,10 +410,30 @@ class Scorer:
             )
 
         counts = Counter(all_candidates)
-        unique_candidates = list(counts.keys())
+        support = {f: n / len(llm_results) for f, n in counts.items()}
+        return self._score(support, original_furigana)
+
+    def get_ranked_candidates(
+        self, ranked: List[tuple[str, float]], original_furigana: str
+    ) -> dict:
+        """Return scored candidates from ``gpt_ranked_candidates`` output.
+
+        The model's probability of each reading replaces the agreement ratio
+        between agents as its support.
+        """
+        if not ranked:
+            return self._build_response(
+                "error",
+                "有効なフリガナ候補を生成できませんでした。",
+                original_furigana,
+                [],
+            )
+        return self._score(dict(ranked), original_furigana)
+
+    def _score(self, support: dict[str, float], original_furigana: str) -> dict:
         scored_list = []
-        for f in unique_candidates:
-            score = self._calculate_score(f, original_furigana, counts[f], len(llm_results))
+        for f, value in support.items():
+            score = self._calculate_score(f, original_furigana, value)
             scored_list.append({"furigana": f, "score": round(score, 4)})
 
         scored_list.sort(key=lambda x: x["score"], reverse=True)
@@ -209,11 +441,10 @@ class Scorer:
         return self._judge(original_furigana, scored_list)
 
     def _calculate_score(
-        self, candidate_furigana: str, original_furigana: str, count: int, total_agents: int
+        self, candidate_furigana: str, original_furigana: str, support_score: float
     ) -> float:
         """Calculate score for a single candidate."""
 
-        support_score = count / total_agents
         distance = Levenshtein.distance(candidate_furigana, original_furigana)
         max_len = max(len(candidate_furigana), len(original_furigana))
         similarity_score = (max_len - distance) / max_len if max_len > 0 else 1.0
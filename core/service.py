@@ -0,0 +1,325 @@
+from __future__ import annotations
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+from . import db
+from .cache import CacheBackend
+from .client import DEFAULT_HOST, DEFAULT_PORT
+from .index import ReadingIndex
+from .model import DEFAULT_THRESHOLD, ReadingModel
+from .utils import async_process_dataframe
+
+# columns of the frames built from queued requests
+_NAME = "name"
+_READING = "reading"
+
+
+class CheckService:
+    """Check single name/furigana pairs for many callers.
+
+    The service runs its own event loop thread that keeps the cache
+    connection, Sudachi and the OpenAI clients warm.  Requests arriving
+    within ``batch_window`` seconds (or until ``max_batch`` are queued) are
+    coalesced into one ``async_process_dataframe`` call, so duplicate names
+    in a batch are resolved once and cache reads and writes are batched.
+    ``cache`` replaces the SQLite file at ``db_path`` with another backend.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path | None = None,
+        batch_window: float = 0.02,
+        max_batch: int = 100,
+        concurrency: int = 10,
+        reading_model: ReadingModel | None = None,
+        model_threshold: float = DEFAULT_THRESHOLD,
+        reading_index: ReadingIndex | None = None,
+        use_cache: bool = True,
+        cache: CacheBackend | None = None,
+    ):
+        self.db_path = db_path
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.concurrency = concurrency
+        self.reading_model = reading_model
+        self.model_threshold = model_threshold
+        self.reading_index = reading_index
+        self.use_cache = use_cache
+        self.cache = cache
+        self.requests = 0
+        self.batches = 0
+        self.total_latency = 0.0
+        self.last_used = time.monotonic()
+        self._queue: list[tuple[str, str, float, asyncio.Future]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        # running batches; the loop only keeps weak references to tasks
+        self._tasks: set[asyncio.Task] = set()
+        self._conn = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "CheckService":
+        """Start the event loop thread and open the cache connection.
+
+        Errors opening the cache are raised here instead of in the thread.
+        """
+        ready = threading.Event()
+        failure: list[BaseException] = []
+
+        def run() -> None:
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                # the connection is used only from the loop thread
+                self._conn = (
+                    db.init_db(self.db_path)
+                    if self.use_cache and self.cache is None
+                    else None
+                )
+            except BaseException as exc:
+                failure.append(exc)
+                self._loop.close()
+                self._loop = None
+                return
+            finally:
+                ready.set()
+            self._loop.run_forever()
+            if self._conn is not None:
+                self._conn.close()
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="check-service", daemon=True)
+        self._thread.start()
+        ready.wait()
+        if failure:
+            self._thread.join()
+            self._thread = None
+            raise failure[0]
+        return self
+
+    def close(self, timeout: float | None = 30.0) -> None:
+        """Finish queued and running checks, then stop the event loop thread.
+
+        Batches still running after ``timeout`` seconds are cancelled and
+        their callers receive an error instead of waiting for a reply.
+        """
+        if self._loop is not None and self._thread is not None:
+            drain = asyncio.run_coroutine_threadsafe(self._drain(timeout), self._loop)
+            try:
+                drain.result()
+            finally:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join()
+                self._loop = self._thread = None
+
+    async def _drain(self, timeout: float | None) -> None:
+        self._flush()
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        if not pending:
+            return
+        for task in pending:
+            task.cancel()
+        await asyncio.wait(pending)
+        # let the failed checks reply, then drop the candidate requests the
+        # cancelled batches were waiting on
+        await asyncio.sleep(0)
+        rest = asyncio.all_tasks() - {asyncio.current_task()}
+        for task in rest:
+            task.cancel()
+        if rest:
+            await asyncio.wait(rest)
+
+    def submit(self, name: str, reading: str) -> Future:
+        """Queue a check from any thread and return a future of the result."""
+        if self._loop is None:
+            raise RuntimeError("service is not running")
+        self.last_used = time.monotonic()
+        return asyncio.run_coroutine_threadsafe(self.check(name, reading), self._loop)
+
+    def stats(self) -> dict[str, Any]:
+        sqlite = self.use_cache and self.cache is None
+        return {
+            "db": str(db.cache_path(self.db_path)) if sqlite else None,
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch": self.requests / self.batches if self.batches else 0.0,
+            "avg_latency_ms": (
+                1000 * self.total_latency / self.requests if self.requests else 0.0
+            ),
+        }
+
+    async def check(self, name: str, reading: str) -> dict[str, Any]:
+        """Return the verdict for one pair; must run on the service loop.
+
+        The result holds ``confidence``, ``reason``, the size of the
+        micro-batch it was processed in and the request latency.
+        """
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._queue.append((name, reading, time.perf_counter(), fut))
+        if len(self._queue) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._queue = self._queue, []
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(
+        self, batch: list[tuple[str, str, float, asyncio.Future]]
+    ) -> None:
+        df = pd.DataFrame(
+            {_NAME: [b[0] for b in batch], _READING: [b[1] for b in batch]},
+            dtype=object,
+        )
+        try:
+            out = await async_process_dataframe(
+                df,
+                _NAME,
+                _READING,
+                db_conn=self._conn,
+                concurrency=self.concurrency,
+                reading_model=self.reading_model,
+                model_threshold=self.model_threshold,
+                reading_index=self.reading_index,
+                cache=self.cache if self.use_cache else None,
+            )
+        except asyncio.CancelledError:
+            _fail(batch, RuntimeError("check service closed"))
+            raise
+        except Exception as exc:
+            _fail(batch, exc)
+            return
+
+        self.batches += 1
+        now = time.perf_counter()
+        for (name, reading, start, fut), conf, reason in zip(
+            batch, out["信頼度"], out["理由"]
+        ):
+            latency = now - start
+            self.requests += 1
+            self.total_latency += latency
+            if not fut.done():
+                fut.set_result({
+                    "name": name,
+                    "reading": reading,
+                    "confidence": int(conf),
+                    "reason": reason,
+                    "batch_size": len(batch),
+                    "latency_ms": round(latency * 1000, 3),
+                })
+
+
+def _fail(
+    batch: list[tuple[str, str, float, asyncio.Future]], exc: BaseException
+) -> None:
+    for *_, fut in batch:
+        if not fut.done():
+            fut.set_exception(exc)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service: CheckService
+    timeout_s: float = 120.0
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, data: Any) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, "application/json; charset=utf-8")
+
+    def do_GET(self) -> None:
+        if self.path == "/stats":
+            self._send_json(200, self.service.stats())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        if self.path != "/check":
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length).decode("utf-8")
+        ndjson = "ndjson" in (self.headers.get("Content-Type") or "")
+        try:
+            items = (
+                [json.loads(line) for line in raw.splitlines() if line.strip()]
+                if ndjson
+                else [json.loads(raw)]
+            )
+            pairs = [(str(i["name"]), str(i.get("reading") or "")) for i in items]
+        except (ValueError, KeyError, TypeError, AttributeError) as exc:
+            self._send_json(400, {"error": f"invalid request: {exc}"})
+            return
+
+        futures = [self.service.submit(n, r) for n, r in pairs]
+        try:
+            results = [f.result(self.timeout_s) for f in futures]
+        except Exception as exc:
+            self._send_json(500, {"error": str(exc)})
+            return
+        if ndjson:
+            body = "".join(
+                json.dumps(r, ensure_ascii=False) + "\n" for r in results
+            ).encode("utf-8")
+            self._send(200, body, "application/x-ndjson; charset=utf-8")
+        else:
+            self._send_json(200, results[0])
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def make_server(
+    service: CheckService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT
+) -> ThreadingHTTPServer:
+    """Return an HTTP server exposing ``service`` (not yet serving).
+
+    ``POST /check`` accepts ``{"name": ..., "reading": ...}`` or, with an
+    ``application/x-ndjson`` body, one such object per line and answers in
+    the same shape.  ``GET /stats`` reports request and batch counters.
+    """
+    handler = type("CheckHandler", (_Handler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(
+    server: ThreadingHTTPServer,
+    service: CheckService,
+    idle_timeout: float | None = None,
+) -> None:
+    """Serve until interrupted or, with ``idle_timeout``, until idle that long."""
+    if idle_timeout:
+        def watch() -> None:
+            while time.monotonic() - service.last_used < idle_timeout:
+                time.sleep(min(1.0, idle_timeout / 4))
+            server.shutdown()
+
+        threading.Thread(target=watch, name="idle-watch", daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
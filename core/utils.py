@@ -1,13 +1,460 @@
 from __future__ import annotations
+import numpy as np
+import os
 import pandas as pd
+import posixpath
+import re
+import zipfile
 from io import BytesIO
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape as xml_escape
+from openpyxl import load_workbook
+from openpyxl.utils import column_index_from_string, get_column_letter
+import pyarrow.parquet as pq
 from . import parser, scorer, db
 from .normalize import normalize_for_keypuncher_check
+from .model import ReadingModel, DEFAULT_THRESHOLD
+from .index import ReadingIndex, INDEX_CONFIDENCE, INDEX_REASON
+from .cache import CacheBackend, SQLiteCache
 import sqlite3
 import asyncio
 from asyncio import Semaphore
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 
-from typing import Callable, Optional
+from collections import Counter
+from typing import Callable, Hashable, Iterator, Mapping, Optional
+
+
+# confidence of rows that are not resolved yet
+_UNSET = -1
+
+
+def _new_confidences(size: int) -> np.ndarray:
+    """Return an unresolved per-row confidence array (0-100 fits ``int8``)."""
+    return np.full(size, _UNSET, dtype=np.int8)
+
+
+class _ReasonCodes:
+    """Per-row reasons stored as small integer codes into a category list."""
+
+    def __init__(self, size: int):
+        self.codes = np.full(size, -1, dtype=np.int16)
+        self.categories: list[str] = []
+        self._lookup: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _code(self, reason: str) -> int:
+        code = self._lookup.get(reason)
+        if code is None:
+            code = self._lookup[reason] = len(self.categories)
+            self.categories.append(reason)
+        return code
+
+    def __setitem__(self, idx, reason: str) -> None:
+        self.codes[idx] = self._code(reason)
+
+    def assign(self, idx, reasons) -> None:
+        """Set the rows at ``idx`` to the matching entries of ``reasons``."""
+        codes, uniques = pd.factorize(np.asarray(reasons, dtype=object))
+        mapped = np.array([self._code(r) for r in uniques], dtype=np.int16)
+        self.codes[idx] = mapped[codes]
+
+    def __getitem__(self, idx: int) -> str | None:
+        code = self.codes[idx]
+        return self.categories[code] if code >= 0 else None
+
+    def take(self, indices: np.ndarray) -> "_ReasonCodes":
+        """Return the reasons at ``indices``, sharing the category list."""
+        out = _ReasonCodes(0)
+        out.codes = self.codes[indices]
+        out.categories = self.categories
+        out._lookup = self._lookup
+        return out
+
+    def to_categorical(self) -> pd.Categorical:
+        return pd.Categorical.from_codes(self.codes, categories=self.categories)
+
+
+def _attach_results(
+    df: pd.DataFrame, confs: np.ndarray, reasons: _ReasonCodes, output: str
+) -> pd.DataFrame:
+    """Return the pipeline result for ``df`` in the requested ``output`` mode."""
+    columns = {"信頼度": confs, "理由": reasons.to_categorical()}
+    if output == "columns":
+        return pd.DataFrame(columns, index=df.index)
+    if output == "copy":
+        df = df.copy()
+    elif output != "attach":
+        raise ValueError(f"unknown output mode: {output}")
+    for col, values in columns.items():
+        df[col] = values
+    return df
+
+
+def _local_candidates(
+    name: str,
+    readings: list[str],
+    cached: dict[str, list[str]],
+    reading_model: ReadingModel | None,
+    threshold: float,
+) -> list[str] | None:
+    """Return candidates available without GPT or ``None``.
+
+    Candidate lists cached in the database (e.g. by the prefetch job) are
+    preferred, followed by confident predictions of ``reading_model``.  The
+    model's list is only used when it contains every pending reading of the
+    name, as a correct reading the model never saw would be scored a miss.
+    """
+    cands = cached.get(name)
+    if cands is None and reading_model is not None:
+        cands = reading_model.candidates(name, threshold)
+        if cands is not None and any(
+            scorer.calc_confidence(r, cands)[0] == 0 for r in readings
+        ):
+            cands = None
+    return cands
+
+
+# resolution paths recorded with cached verdicts
+SOURCE_INDEX = "index"
+SOURCE_SUDACHI = "sudachi"
+SOURCE_CANDIDATES = "candidates"
+SOURCE_MODEL = "model"
+
+# new verdicts of the first pass per source, to be cached
+Resolved = dict[str, list[tuple[str, str, int, str]]]
+# pending names with their ``(pair, reading)`` entries, processed row count,
+# cache hits, new verdicts and new Sudachi readings
+FirstPass = tuple[
+    dict[str, dict[str, list | str | None]],
+    int,
+    list[tuple[str, str]],
+    Resolved,
+    dict[str, str | None],
+]
+
+
+def _gpt_candidates(
+    name: str, info: dict, stats: Counter | None
+) -> tuple[list[str], bool]:
+    """Return GPT candidates for a pending name and whether to cache them.
+
+    Sudachi's reading found by the first pass is passed on, so names are not
+    tokenized again.
+    """
+    sudachi = info["sudachi"]
+    if scorer.CANDIDATE_MODE == "staged":
+        readings = [r for _, r in info["pairs"]]
+        return scorer.staged_candidates(name, readings, stats, sudachi)
+    return scorer.gpt_candidates(name, sudachi), True
+
+
+async def _async_gpt_candidates(
+    name: str, info: dict, stats: Counter | None
+) -> tuple[list[str], bool]:
+    """Asynchronous version of ``_gpt_candidates``."""
+    sudachi = info["sudachi"]
+    if scorer.CANDIDATE_MODE == "staged":
+        return await scorer.async_staged_candidates(
+            name, [r for _, r in info["pairs"]], stats, sudachi
+        )
+    return await scorer.async_gpt_candidates(name, sudachi), True
+
+
+def _map_gpt_candidates(
+    names: list[str],
+    pending: dict[str, dict[str, list | str | None]],
+    stats: Counter | None,
+    pool: ThreadPoolExecutor | None,
+) -> Iterator[tuple[list[str], bool]]:
+    """Yield ``_gpt_candidates`` results for ``names`` in order.
+
+    Calls run on ``pool`` threads when given; each call counts into its own
+    counter, merged into ``stats`` on the calling thread.
+    """
+    def fetch(name: str) -> tuple[list[str], bool, Counter]:
+        counter: Counter = Counter()
+        return (*_gpt_candidates(name, pending[name], counter), counter)
+
+    for cands, complete, counter in (pool.map if pool else map)(fetch, names):
+        if stats is not None:
+            stats.update(counter)
+        yield cands, complete
+
+
+def sudachi_matches(sudachi_kana: str | None, reading: str) -> bool:
+    """Return whether the Sudachi reading confirms ``reading`` outright."""
+    return bool(sudachi_kana) and normalize_for_keypuncher_check(
+        sudachi_kana
+    ) == normalize_for_keypuncher_check(reading)
+
+
+def _factorize_pairs(
+    df: pd.DataFrame, name_col: str, furi_col: str
+) -> tuple[np.ndarray, list[str], list[str]]:
+    """Return per-row codes into the unique ``(name, reading)`` pairs of ``df``.
+
+    Names and readings are factorized separately and their codes combined,
+    so only unique values are converted to text (missing values become
+    empty strings).  Returns the row codes and the names and readings of the
+    pairs in first-seen order.
+    """
+    name_codes, name_values = pd.factorize(df[name_col], use_na_sentinel=False)
+    if furi_col in df.columns:
+        reading_codes, reading_values = pd.factorize(
+            df[furi_col], use_na_sentinel=False
+        )
+    else:
+        reading_codes = np.zeros(len(df), dtype=np.intp)
+        reading_values = [""]
+    width = max(len(reading_values), 1)
+    codes, keys = pd.factorize(name_codes.astype(np.int64) * width + reading_codes)
+    names = ["" if pd.isna(v) else str(v) for v in name_values]
+    readings = ["" if pd.isna(v) else str(v) for v in reading_values]
+    return (
+        codes,
+        [names[k // width] for k in keys],
+        [readings[k % width] for k in keys],
+    )
+
+
+def _first_pass(
+    names: list[str],
+    readings: list[str],
+    weights: np.ndarray,
+    confs: np.ndarray,
+    reasons: _ReasonCodes,
+    on_progress: Optional[Callable[[int, int], None]],
+    cache: CacheBackend | None,
+    reading_index: ReadingIndex | None,
+) -> FirstPass:
+    """Resolve unique pairs without GPT and return the pending names.
+
+    ``names`` and ``readings`` describe the unique ``(name, reading)`` pairs
+    of a frame and ``weights`` the number of rows sharing each pair.  Pairs
+    are settled by the length check, the verdict cache (looked up in bulk),
+    the component reading index and Sudachi, in that order.  ``confs`` and
+    ``reasons`` are filled in place per pair; the remaining pairs are grouped
+    by name together with the Sudachi reading.  Sudachi readings stored in
+    the cache are used instead of tokenizing again.  Returns the pending
+    mapping, the processed row count, the ``(name, reading)`` cache hits, the
+    new verdicts per source and the newly tokenized Sudachi readings, so
+    callers can persist them.
+    """
+    total = int(weights.sum())
+    processed = 0
+    pending: dict[str, dict[str, list | str | None]] = {}
+    hits: list[tuple[str, str]] = []
+    resolved: Resolved = {SOURCE_INDEX: [], SOURCE_SUDACHI: []}
+    tokenized: dict[str, str | None] = {}
+    valid: list[tuple[int, str, str]] = []
+    todo: list[tuple[int, str, str]] = []
+
+    for pair, (name, reading) in enumerate(zip(names, readings)):
+        if not name or len(name) > 50:
+            confs[pair] = 0
+            reasons[pair] = "長すぎる"
+            processed += int(weights[pair])
+            if on_progress:
+                on_progress(processed, total)
+            continue
+        valid.append((pair, name, reading))
+
+    verdicts = (
+        cache.get_readings(((n, r) for _, n, r in valid), scorer.CACHE_VERSION)
+        if cache and valid
+        else {}
+    )
+    for pair, name, reading in valid:
+        cached = verdicts.get((name, reading))
+        if cached:
+            hits.append((name, reading))
+            confs[pair] = cached[0]
+            reasons[pair] = cached[1]
+            processed += int(weights[pair])
+            if on_progress:
+                on_progress(processed, total)
+            continue
+
+        if reading_index is not None and reading_index.match(name, reading):
+            confs[pair] = INDEX_CONFIDENCE
+            reasons[pair] = INDEX_REASON
+            resolved[SOURCE_INDEX].append(
+                (name, reading, INDEX_CONFIDENCE, INDEX_REASON)
+            )
+            processed += int(weights[pair])
+            if on_progress:
+                on_progress(processed, total)
+            continue
+
+        todo.append((pair, name, reading))
+
+    stored = (
+        cache.get_sudachi(name for _, name, _ in todo) if cache and todo else {}
+    )
+    for pair, name, reading in todo:
+        if name not in stored:
+            stored[name] = tokenized[name] = parser.sudachi_reading(name)
+        sudachi_kana = stored[name]
+        if sudachi_matches(sudachi_kana, reading):
+            confs[pair] = 100
+            reasons[pair] = "辞書候補一致"
+            resolved[SOURCE_SUDACHI].append((name, reading, 100, "辞書候補一致"))
+            processed += int(weights[pair])
+            if on_progress:
+                on_progress(processed, total)
+            continue
+
+        entry = pending.setdefault(name, {"pairs": [], "sudachi": sudachi_kana})
+        entry["pairs"].append((pair, reading))
+
+    return pending, processed, hits, resolved, tokenized
+
+
+def name_partitions(names: pd.Series, parts: int) -> np.ndarray:
+    """Return a stable partition number in ``range(parts)`` for each name.
+
+    The hash does not depend on the process or machine, so every occurrence
+    of a name lands in the same partition.
+    """
+    keys = names.where(names.notna(), "").astype(str).to_numpy(dtype=object)
+    return (pd.util.hash_array(keys) % parts).astype(np.int64)
+
+
+def _first_pass_shard(
+    args: tuple[list, list, np.ndarray, CacheBackend | None, str | None],
+) -> tuple[np.ndarray, _ReasonCodes, dict, list, Resolved, dict]:
+    """Process-pool entry point running ``_first_pass`` on one shard.
+
+    Each worker opens its own read view of the cache (see
+    ``CacheBackend.worker_cache``), reading index and (on import of
+    :mod:`core.parser`) Sudachi tokenizer.
+    """
+    names, readings, weights, cache, index_path = args
+    index = ReadingIndex(index_path) if index_path else None
+    try:
+        confs = _new_confidences(len(names))
+        reasons = _ReasonCodes(len(names))
+        pending, _, hits, resolved, tokenized = _first_pass(
+            names, readings, weights, confs, reasons, None, cache, index
+        )
+    finally:
+        if cache is not None:
+            cache.close()
+        if index is not None:
+            index.close()
+    return confs, reasons, pending, hits, resolved, tokenized
+
+
+def _sharded_first_pass(
+    names: list[str],
+    readings: list[str],
+    weights: np.ndarray,
+    confs: np.ndarray,
+    reasons: _ReasonCodes,
+    on_progress: Optional[Callable[[int, int], None]],
+    cache: CacheBackend | None,
+    reading_index: ReadingIndex | None,
+    processes: int,
+) -> FirstPass:
+    """Run ``_first_pass`` on hash partitions of the pairs in a process pool.
+
+    Pairs are partitioned by name so every pending name lives in exactly one
+    shard; shard results are merged back by pair position as they complete.
+    """
+    total = int(weights.sum())
+    shard_of = name_partitions(pd.Series(names, dtype=object), processes)
+    worker_cache = cache.worker_cache() if cache else None
+    index_path = reading_index.path if reading_index is not None else None
+
+    processed = 0
+    pending: dict[str, dict[str, list | str | None]] = {}
+    hits: list[tuple[str, str]] = []
+    resolved: Resolved = {SOURCE_INDEX: [], SOURCE_SUDACHI: []}
+    tokenized: dict[str, str | None] = {}
+    with ProcessPoolExecutor(processes) as pool:
+        futures = {}
+        for shard in range(processes):
+            pos = np.flatnonzero(shard_of == shard)
+            if len(pos):
+                args = (
+                    [names[i] for i in pos],
+                    [readings[i] for i in pos],
+                    weights[pos],
+                    worker_cache,
+                    index_path,
+                )
+                futures[pool.submit(_first_pass_shard, args)] = pos
+        for fut in as_completed(futures):
+            pos = futures[fut]
+            s_confs, s_reasons, s_pending, s_hits, s_resolved, s_tokenized = (
+                fut.result()
+            )
+            done = np.flatnonzero(s_confs != _UNSET)
+            confs[pos[done]] = s_confs[done]
+            for local in done:
+                reasons[pos[local]] = s_reasons[local]
+            processed += int(weights[pos[done]].sum())
+            for name, info in s_pending.items():
+                pending[name] = {
+                    "pairs": [(int(pos[i]), r) for i, r in info["pairs"]],
+                    "sudachi": info["sudachi"],
+                }
+            hits.extend(s_hits)
+            for source, rows in s_resolved.items():
+                resolved[source].extend(rows)
+            tokenized.update(s_tokenized)
+            if on_progress:
+                on_progress(processed, total)
+    return pending, processed, hits, resolved, tokenized
+
+
+def _resolve_locally(
+    names: list[str],
+    readings: list[str],
+    weights: np.ndarray,
+    confs: np.ndarray,
+    reasons: _ReasonCodes,
+    on_progress: Optional[Callable[[int, int], None]],
+    cache: CacheBackend | None,
+    reading_index: ReadingIndex | None,
+    processes: int | None,
+) -> tuple[dict[str, dict[str, list | str | None]], int]:
+    """Run the first pass (sharded when ``processes > 1``) and cache its work.
+
+    Cache hits are touched; index and Sudachi verdicts and newly tokenized
+    Sudachi readings are stored in bulk so warm runs skip the tokenizer.
+    """
+    args = (
+        names, readings, weights, confs, reasons, on_progress,
+        cache, reading_index,
+    )
+    if processes and processes > 1 and len(names) > 1:
+        pending, processed, hits, resolved, tokenized = _sharded_first_pass(
+            *args, processes
+        )
+    else:
+        pending, processed, hits, resolved, tokenized = _first_pass(*args)
+    if cache:
+        cache.touch_readings(hits)
+        for source, rows in resolved.items():
+            if rows:
+                cache.put_readings(rows, scorer.CACHE_VERSION, source)
+        if tokenized:
+            cache.put_sudachi(tokenized.items())
+    return pending, processed
+
+
+def _pipeline_cache(
+    db_conn: sqlite3.Connection | None, cache: CacheBackend | None
+) -> CacheBackend | None:
+    """Return ``cache`` or, without one, the SQLite cache of ``db_conn``."""
+    if cache is not None:
+        return cache
+    return SQLiteCache(db_conn) if db_conn else None
 
 
 def process_dataframe(
@@ -17,11 +464,21 @@ def process_dataframe(
     on_progress: Optional[Callable[[int, int], None]] = None,
     db_conn: sqlite3.Connection | None = None,
     batch_size: int = 50,
+    reading_model: ReadingModel | None = None,
+    model_threshold: float = DEFAULT_THRESHOLD,
+    reading_index: ReadingIndex | None = None,
+    processes: int | None = None,
+    stats: Counter | None = None,
+    concurrency: int | None = None,
+    output: str = "copy",
+    cache: CacheBackend | None = None,
 ) -> pd.DataFrame:
     """Process DataFrame rows in batches and append confidence columns.
 
     Duplicate names are consolidated globally so the GPT API is called only
-    once per unique value, mirroring ``async_process_dataframe``.
+    once per unique value, mirroring ``async_process_dataframe``.  Rows are
+    factorized into unique ``(name, reading)`` pairs; each pair is checked
+    and scored once and the verdict is broadcast back to its rows.
 
     Parameters
     ----------
@@ -37,77 +494,100 @@ def process_dataframe(
         Optional database connection for caching.
     batch_size : int, default 50
         Number of rows processed per batch.
+    reading_model : ReadingModel | None
+        Optional offline model consulted before GPT. Names whose top
+        prediction reaches ``model_threshold`` skip the API entirely.
+    model_threshold : float, default 0.9
+        Minimum top probability for accepting offline candidates.
+    reading_index : ReadingIndex | None
+        Optional component index. Names whose surname and given name readings
+        are all known from the cache are resolved before Sudachi and GPT.
+    processes : int | None
+        Run the local first pass (cache, index, Sudachi) on this many worker
+        processes, partitioning rows by name. Each worker opens its own cache
+        connection and tokenizer, so this pays off on large frames only.
+    stats : Counter | None
+        Optional counter receiving run statistics, e.g. the stage decisions
+        of the ``staged`` candidate mode (``stage1``, ``stage2``,
+        ``early_exit``).
+    concurrency : int | None
+        Fetch GPT candidates of each batch on a pool of this many threads,
+        for callers that cannot run ``async_process_dataframe`` (e.g. inside
+        a running event loop). Results are identical to the serial mode.
+    output : {"copy", "attach", "columns"}, default "copy"
+        ``"copy"`` returns a copy of ``df`` with the result columns,
+        ``"attach"`` adds them to ``df`` itself without copying the input and
+        ``"columns"`` returns only the result columns (same index). The
+        confidence column is ``int8`` and the reason column categorical.
+    cache : CacheBackend | None
+        Cache for verdicts, candidate lists and Sudachi readings, e.g. a
+        ``KVCache`` shared by several app instances. Defaults to the SQLite
+        cache of ``db_conn``.
     """
-    confs: list[int | None] = [None] * len(df)
-    reasons: list[str | None] = [None] * len(df)
+    cache = _pipeline_cache(db_conn, cache)
+    codes, pair_names, pair_readings = _factorize_pairs(df, name_col, furi_col)
+    weights = np.bincount(codes, minlength=len(pair_names))
+    confs = _new_confidences(len(pair_names))
+    reasons = _ReasonCodes(len(pair_names))
 
     total = len(df)
-    processed = 0
-    pending: dict[str, dict[str, list | str | None]] = {}
-
-    has_furi = furi_col in df.columns
-    readings = df[furi_col] if has_furi else ["" for _ in range(len(df))]
+    pending, processed = _resolve_locally(
+        pair_names, pair_readings, weights, confs, reasons, on_progress,
+        cache, reading_index, processes,
+    )
 
-    # first pass: handle cached/sudachi results and gather GPT targets
-    for idx, (name_val, reading_val) in enumerate(zip(df[name_col], readings)):
-        name = "" if pd.isna(name_val) else str(name_val)
-        reading = "" if pd.isna(reading_val) else str(reading_val)
-
-        if not name or len(name) > 50:
-            confs[idx] = 0
-            reasons[idx] = "長すぎる"
-            processed += 1
-            if on_progress:
-                on_progress(processed, total)
-            continue
-
-        if db_conn:
-            cached = db.get_reading(name, reading, db_conn)
-            if cached:
-                confs[idx] = cached[0]
-                reasons[idx] = cached[1]
-                processed += 1
-                if on_progress:
-                    on_progress(processed, total)
-                continue
-
-        sudachi_kana = parser.sudachi_reading(name)
-        if sudachi_kana and normalize_for_keypuncher_check(sudachi_kana) == normalize_for_keypuncher_check(reading):
-            confs[idx] = 100
-            reasons[idx] = "辞書候補一致"
-            processed += 1
-            if on_progress:
-                on_progress(processed, total)
-            continue
-
-        entry = pending.setdefault(name, {"rows": [], "sudachi": sudachi_kana})
-        entry["rows"].append((idx, reading))
-
-    if pending:
+    with (
+        ThreadPoolExecutor(concurrency, thread_name_prefix="gpt")
+        if pending and concurrency and concurrency > 1
+        else nullcontext()
+    ) as pool:
         names = list(pending)
         for start in range(0, len(names), batch_size):
             chunk = names[start:start + batch_size]
-            results = [scorer.gpt_candidates(n) for n in chunk]
-            rows_to_save = []
+            cached = (
+                cache.get_candidates(chunk, scorer.CACHE_VERSION) if cache else {}
+            )
+            local = {
+                n: _local_candidates(
+                    n,
+                    [r for _, r in pending[n]["pairs"]],
+                    cached,
+                    reading_model,
+                    model_threshold,
+                )
+                for n in chunk
+            }
+            missing = [n for n, c in local.items() if c is None]
+            modeled = {n for n, c in local.items() if c is not None and n not in cached}
+            fetched = []
+            for n, (cands, complete) in zip(
+                missing, _map_gpt_candidates(missing, pending, stats, pool)
+            ):
+                local[n] = cands
+                if complete:
+                    fetched.append((n, cands))
+            results = [local[n] for n in chunk]
+            rows_to_save: Resolved = {SOURCE_CANDIDATES: [], SOURCE_MODEL: []}
             for name, cands in zip(chunk, results):
                 info = pending[name]
                 sudachi = info.get("sudachi")
-                for idx, reading in info["rows"]:
+                source = SOURCE_MODEL if name in modeled else SOURCE_CANDIDATES
+                for pair, reading in info["pairs"]:
                     conf, reason = scorer.calc_confidence(reading, cands, sudachi)
-                    confs[idx] = conf
-                    reasons[idx] = reason
-                    if db_conn:
-                        rows_to_save.append((name, reading, conf, reason))
-                    processed += 1
+                    confs[pair] = conf
+                    reasons[pair] = reason
+                    if cache:
+                        rows_to_save[source].append((name, reading, conf, reason))
+                    processed += int(weights[pair])
                     if on_progress:
                         on_progress(processed, total)
-            if db_conn and rows_to_save:
-                db.save_many_readings(rows_to_save, db_conn)
+            for source, rows in rows_to_save.items():
+                if cache and rows:
+                    cache.put_readings(rows, scorer.CACHE_VERSION, source)
+            if cache and fetched:
+                cache.put_candidates(fetched, scorer.CACHE_VERSION)
 
-    df = df.copy()
-    df["信頼度"] = confs
-    df["理由"] = reasons
-    return df
+    return _attach_results(df, confs[codes], reasons.take(codes), output)
 
 
 async def async_process_dataframe(
@@ -118,93 +598,382 @@ async def async_process_dataframe(
     db_conn: sqlite3.Connection | None = None,
     batch_size: int = 50,
     concurrency: int = 10,
+    reading_model: ReadingModel | None = None,
+    model_threshold: float = DEFAULT_THRESHOLD,
+    reading_index: ReadingIndex | None = None,
+    processes: int | None = None,
+    stats: Counter | None = None,
+    output: str = "copy",
+    cache: CacheBackend | None = None,
 ) -> pd.DataFrame:
     """Asynchronous version of ``process_dataframe`` with limited concurrency.
 
     Names are deduplicated globally so GPT is called only once per unique name,
     greatly reducing runtime when many duplicates exist.
     """
-    confs: list[int | None] = [None] * len(df)
-    reasons: list[str | None] = [None] * len(df)
+    cache = _pipeline_cache(db_conn, cache)
+    codes, pair_names, pair_readings = _factorize_pairs(df, name_col, furi_col)
+    weights = np.bincount(codes, minlength=len(pair_names))
+    confs = _new_confidences(len(pair_names))
+    reasons = _ReasonCodes(len(pair_names))
     total = len(df)
-    processed = 0
     sem = Semaphore(concurrency)
 
-    async def fetch_candidates(name: str) -> tuple[str, list[str]]:
+    fetched: list[tuple[str, list[str]]] = []
+    cached: dict[str, list[str]] = {}
+
+    async def fetch_candidates(name: str) -> tuple[str, list[str], str]:
+        readings = [r for _, r in pending[name]["pairs"]]
+        cands = _local_candidates(
+            name, readings, cached, reading_model, model_threshold
+        )
+        if cands is not None:
+            source = SOURCE_CANDIDATES if name in cached else SOURCE_MODEL
+            return name, cands, source
         async with sem:
             try:
-                cands = await scorer.async_gpt_candidates(name)
+                cands, complete = await _async_gpt_candidates(
+                    name, pending[name], stats
+                )
             except Exception:
-                cands = []
-        return name, cands
-
-    pending: dict[str, dict[str, list | str | None]] = {}
+                return name, [], SOURCE_CANDIDATES
+        if complete:
+            fetched.append((name, cands))
+        return name, cands, SOURCE_CANDIDATES
 
-    has_furi = furi_col in df.columns
-    readings = df[furi_col] if has_furi else ["" for _ in range(len(df))]
-
-    # first pass: handle cached/sudachi results and collect GPT targets
-    for idx, (name_val, reading_val) in enumerate(zip(df[name_col], readings)):
-        name = "" if pd.isna(name_val) else str(name_val)
-        reading = "" if pd.isna(reading_val) else str(reading_val)
-
-        if not name or len(name) > 50:
-            confs[idx] = 0
-            reasons[idx] = "長すぎる"
-            processed += 1
-            if on_progress:
-                on_progress(processed, total)
-            continue
-
-        if db_conn:
-            cached = db.get_reading(name, reading, db_conn)
-            if cached:
-                confs[idx] = cached[0]
-                reasons[idx] = cached[1]
-                processed += 1
-                if on_progress:
-                    on_progress(processed, total)
-                continue
-
-        sudachi_kana = parser.sudachi_reading(name)
-        if sudachi_kana and normalize_for_keypuncher_check(sudachi_kana) == normalize_for_keypuncher_check(reading):
-            confs[idx] = 100
-            reasons[idx] = "辞書候補一致"
-            processed += 1
-            if on_progress:
-                on_progress(processed, total)
-            continue
-
-        entry = pending.setdefault(name, {"rows": [], "sudachi": sudachi_kana})
-        entry["rows"].append((idx, reading))
+    pending, processed = _resolve_locally(
+        pair_names, pair_readings, weights, confs, reasons, on_progress,
+        cache, reading_index, processes,
+    )
 
     if pending:
         names = list(pending)
         for start in range(0, len(names), batch_size):
             chunk = names[start:start + batch_size]
+            if cache:
+                cached = cache.get_candidates(chunk, scorer.CACHE_VERSION)
             tasks = [fetch_candidates(n) for n in chunk]
-            rows_to_save = []
+            rows_to_save: Resolved = {SOURCE_CANDIDATES: [], SOURCE_MODEL: []}
 
             for coro in asyncio.as_completed(tasks):
-                name, candidates = await coro
+                name, candidates, source = await coro
                 info = pending[name]
                 sudachi = info.get("sudachi")
-                for idx, reading in info["rows"]:
+                for pair, reading in info["pairs"]:
                     conf, reason = scorer.calc_confidence(reading, candidates, sudachi)
-                    confs[idx] = conf
-                    reasons[idx] = reason
-                    if db_conn:
-                        rows_to_save.append((name, reading, conf, reason))
-                    processed += 1
+                    confs[pair] = conf
+                    reasons[pair] = reason
+                    if cache:
+                        rows_to_save[source].append((name, reading, conf, reason))
+                    processed += int(weights[pair])
                     if on_progress:
                         on_progress(processed, total)
-            if db_conn and rows_to_save:
-                db.save_many_readings(rows_to_save, db_conn)
+            for source, rows in rows_to_save.items():
+                if cache and rows:
+                    cache.put_readings(rows, scorer.CACHE_VERSION, source)
+            if cache and fetched:
+                cache.put_candidates(fetched, scorer.CACHE_VERSION)
+                fetched.clear()
 
-    df = df.copy()
-    df["信頼度"] = confs
-    df["理由"] = reasons
-    return df
+    return _attach_results(df, confs[codes], reasons.take(codes), output)
+
+
+# input formats accepted by ``read_columns``
+INPUT_FORMATS = ("xlsx", "csv", "parquet")
+
+
+def input_format(source) -> str:
+    """Return the input format of ``source`` (a path or uploaded file)."""
+    name = str(getattr(source, "name", source)).lower()
+    for fmt in INPUT_FORMATS:
+        if name.endswith("." + fmt):
+            return fmt
+    raise ValueError(f"unsupported input file: {name}")
+
+
+def read_preview(source, nrows: int = 5, fmt: str | None = None) -> pd.DataFrame:
+    """Return the header and first ``nrows`` rows of ``source`` cheaply.
+
+    xlsx files are streamed with openpyxl in read-only mode, CSV files stop
+    parsing after ``nrows`` and Parquet files read a single record batch, so
+    column selection does not require loading the whole file.  File objects
+    are rewound afterwards.
+    """
+    fmt = fmt or input_format(source)
+    try:
+        if fmt == "parquet":
+            pf = pq.ParquetFile(source)
+            batch = next(pf.iter_batches(batch_size=nrows), None)
+            if batch is None:
+                return pf.schema_arrow.empty_table().to_pandas()
+            return batch.to_pandas()
+        if fmt == "csv":
+            return pd.read_csv(source, nrows=nrows, dtype=str)
+        wb = load_workbook(source, read_only=True, data_only=True)
+        try:
+            rows = wb.worksheets[0].iter_rows(max_row=nrows + 1, values_only=True)
+            header = next(rows, ())
+            data = [list(r) for r in rows]
+        finally:
+            wb.close()
+        columns = [
+            f"Unnamed: {i}" if h is None else h for i, h in enumerate(header)
+        ]
+        return pd.DataFrame(data, columns=columns)
+    finally:
+        if hasattr(source, "seek"):
+            source.seek(0)
+
+
+def read_columns(
+    source, columns: list[str] | None, fmt: str | None = None
+) -> pd.DataFrame:
+    """Load only ``columns`` (all when ``None``) from an xlsx/CSV/Parquet file.
+
+    Parquet files are read column-pruned and CSV files are parsed with the
+    multi-threaded ``pyarrow`` engine; text values stay strings.
+    """
+    fmt = fmt or input_format(source)
+    if fmt == "parquet":
+        return pd.read_parquet(source, columns=columns)
+    if fmt == "csv":
+        return pd.read_csv(source, usecols=columns, dtype=str, engine="pyarrow")
+    return pd.read_excel(source, usecols=columns)
+
+
+def iter_csv_chunks(
+    source, columns: list[str], chunksize: int = 100_000
+) -> Iterator[pd.DataFrame]:
+    """Yield ``columns`` of a CSV file in chunks of ``chunksize`` rows."""
+    with pd.read_csv(
+        source, usecols=columns, dtype=str, chunksize=chunksize
+    ) as reader:
+        yield from reader
+
+
+def process_csv_chunks(
+    source,
+    name_col: str,
+    furi_col: str,
+    chunksize: int = 100_000,
+    **kwargs,
+) -> Iterator[pd.DataFrame]:
+    """Run ``process_dataframe`` over a CSV file chunk by chunk.
+
+    Only the name and furigana columns are parsed.  Processed chunks keep a
+    running index so they can be written out incrementally or concatenated.
+    Remaining keyword arguments are passed to ``process_dataframe``.
+    """
+    for chunk in iter_csv_chunks(source, [name_col, furi_col], chunksize):
+        yield process_dataframe(chunk, name_col, furi_col, **kwargs)
+
+
+def read_sources(
+    sources, columns: list[str] | None = None
+) -> dict[tuple[str, str | None], pd.DataFrame]:
+    """Load every sheet of every source file into one mapping.
+
+    Keys are ``(path, sheet name)`` (the ``name`` of file objects); the sheet
+    is ``None`` for CSV and Parquet files.  Only ``columns`` are read when
+    given; sheets and files lacking a column simply omit it.
+    """
+    frames: dict[tuple[str, str | None], pd.DataFrame] = {}
+    for source in sources:
+        if isinstance(source, (str, os.PathLike)):
+            label = str(source)
+        else:
+            label = str(getattr(source, "name", source))
+        fmt = input_format(source)
+        if fmt == "xlsx":
+            wanted = set(columns) if columns else None
+            sheets = pd.read_excel(
+                source,
+                sheet_name=None,
+                usecols=(lambda c: c in wanted) if wanted else None,
+            )
+            for sheet, frame in sheets.items():
+                frames[(label, sheet)] = frame
+        else:
+            present = columns
+            if columns:
+                header = read_preview(source, 1, fmt).columns
+                present = [c for c in columns if c in header]
+            frames[(label, None)] = read_columns(source, present, fmt)
+    return frames
+
+
+def _combine_frames(
+    frames: Mapping[Hashable, pd.DataFrame], name_col: str, furi_col: str
+) -> pd.DataFrame:
+    return pd.concat(
+        [f.reindex(columns=[name_col, furi_col]) for f in frames.values()],
+        ignore_index=True,
+    )
+
+
+def _scatter_results(
+    frames: Mapping[Hashable, pd.DataFrame], combined: pd.DataFrame
+) -> dict[Hashable, pd.DataFrame]:
+    out = {}
+    start = 0
+    for key, frame in frames.items():
+        end = start + len(frame)
+        frame = frame.copy()
+        for col in RESULT_COLUMNS:
+            frame[col] = combined[col].iloc[start:end].to_numpy()
+        out[key] = frame
+        start = end
+    return out
+
+
+def process_frames(
+    frames: Mapping[Hashable, pd.DataFrame],
+    name_col: str,
+    furi_col: str,
+    **kwargs,
+) -> dict[Hashable, pd.DataFrame]:
+    """Process several sheets/files as a single job.
+
+    The name and furigana columns of all ``frames`` are combined so every
+    unique name is looked up, tokenized and sent to GPT once across all
+    sources; results are then scattered back and each frame is returned with
+    its own result columns under the same key.  Frames without ``furi_col``
+    are treated as having empty readings.  Keyword arguments are passed to
+    ``process_dataframe``.
+    """
+    if not frames:
+        return {}
+    combined = process_dataframe(
+        _combine_frames(frames, name_col, furi_col), name_col, furi_col, **kwargs
+    )
+    return _scatter_results(frames, combined)
+
+
+async def async_process_frames(
+    frames: Mapping[Hashable, pd.DataFrame],
+    name_col: str,
+    furi_col: str,
+    **kwargs,
+) -> dict[Hashable, pd.DataFrame]:
+    """Asynchronous version of ``process_frames``."""
+    if not frames:
+        return {}
+    combined = await async_process_dataframe(
+        _combine_frames(frames, name_col, furi_col), name_col, furi_col, **kwargs
+    )
+    return _scatter_results(frames, combined)
+
+
+def row_hashes(df: pd.DataFrame, name_col: str, furi_col: str) -> np.ndarray:
+    """Return a 64-bit content hash of each row's name and furigana.
+
+    Missing values hash like empty strings, as the pipeline treats them alike.
+    """
+    cols = df.reindex(columns=[name_col, furi_col]).astype(object)
+    text = cols.where(cols.notna(), "").astype(str)
+    return pd.util.hash_pandas_object(text, index=False).to_numpy().view(np.int64)
+
+
+def _manifest_split(
+    df: pd.DataFrame,
+    name_col: str,
+    furi_col: str,
+    key: str,
+    db_conn: sqlite3.Connection,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, _ReasonCodes]:
+    """Return row hashes, the reuse mask and the previous confidences/reasons."""
+    hashes = row_hashes(df, name_col, furi_col)
+    confs = _new_confidences(len(df))
+    reasons = _ReasonCodes(len(df))
+    rows = db.load_manifest(key, db_conn, scorer.CACHE_VERSION)
+    if not rows:
+        return hashes, np.zeros(len(df), dtype=bool), confs, reasons
+    known = pd.DataFrame(rows, columns=["hash", "conf", "reason"])
+    pos = pd.Index(known["hash"]).get_indexer(hashes)
+    hit = pos >= 0
+    confs[hit] = known["conf"].to_numpy()[pos[hit]]
+    reasons.assign(hit, known["reason"].to_numpy()[pos[hit]])
+    return hashes, hit, confs, reasons
+
+
+def _offset_progress(
+    on_progress: Optional[Callable[[int, int], None]], offset: int, total: int
+) -> Optional[Callable[[int, int], None]]:
+    if on_progress is None:
+        return None
+    on_progress(offset, total)
+    return lambda done, _: on_progress(offset + done, total)
+
+
+def _manifest_merge(
+    df: pd.DataFrame,
+    key: str,
+    db_conn: sqlite3.Connection,
+    split: tuple[np.ndarray, np.ndarray, np.ndarray, _ReasonCodes],
+    fresh: pd.DataFrame | None,
+) -> pd.DataFrame:
+    hashes, hit, confs, reasons = split
+    if fresh is not None:
+        confs[~hit] = fresh["信頼度"].to_numpy()
+        reasons.assign(~hit, fresh["理由"].to_numpy())
+    labels = np.asarray(reasons.to_categorical(), dtype=object)
+    db.save_manifest(key, zip(hashes, confs, labels), db_conn, scorer.CACHE_VERSION)
+    return _attach_results(df, confs, reasons, "copy")
+
+
+def process_incremental(
+    df: pd.DataFrame,
+    name_col: str,
+    furi_col: str,
+    key: str,
+    db_conn: sqlite3.Connection,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    **kwargs,
+) -> pd.DataFrame:
+    """Re-check ``df`` reusing the results of the previous run of ``key``.
+
+    ``key`` identifies the file (e.g. its name and selected columns).  Rows
+    whose name and furigana hash matches a row of the last run are copied
+    through; only changed and new rows go through ``process_dataframe``
+    (which receives the remaining keyword arguments).  The manifest of
+    ``key`` is then replaced with this run's hashes and results.
+    """
+    split = _manifest_split(df, name_col, furi_col, key, db_conn)
+    todo = ~split[1]
+    fresh = None
+    if todo.any():
+        fresh = process_dataframe(
+            df[todo], name_col, furi_col,
+            _offset_progress(on_progress, len(df) - int(todo.sum()), len(df)),
+            db_conn, **kwargs,
+        )
+    elif on_progress:
+        on_progress(len(df), len(df))
+    return _manifest_merge(df, key, db_conn, split, fresh)
+
+
+async def async_process_incremental(
+    df: pd.DataFrame,
+    name_col: str,
+    furi_col: str,
+    key: str,
+    db_conn: sqlite3.Connection,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    **kwargs,
+) -> pd.DataFrame:
+    """Asynchronous version of ``process_incremental``."""
+    split = _manifest_split(df, name_col, furi_col, key, db_conn)
+    todo = ~split[1]
+    fresh = None
+    if todo.any():
+        fresh = await async_process_dataframe(
+            df[todo], name_col, furi_col,
+            _offset_progress(on_progress, len(df) - int(todo.sum()), len(df)),
+            db_conn, **kwargs,
+        )
+    elif on_progress:
+        on_progress(len(df), len(df))
+    return _manifest_merge(df, key, db_conn, split, fresh)
 
 
 def to_excel_bytes(
@@ -237,3 +1006,237 @@ def to_excel_bytes(
         ) as writer:
             df.to_excel(writer, index=False)
         return buf.getvalue()
+
+
+# columns appended by the pipelines
+RESULT_COLUMNS = ("信頼度", "理由")
+
+_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_DOC_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+def _first_sheet_path(zf: zipfile.ZipFile) -> str:
+    """Return the archive path of the first worksheet of an xlsx file."""
+
+    def rel_targets(rels_path: str, base: str) -> dict[str, tuple[str, str]]:
+        root = ElementTree.fromstring(zf.read(rels_path))
+        out = {}
+        for rel in root.iter(f"{_REL_NS}Relationship"):
+            target = rel.get("Target", "")
+            if target.startswith("/"):
+                target = target.lstrip("/")
+            else:
+                target = posixpath.normpath(posixpath.join(base, target))
+            out[rel.get("Id")] = (rel.get("Type", ""), target)
+        return out
+
+    book = next(
+        t for typ, t in rel_targets("_rels/.rels", "").values()
+        if typ.endswith("/officeDocument")
+    )
+    book_dir, book_name = posixpath.split(book)
+    rels_path = posixpath.join(book_dir, "_rels", book_name + ".rels")
+    rels = rel_targets(rels_path, book_dir)
+    sheets = ElementTree.fromstring(zf.read(book)).find(f"{_MAIN_NS}sheets")
+    first = sheets[0].get(f"{_DOC_REL_NS}id")
+    return rels[first][1]
+
+
+def _cell_xml(ref: str, value) -> str:
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    if isinstance(value, str):
+        return f'<c r="{ref}" t="inlineStr"><is><t>{xml_escape(value)}</t></is></c>'
+    if isinstance(value, (bool, np.bool_)):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    return f'<c r="{ref}" t="inlineStr"><is><t>{xml_escape(str(value))}</t></is></c>'
+
+
+def _append_sheet_columns(xml: str, cells: dict[int, list]) -> str:
+    """Insert ``cells`` (row number -> values) after the last used column."""
+    prefix = re.search(r"<(\w+:)?sheetData\b", xml)
+    p = (prefix.group(1) or "") if prefix else ""
+    used = [
+        column_index_from_string(m.group(1))
+        for m in re.finditer(rf'<{p}c\b[^>]*?\br="([A-Z]+)\d+"', xml)
+    ]
+    dim = re.search(
+        rf'<{p}dimension\b[^>]*?\bref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"', xml
+    )
+    if dim:
+        used.append(column_index_from_string(dim.group(3) or dim.group(1)))
+    first_col = max(used, default=0) + 1
+    width = max((len(v) for v in cells.values()), default=0)
+    letters = [get_column_letter(first_col + i) for i in range(width)]
+
+    def row_cells(r: int) -> str:
+        return "".join(
+            _cell_xml(f"{col}{r}", v) for col, v in zip(letters, cells[r])
+        )
+
+    pending = iter(sorted(cells))
+    next_new = next(pending, None)
+    out: list[str] = []
+    pos = 0
+    last_r = 0
+    for m in re.finditer(rf"<{p}row\b([^>]*?)(/>|>(.*?)</{p}row>)", xml, re.S):
+        attrs = m.group(1)
+        r_match = re.search(r'\br="(\d+)"', attrs)
+        r = int(r_match.group(1)) if r_match else last_r + 1
+        last_r = r
+        out.append(xml[pos:m.start()])
+        while next_new is not None and next_new < r:
+            out.append(f'<{p}row r="{next_new}">{row_cells(next_new)}</{p}row>')
+            next_new = next(pending, None)
+        if next_new == r:
+            attrs = re.sub(r'\s+spans="[^"]*"', "", attrs)
+            out.append(f"<{p}row{attrs}>{m.group(3) or ''}{row_cells(r)}</{p}row>")
+            next_new = next(pending, None)
+        else:
+            out.append(m.group(0))
+        pos = m.end()
+    rest = []
+    while next_new is not None:
+        rest.append(f'<{p}row r="{next_new}">{row_cells(next_new)}</{p}row>')
+        next_new = next(pending, None)
+    tail = xml[pos:]
+    if rest:
+        if re.search(rf"<{p}sheetData\s*/>", tail):
+            tail = re.sub(
+                rf"<{p}sheetData\s*/>",
+                lambda _: f"<{p}sheetData>{''.join(rest)}</{p}sheetData>",
+                tail,
+                count=1,
+            )
+        else:
+            end_tag = f"</{p}sheetData>"
+            tail = tail.replace(end_tag, "".join(rest) + end_tag, 1)
+    out.append(tail)
+    result = "".join(out)
+
+    if dim and letters:
+        end_row = max(int(dim.group(4) or dim.group(2)), max(cells, default=0))
+        new_ref = f"{dim.group(1)}{dim.group(2)}:{letters[-1]}{end_row}"
+        result = result.replace(dim.group(0), re.sub(
+            r'ref="[^"]*"', f'ref="{new_ref}"', dim.group(0)
+        ), 1)
+    return result
+
+
+def append_result_columns(
+    template_bytes: bytes,
+    df: pd.DataFrame,
+    columns: tuple[str, ...] = RESULT_COLUMNS,
+    header_row: int = 1,
+) -> bytes:
+    """Return ``template_bytes`` with ``columns`` of ``df`` added to the first sheet.
+
+    Unlike :func:`to_excel_bytes` the original cells are not rewritten: the
+    first worksheet's XML is copied with the new cells appended after its
+    last used column and every other part of the workbook is copied as is,
+    so the cost grows with the result columns rather than the workbook.
+    Row ``i`` of ``df`` is written to sheet row ``header_row + 1 + i``,
+    matching the default layout read by ``pd.read_excel``.
+    """
+    cells: dict[int, list] = {header_row: list(columns)}
+    values = zip(*(df[c].tolist() for c in columns))
+    for i, row in enumerate(values):
+        cells[header_row + 1 + i] = list(row)
+
+    zin = zipfile.ZipFile(BytesIO(template_bytes))
+    sheet_path = _first_sheet_path(zin)
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            data = zin.read(info)
+            if info.filename == sheet_path:
+                xml = _append_sheet_columns(data.decode("utf-8"), cells)
+                data = xml.encode("utf-8")
+            zout.writestr(info, data)
+    return buf.getvalue()
+
+
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """Return UTF-8 CSV bytes (with BOM so Excel detects the encoding)."""
+    return df.to_csv(index=False).encode("utf-8-sig")
+
+
+def to_parquet_bytes(df: pd.DataFrame) -> bytes:
+    """Return Parquet bytes for ``df``; requires ``pyarrow``."""
+    buf = BytesIO()
+    df.to_parquet(buf, index=False)
+    return buf.getvalue()
+
+
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# export format -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "xlsx": ("xlsx", EXCEL_MIME),
+    "csv": ("csv", "text/csv"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+class ExportCache:
+    """Build export artifacts of one result lazily and keep them.
+
+    ``key`` identifies the result (e.g. a job id) so callers can tell when a
+    new cache is needed.  When ``append`` is true the xlsx artifact is
+    produced with :func:`append_result_columns` on ``template_bytes``.
+    When ``df`` was computed from a column-pruned input, ``source`` loads
+    the complete input; the result columns are joined onto it for every
+    artifact that rewrites the whole table.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        df: pd.DataFrame,
+        template_bytes: bytes | None = None,
+        append: bool = False,
+        source: Callable[[], pd.DataFrame] | None = None,
+    ):
+        self.key = key
+        self.df = df
+        self.template_bytes = template_bytes
+        self.append = append
+        self.source = source
+        self._full: pd.DataFrame | None = None
+        self._artifacts: dict[str, bytes] = {}
+
+    def full(self) -> pd.DataFrame:
+        """Return the complete input with the result columns, loading it once."""
+        if self.source is None:
+            return self.df
+        if self._full is None:
+            full = self.source()
+            for col in RESULT_COLUMNS:
+                full[col] = self.df[col].to_numpy()
+            self._full = full
+        return self._full
+
+    def __contains__(self, fmt: str) -> bool:
+        return fmt in self._artifacts
+
+    def get(self, fmt: str) -> bytes:
+        """Return the artifact for ``fmt``, encoding it on first use."""
+        if fmt not in self._artifacts:
+            if fmt == "xlsx":
+                if self.template_bytes and self.append:
+                    data = append_result_columns(self.template_bytes, self.df)
+                else:
+                    data = to_excel_bytes(
+                        self.full(), template_bytes=self.template_bytes
+                    )
+            elif fmt == "csv":
+                data = to_csv_bytes(self.full())
+            elif fmt == "parquet":
+                data = to_parquet_bytes(self.full())
+            else:
+                raise ValueError(f"unknown export format: {fmt}")
+            self._artifacts[fmt] = data
+        return self._artifacts[fmt]
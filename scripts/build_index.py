@@ -0,0 +1,33 @@
+"""Compile cached component readings into a memory-mappable index.
+
+Usage::
+
+    python -m scripts.build_index --out reading_index.bin
+"""
+import argparse
+
+from core import db
+from core.index import build_index
+from core.model import MIN_TRAIN_CONFIDENCE
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--db", default=None, help="cache path (default: FURIGANA_DB)")
+    ap.add_argument("--out", default="reading_index.bin", help="index file")
+    ap.add_argument(
+        "--min-confidence",
+        type=int,
+        default=MIN_TRAIN_CONFIDENCE,
+        help="only index verdicts at or above this confidence",
+    )
+    args = ap.parse_args(argv)
+
+    conn = db.init_db(args.db)
+    count = build_index(conn, args.out, args.min_confidence)
+    print(f"{count} components written to {args.out}")
+    return count
+
+
+if __name__ == "__main__":
+    main()
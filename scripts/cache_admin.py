@@ -0,0 +1,93 @@
+"""Maintain the SQLite furigana cache.
+
+Usage::
+
+    python -m scripts.cache_admin evict --max-rows 500000 --ttl-days 180 --drop-stale
+    python -m scripts.cache_admin compact
+    python -m scripts.cache_admin export warm_cache.db
+    python -m scripts.cache_admin import warm_cache.db
+    python -m scripts.cache_admin merge pc1.db pc2.db pc3.db
+    python -m scripts.cache_admin rescore --chunk-size 20000
+"""
+import argparse
+
+from core import db
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--db", default=None, help="cache path (default: FURIGANA_DB)")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p_evict = sub.add_parser("evict", help="remove expired/stale/LRU entries")
+    p_evict.add_argument("--max-rows", type=int, default=None)
+    p_evict.add_argument("--ttl-days", type=float, default=None)
+    p_evict.add_argument(
+        "--drop-stale",
+        action="store_true",
+        help="delete entries written by another model or prompt version",
+    )
+
+    p_compact = sub.add_parser("compact", help="release free pages to disk")
+    p_compact.add_argument(
+        "--pages", type=int, default=0, help="pages to release (0 = all)"
+    )
+
+    p_export = sub.add_parser("export", help="write a portable copy of the cache")
+    p_export.add_argument("path")
+
+    p_import = sub.add_parser("import", help="load an exported cache file")
+    p_import.add_argument("path")
+
+    p_merge = sub.add_parser("merge", help="merge cache shards into the cache")
+    p_merge.add_argument("paths", nargs="+")
+
+    p_rescore = sub.add_parser(
+        "rescore", help="recompute verdicts from stored candidates (no API calls)"
+    )
+    p_rescore.add_argument("--chunk-size", type=int, default=10_000)
+    p_rescore.add_argument(
+        "--drop-missing",
+        action="store_true",
+        help="delete verdicts without stored candidates so they are re-checked",
+    )
+
+    args = ap.parse_args(argv)
+    conn = db.init_db(args.db)
+
+    if args.command == "evict":
+        keep = None
+        if args.drop_stale:
+            from core import scorer
+
+            keep = scorer.CACHE_VERSION
+        deleted = db.evict(conn, args.max_rows, args.ttl_days, keep)
+        print(f"{deleted} entries evicted")
+    elif args.command == "compact":
+        freed = db.compact(conn, args.pages)
+        print(f"{freed} pages released")
+    elif args.command == "rescore":
+        from core.rescore import rescore_cache
+
+        counts = rescore_cache(conn, None, args.chunk_size, args.drop_missing)
+        print(
+            f"{counts['rescored']} verdicts rescored, {counts['changed']} changed, "
+            f"{counts['missing']} without candidates, "
+            f"{counts['manifests']} file manifests reset"
+        )
+    elif args.command == "export":
+        db.export_cache(conn, args.path)
+        print(f"cache exported to {args.path}")
+    else:
+        from core import scorer
+
+        paths = [args.path] if args.command == "import" else args.paths
+        try:
+            changed = db.merge_cache(conn, paths, scorer.CACHE_VERSION)
+        except FileNotFoundError as exc:
+            ap.error(str(exc))
+        print(f"{changed} entries merged")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Check one name/furigana pair through the warm background service.
+
+Usage::
+
+    python -m scripts.check "河合 良人" "カワイ ヨシト"
+
+The first call starts ``scripts.serve`` in the background (it exits after
+``--idle-timeout`` seconds without requests); later calls skip loading the
+Sudachi dictionary and answer in milliseconds on cache or Sudachi hits.
+"""
+import argparse
+import json
+
+from core.client import (
+    DEFAULT_HOST,
+    DEFAULT_PORT,
+    check_remote,
+    ensure_daemon,
+    scorer_response,
+)
+
+
+def main(argv: list[str] | None = None) -> dict:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("name")
+    ap.add_argument("reading")
+    ap.add_argument("--host", default=DEFAULT_HOST)
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument(
+        "--idle-timeout", type=float, default=600, help="daemon idle seconds"
+    )
+    ap.add_argument("--db", default=None, help="cache path of a new daemon")
+    args = ap.parse_args(argv)
+
+    ensure_daemon(args.host, args.port, args.idle_timeout, db_path=args.db)
+    result = scorer_response(
+        check_remote(args.name, args.reading, args.host, args.port)
+    )
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return result
+
+
+if __name__ == "__main__":
+    main()
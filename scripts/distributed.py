@@ -0,0 +1,78 @@
+"""Split a large check across several machines.
+
+Usage::
+
+    # coordinator: partition names by hash and seed each shard from the cache
+    python -m scripts.distributed split big.xlsx shared/ --nodes 4 \
+        --name 名前 --furigana フリガナ
+    # each node, against its own partition and cache shard
+    python -m scripts.distributed work shared/part-2.parquet
+    # coordinator: collect results and merge the cache shards back
+    python -m scripts.distributed merge big.xlsx shared/ result.xlsx
+    # or everything on one machine with local processes as nodes
+    python -m scripts.distributed local big.xlsx shared/ result.xlsx --nodes 4 \
+        --name 名前 --furigana フリガナ
+"""
+import argparse
+from pathlib import Path
+
+from core import db
+from core.distributed import merge_work, run_local, run_worker, split_work
+from core.utils import RESULT_COLUMNS, ExportCache, input_format, read_columns
+
+
+def _write(source: str, df, output: str, append: bool) -> None:
+    template = None
+    if input_format(source) == "xlsx":
+        template = Path(source).read_bytes()
+    exports = ExportCache(output, df, template_bytes=template, append=append)
+    Path(output).write_bytes(exports.get(input_format(output)))
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--db", default=None, help="cache path (default: FURIGANA_DB)")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p_split = sub.add_parser("split", help="write partitions and cache shards")
+    p_work = sub.add_parser("work", help="process one partition")
+    p_merge = sub.add_parser("merge", help="collect results and cache shards")
+    p_local = sub.add_parser("local", help="split, work and merge locally")
+    for p in (p_split, p_merge, p_local):
+        p.add_argument("input", help="source file (.xlsx/.csv/.parquet)")
+        p.add_argument("workdir", help="directory shared with the workers")
+    for p in (p_merge, p_local):
+        p.add_argument("output", help="result file (.xlsx/.csv/.parquet)")
+    for p in (p_split, p_local):
+        p.add_argument("--nodes", type=int, required=True)
+        p.add_argument("--name", required=True, help="name column")
+        p.add_argument("--furigana", required=True, help="furigana column")
+    p_work.add_argument("part", help="partition file written by split")
+
+    args = ap.parse_args(argv)
+
+    if args.command == "work":
+        rows = run_worker(args.part)
+        print(f"{rows} rows processed")
+        return
+
+    conn = db.init_db(args.db)
+    if args.command == "split":
+        df = read_columns(args.input, [args.name, args.furigana])
+        parts = split_work(df, args.name, args.furigana, args.nodes, args.workdir, conn)
+        print(f"{len(df)} rows split into {len(parts)} partitions")
+        return
+
+    df = read_columns(args.input, None)
+    # the source sheet is only extended when it has no result columns yet
+    append = not set(RESULT_COLUMNS) & set(df.columns)
+    if args.command == "merge":
+        out = merge_work(df, args.workdir, conn)
+    else:
+        out = run_local(df, args.name, args.furigana, args.nodes, args.workdir, conn)
+    _write(args.input, out, args.output, append)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
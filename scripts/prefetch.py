@@ -0,0 +1,52 @@
+"""Warm the candidate cache for known name lists.
+
+Usage::
+
+    python -m scripts.prefetch employees.xlsx last_year.csv --column 名前 --rate 120
+
+Interrupted runs can simply be restarted; names already cached are skipped.
+"""
+import argparse
+import asyncio
+import sys
+
+from core import db
+from core.jobs import throttle_progress
+from core.prefetch import prefetch_candidates, read_names
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("files", nargs="+", help="name lists (.xlsx/.csv/.parquet/.txt)")
+    ap.add_argument("--column", default=None, help="name column of tabular files")
+    ap.add_argument("--db", default=None, help="cache path (default: FURIGANA_DB)")
+    ap.add_argument("--rate", type=float, default=60, help="API calls per minute")
+    ap.add_argument("--concurrency", type=int, default=5)
+    ap.add_argument("--limit", type=int, default=None, help="max names this run")
+    args = ap.parse_args(argv)
+
+    names: list[str] = []
+    for path in args.files:
+        names.extend(read_names(path, args.column))
+
+    @throttle_progress
+    def on_progress(done: int, total: int) -> None:
+        print(f"\r{done}/{total}", end="", file=sys.stderr, flush=True)
+
+    conn = db.init_db(args.db)
+    stored = asyncio.run(
+        prefetch_candidates(
+            names,
+            conn,
+            rate_per_minute=args.rate,
+            concurrency=args.concurrency,
+            limit=args.limit,
+            on_progress=on_progress,
+        )
+    )
+    print(f"\n{stored} names cached", file=sys.stderr)
+    return stored
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Serve furigana checks over HTTP for other systems.
+
+Usage::
+
+    python -m scripts.serve --port 8765 \
+        --model reading_model.json --index reading_index.bin
+    curl -d '{"name": "山田太郎", "reading": "ヤマダタロウ"}' localhost:8765/check
+    curl -H 'Content-Type: application/x-ndjson' \
+        --data-binary @pairs.jsonl localhost:8765/check
+"""
+import argparse
+
+from core.cache import open_cache
+from core.index import ReadingIndex
+from core.model import DEFAULT_THRESHOLD, ReadingModel
+from core.service import DEFAULT_HOST, DEFAULT_PORT, CheckService, make_server, serve
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default=DEFAULT_HOST)
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--db", default=None, help="cache path (default: FURIGANA_DB)")
+    ap.add_argument(
+        "--cache-url",
+        default=None,
+        help="shared cache, e.g. redis://host:6379/furigana",
+    )
+    ap.add_argument("--model", default=None, help="offline reading model")
+    ap.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    ap.add_argument("--index", default=None, help="component reading index")
+    ap.add_argument(
+        "--batch-window", type=float, default=0.02, help="seconds to coalesce requests"
+    )
+    ap.add_argument("--max-batch", type=int, default=100)
+    ap.add_argument("--concurrency", type=int, default=10)
+    ap.add_argument(
+        "--idle-timeout", type=float, default=None, help="exit after idle seconds"
+    )
+    args = ap.parse_args(argv)
+
+    service = CheckService(
+        args.db,
+        batch_window=args.batch_window,
+        max_batch=args.max_batch,
+        concurrency=args.concurrency,
+        reading_model=ReadingModel.load(args.model) if args.model else None,
+        model_threshold=args.threshold,
+        reading_index=ReadingIndex(args.index) if args.index else None,
+        cache=open_cache(args.cache_url),
+    ).start()
+    server = make_server(service, args.host, args.port)
+    print(f"serving on http://{args.host}:{server.server_port}/check")
+    try:
+        serve(server, service, args.idle_timeout)
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
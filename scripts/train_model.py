@@ -0,0 +1,33 @@
+"""Train the offline reading model from the SQLite cache.
+
+Usage::
+
+    python -m scripts.train_model --out reading_model.json
+"""
+import argparse
+
+from core import db
+from core.model import ReadingModel, train_model, MIN_TRAIN_CONFIDENCE
+
+
+def main(argv: list[str] | None = None) -> ReadingModel:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--db", default=None, help="cache path (default: FURIGANA_DB)")
+    ap.add_argument("--out", default="reading_model.json", help="model file")
+    ap.add_argument(
+        "--min-confidence",
+        type=int,
+        default=MIN_TRAIN_CONFIDENCE,
+        help="only learn from verdicts at or above this confidence",
+    )
+    args = ap.parse_args(argv)
+
+    conn = db.init_db(args.db)
+    model = train_model(conn, args.min_confidence)
+    model.save(args.out)
+    print(f"{len(model)} components written to {args.out}")
+    return model
+
+
+if __name__ == "__main__":
+    main()
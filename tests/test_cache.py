@@ -0,0 +1,151 @@
+import socketserver
+import threading
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from core import db, scorer
+from core.cache import CacheBackend, KVCache, MemoryCache, SQLiteCache, open_cache
+from core.cache import RespError, _read_reply
+from core.utils import process_dataframe
+
+
+class _StandIn(socketserver.ThreadingTCPServer):
+    """Minimal Redis-protocol server holding its data in a dict."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _RespHandler)
+        self.data = {}
+        self.commands = []
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                args = _read_reply(self.rfile)
+            except ConnectionError:
+                return
+            cmd = args[0].upper()
+            self.server.commands.append(cmd)
+            if cmd == b'PING':
+                self.wfile.write(b'+PONG\r\n')
+            elif cmd == b'MGET':
+                values = [self.server.data.get(k) for k in args[1:]]
+                out = [b'*%d\r\n' % len(values)]
+                for v in values:
+                    if v is None:
+                        out.append(b'$-1\r\n')
+                    else:
+                        out.append(b'$%d\r\n%s\r\n' % (len(v), v))
+                self.wfile.write(b''.join(out))
+            elif cmd == b'MSET':
+                self.server.data.update(zip(args[1::2], args[2::2]))
+                self.wfile.write(b'+OK\r\n')
+            elif cmd == b'SET':
+                self.server.data[args[1]] = args[2]
+                self.wfile.write(b'+OK\r\n')
+            else:
+                self.wfile.write(b'-ERR unknown command\r\n')
+
+
+@pytest.fixture
+def kv_server():
+    server = _StandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _backends(tmp_path, server):
+    return [
+        SQLiteCache(db.init_db(tmp_path / 'c.db')),
+        MemoryCache(),
+        KVCache('127.0.0.1', server.server_address[1], prefix='t', chunk_size=2),
+    ]
+
+
+def test_backends_round_trip(tmp_path, kv_server):
+    version = ('m', 1)
+    for cache in _backends(tmp_path, kv_server):
+        cache.put_readings(
+            [('太郎', 'タロウ', 90, 'r'), ('花子', 'ハナコ', 85, 'x')], version, 'sudachi'
+        )
+        cache.put_candidates([('未知', ['ミチ', 'ミチコ'])], version)
+        cache.put_sudachi([('未知', 'ミチ'), ('謎々', None)])
+
+        assert cache.get_readings(
+            [('太郎', 'タロウ'), ('太郎', 'タロ'), ('花子', 'ハナコ'), ('次郎', 'ジロウ')], version
+        ) == {('太郎', 'タロウ'): (90, 'r'), ('花子', 'ハナコ'): (85, 'x')}
+        assert cache.get_readings([('太郎', 'タロウ')], ('m', 2)) == {}
+        assert cache.get_candidates(['未知', '他'], version) == {'未知': ['ミチ', 'ミチコ']}
+        assert cache.get_candidates(['未知'], ('m', 2)) == {}
+        assert cache.get_sudachi(['未知', '謎々', '他']) == {'未知': 'ミチ', '謎々': None}
+        cache.close()
+
+
+def test_incomplete_backend_cannot_be_instantiated():
+    class NoSudachi(CacheBackend):
+        get_readings = MemoryCache.get_readings
+        put_readings = MemoryCache.put_readings
+        get_candidates = MemoryCache.get_candidates
+        put_candidates = MemoryCache.put_candidates
+
+    with pytest.raises(TypeError, match='get_sudachi'):
+        NoSudachi()
+
+
+def test_kv_cache_ttl_and_errors(kv_server):
+    cache = KVCache('127.0.0.1', kv_server.server_address[1], ttl=60)
+    assert cache.ping()
+    cache.put_candidates([('未知', ['ミチ'])], ('m', 1))
+    assert b'SET' in kv_server.commands and b'MSET' not in kv_server.commands
+    with pytest.raises(RespError):
+        cache._execute([('NOPE',), ('PING',)])
+    # the connection is still usable after an error reply
+    assert cache.get_candidates(['未知'], ('m', 1)) == {'未知': ['ミチ']}
+
+
+def test_open_cache_urls():
+    assert open_cache(None) is None
+    assert isinstance(open_cache('memory://'), MemoryCache)
+    kv = open_cache('redis://cache.internal:6380/shared?ttl=3600')
+    assert (kv.host, kv.port, kv.prefix, kv.ttl) == (
+        'cache.internal', 6380, 'shared', 3600
+    )
+    with pytest.raises(ValueError):
+        open_cache('ftp://x')
+
+
+def test_instances_share_kv_cache(kv_server):
+    port = kv_server.server_address[1]
+    df = pd.DataFrame({'名前': ['未知', '未知'], 'フリガナ': ['ミチコ', 'ミチ']})
+    with patch('core.utils.parser.sudachi_reading', return_value=None), patch(
+        'core.utils.scorer.gpt_candidates', return_value=['ミチコ']
+    ) as g_mock:
+        first = process_dataframe(df, '名前', 'フリガナ', cache=KVCache('127.0.0.1', port))
+        # a second instance with its own client starts warm
+        second = process_dataframe(df, '名前', 'フリガナ', cache=KVCache('127.0.0.1', port))
+
+    assert g_mock.call_count == 1
+    pd.testing.assert_frame_equal(first, second)
+    assert KVCache('127.0.0.1', port).get_candidates(['未知'], scorer.CACHE_VERSION) == {
+        '未知': ['ミチコ']
+    }
+
+
+def test_sharded_pass_reads_memory_cache():
+    cache = MemoryCache()
+    cache.put_readings([('未知', 'ミチ', 42, 'cached')], scorer.CACHE_VERSION)
+    df = pd.DataFrame({'名前': ['未知', '太郎'] * 3, 'フリガナ': ['ミチ', 'タロウ'] * 3})
+    with patch('core.utils.scorer.gpt_candidates') as g_mock:
+        out = process_dataframe(df, '名前', 'フリガナ', cache=cache, processes=2)
+    g_mock.assert_not_called()
+    assert list(out['信頼度']) == [42, 100] * 3
+    assert cache.get_sudachi(['太郎']) == {'太郎': 'タロウ'}
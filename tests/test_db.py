@@ -1,6 +1,8 @@
+import sqlite3
 from pathlib import Path
 import pandas as pd
-from core import db
+import pytest
+from core import db, scorer
 from core.utils import process_dataframe
 from unittest.mock import patch
 
@@ -32,7 +34,7 @@ def test_init_db_uses_env_var(tmp_path, monkeypatch):
 def test_process_dataframe_uses_cache(tmp_path):
     path = tmp_path / 'c.db'
     conn = db.init_db(path)
-    db.save_reading('太郎', 'タロウ', 88, 'cache', conn)
+    db.save_reading('太郎', 'タロウ', 88, 'cache', conn, scorer.CACHE_VERSION)
     df = pd.DataFrame({'名前': ['太郎'], 'フリガナ': ['タロウ']})
     with patch('core.utils.parser.sudachi_reading') as p_mock, patch('core.utils.scorer.gpt_candidates') as g_mock:
         out = process_dataframe(df, '名前', 'フリガナ', db_conn=conn)
@@ -41,3 +43,269 @@ def test_process_dataframe_uses_cache(tmp_path):
     p_mock.assert_not_called()
     g_mock.assert_not_called()
 
+
+def test_candidates_round_trip(tmp_path):
+    conn = db.init_db(tmp_path / 'cand.db')
+    assert db.get_candidates('太郎', conn) is None
+    db.save_many_candidates([('太郎', ['タロウ', 'フトシ'])], conn)
+    assert db.get_candidates('太郎', conn) == ['タロウ', 'フトシ']
+    assert db.missing_candidates(['花子', '太郎', '花子'], conn) == ['花子']
+
+
+def test_process_dataframe_saves_candidates(tmp_path):
+    conn = db.init_db(tmp_path / 'c.db')
+    df = pd.DataFrame({'名前': ['未知'], 'フリガナ': ['ミチ']})
+    with patch('core.utils.parser.sudachi_reading', return_value=None), patch(
+        'core.utils.scorer.gpt_candidates', return_value=['ミチ', 'ミチョ']
+    ):
+        process_dataframe(df, '名前', 'フリガナ', db_conn=conn)
+    assert db.get_candidates('未知', conn, scorer.CACHE_VERSION) == ['ミチ', 'ミチョ']
+
+
+def test_lookup_ignores_other_versions(tmp_path):
+    conn = db.init_db(tmp_path / 'v.db')
+    db.save_reading('太郎', 'タロウ', 85, 'old', conn, ('old-model', 1))
+    assert db.get_reading('太郎', 'タロウ', conn, ('new-model', 1)) is None
+    assert db.get_reading('太郎', 'タロウ', conn, ('old-model', 2)) is None
+    assert db.get_reading('太郎', 'タロウ', conn, ('old-model', 1)) == (85, 'old')
+
+
+def test_init_db_migrates_old_schema(tmp_path):
+    import sqlite3
+    path = tmp_path / 'old.db'
+    old = sqlite3.connect(path)
+    old.execute(
+        'CREATE TABLE readings (name TEXT NOT NULL, reading TEXT NOT NULL, '
+        'confidence INTEGER NOT NULL, reason TEXT NOT NULL, '
+        'PRIMARY KEY(name, reading))'
+    )
+    old.execute("INSERT INTO readings VALUES ('太郎', 'タロウ', 85, 'r')")
+    old.commit()
+    old.close()
+
+    conn = db.init_db(path)
+    assert db.get_reading('太郎', 'タロウ', conn) == (85, 'r')
+    assert db.get_reading('太郎', 'タロウ', conn, scorer.CACHE_VERSION) is None
+
+
+def test_evict_ttl_version_and_lru(tmp_path):
+    conn = db.init_db(tmp_path / 'e.db')
+    version = ('m', 1)
+    db.save_many_readings(
+        [(f'名{i}', 'ヨミ', 85, 'r') for i in range(5)], conn, version
+    )
+    db.save_reading('古い', 'ヨミ', 85, 'r', conn, ('m', 0))
+    conn.execute("UPDATE readings SET created_at=0 WHERE name='名0'")
+    conn.execute("UPDATE readings SET accessed_at=accessed_at+10 WHERE name!='名1'")
+    conn.commit()
+
+    deleted = db.evict(conn, max_rows=3, ttl_days=30, keep_version=version)
+
+    assert deleted == 3
+    names = {r[0] for r in conn.execute('SELECT name FROM readings')}
+    assert names == {'名2', '名3', '名4'}
+
+
+def test_evict_manifests_per_file(tmp_path):
+    conn = db.init_db(tmp_path / 'e.db')
+    version = ('m', 1)
+    db.save_manifest('a.xlsx', [(1, 85, 'r'), (2, 85, 'r')], conn, version)
+    db.save_manifest('b.xlsx', [(3, 85, 'r'), (4, 85, 'r')], conn, version)
+    db.save_manifest('c.xlsx', [(5, 85, 'r')], conn, ('m', 0))
+    db.save_manifest('old.xlsx', [(6, 85, 'r')], conn, version)
+    conn.execute("UPDATE manifests SET created_at=0 WHERE file='old.xlsx'")
+    conn.execute("UPDATE manifests SET accessed_at=accessed_at-10")
+    conn.commit()
+    # a recently used manifest survives the LRU trim
+    db.load_manifest('b.xlsx', conn, version)
+
+    deleted = db.evict(conn, max_rows=3, ttl_days=30, keep_version=version)
+
+    assert deleted == 4
+    assert db.load_manifest('a.xlsx', conn, version) == []
+    assert sorted(db.load_manifest('b.xlsx', conn, version)) == [
+        (3, 85, 'r'), (4, 85, 'r')
+    ]
+
+
+def test_evict_sudachi_readings(tmp_path):
+    conn = db.init_db(tmp_path / 'e.db')
+    db.save_sudachi_readings([(f'名{i}', 'ヨミ') for i in range(4)], conn)
+    conn.execute("UPDATE sudachi SET created_at=0 WHERE name='名0'")
+    conn.execute("UPDATE sudachi SET accessed_at=accessed_at-10")
+    conn.commit()
+    db.get_sudachi_readings(['名2', '名3'], conn)
+
+    # Sudachi readings are kept whatever the model version
+    deleted = db.evict(conn, max_rows=2, ttl_days=30, keep_version=('m', 1))
+
+    assert deleted == 2
+    names = {r[0] for r in conn.execute('SELECT name FROM sudachi')}
+    assert names == {'名2', '名3'}
+
+
+def test_compact_releases_free_pages(tmp_path):
+    conn = db.init_db(tmp_path / 'big.db')
+    db.save_many_readings(
+        [(f'名{i}', 'ヨミ' * 50, 85, 'r' * 100) for i in range(2000)], conn
+    )
+    conn.execute('DELETE FROM readings')
+    conn.commit()
+    assert db.compact(conn) > 0
+    assert conn.execute('PRAGMA freelist_count').fetchone()[0] == 0
+
+
+def test_export_and_import(tmp_path):
+    src = db.init_db(tmp_path / 'src.db')
+    db.save_reading('太郎', 'タロウ', 85, 'r', src, ('m', 1))
+    db.save_many_candidates([('太郎', ['タロウ'])], src, ('m', 1))
+    out = tmp_path / 'export' / 'cache.db'
+    db.export_cache(src, out)
+
+    dst = db.init_db(tmp_path / 'dst.db')
+    assert db.merge_cache(dst, [out]) == 2
+    assert db.get_reading('太郎', 'タロウ', dst, ('m', 1)) == (85, 'r')
+    assert db.get_candidates('太郎', dst, ('m', 1)) == ['タロウ']
+
+
+def test_merge_prefers_newer_versions(tmp_path):
+    main = db.init_db(tmp_path / 'main.db')
+    db.save_reading('太郎', 'タロウ', 85, 'main-v2', main, ('m', 2))
+    db.save_reading('花子', 'ハナコ', 60, 'main-old', main, ('m', 1))
+
+    shard1 = db.init_db(tmp_path / 's1.db')
+    db.save_reading('太郎', 'タロウ', 0, 'shard-v1', shard1, ('m', 1))
+    db.save_reading('次郎', 'ジロウ', 80, 'shard-new', shard1, ('m', 1))
+    shard2 = db.init_db(tmp_path / 's2.db')
+    db.save_reading('花子', 'ハナコ', 85, 'shard-newer', shard2, ('m', 1))
+    shard1.close()
+    shard2.close()
+
+    db.merge_cache(main, [tmp_path / 's1.db', tmp_path / 's2.db'])
+
+    assert db.get_reading('太郎', 'タロウ', main, ('m', 2)) == (85, 'main-v2')
+    assert db.get_reading('次郎', 'ジロウ', main, ('m', 1)) == (80, 'shard-new')
+    assert db.get_reading('花子', 'ハナコ', main, ('m', 1)) == (85, 'shard-newer')
+
+
+def test_merge_prefers_current_version(tmp_path):
+    current = ('new-model', 1)
+    main = db.init_db(tmp_path / 'main.db')
+    db.save_reading('太郎', 'タロウ', 85, 'current', main, current)
+    db.save_reading('花子', 'ハナコ', 60, 'old', main, ('old-model', 1))
+    shard = db.init_db(tmp_path / 's.db')
+    # written later, but by an older model (and a higher prompt version)
+    db.save_reading('太郎', 'タロウ', 0, 'stale', shard, ('old-model', 2))
+    db.save_reading('花子', 'ハナコ', 85, 'current', shard, current)
+    shard.close()
+
+    db.merge_cache(main, [tmp_path / 's.db'], current)
+
+    assert db.get_reading('太郎', 'タロウ', main, current) == (85, 'current')
+    assert db.get_reading('花子', 'ハナコ', main, current) == (85, 'current')
+
+
+def test_merge_leaves_shards_untouched(tmp_path):
+    # shard written before versioning, eviction and the sudachi table
+    old = tmp_path / 'old.db'
+    legacy = sqlite3.connect(old)
+    legacy.execute(
+        'CREATE TABLE readings (name TEXT NOT NULL, reading TEXT NOT NULL, '
+        'confidence INTEGER NOT NULL, reason TEXT NOT NULL, '
+        'PRIMARY KEY(name, reading))'
+    )
+    legacy.execute('CREATE TABLE candidates (name TEXT PRIMARY KEY, candidates TEXT)')
+    legacy.execute("INSERT INTO readings VALUES ('太郎', 'タロウ', 85, 'r')")
+    legacy.commit()
+    legacy.close()
+    data = old.read_bytes()
+
+    main = db.init_db(tmp_path / 'main.db')
+    with pytest.raises(FileNotFoundError, match='typo.db'):
+        db.merge_cache(main, [old, tmp_path / 'typo.db'])
+    assert not (tmp_path / 'typo.db').exists()
+    assert db.get_reading('太郎', 'タロウ', main) is None
+
+    assert db.merge_cache(main, [old]) == 1
+    assert db.get_reading('太郎', 'タロウ', main) == (85, 'r')
+    assert old.read_bytes() == data
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        'main.db', 'main.db-shm', 'main.db-wal', 'old.db'
+    ]
+
+
+def test_manifest_roundtrip_and_version(tmp_path):
+    conn = db.init_db(tmp_path / 'cache.db')
+    db.save_manifest('f', [(1, 100, 'a'), (-2, 0, 'b')], conn, ('m', 1))
+    rows = db.load_manifest('f', conn, ('m', 1))
+    assert sorted(rows) == [(-2, 0, 'b'), (1, 100, 'a')]
+    assert db.load_manifest('f', conn, ('m', 2)) == []
+    db.save_manifest('f', [(3, 85, 'c')], conn, ('m', 1))
+    assert db.load_manifest('f', conn, ('m', 1)) == [(3, 85, 'c')]
+
+
+def test_connection_manager_per_thread_connections(tmp_path):
+    import threading
+
+    manager = db.ConnectionManager(tmp_path / 'cache.db')
+    main = manager.connection()
+    assert manager.connection() is main
+    assert main.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+    assert main.execute('PRAGMA mmap_size').fetchone()[0] == db.PRAGMAS['mmap_size']
+
+    seen = []
+    errors = []
+
+    def work(i):
+        try:
+            conn = manager.connection()
+            seen.append(conn)
+            for j in range(50):
+                db.save_reading(f'名{i}', f'ヨミ{j}', 90, 'x', conn)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert len({id(c) for c in seen}) == 4 and main not in seen
+    assert main.execute('SELECT COUNT(*) FROM readings').fetchone()[0] == 200
+    manager.close()
+
+
+def test_process_dataframe_persists_sudachi_results(tmp_path):
+    conn = db.init_db(tmp_path / 'c.db')
+    df = pd.DataFrame({'名前': ['太郎', '未知'], 'フリガナ': ['タロウ', 'ミチコ']})
+    with patch('core.utils.scorer.gpt_candidates', return_value=['ミチコ']):
+        first = process_dataframe(df, '名前', 'フリガナ', db_conn=conn)
+
+    sources = dict(conn.execute('SELECT name, source FROM readings'))
+    assert sources == {'太郎': 'sudachi', '未知': 'candidates'}
+    assert db.get_sudachi_readings(['太郎', '未知', '他'], conn) == {
+        '太郎': 'タロウ', '未知': 'ミチ'
+    }
+
+    df.loc[2] = ['未知', 'ミチ']
+    with patch('core.utils.parser.sudachi_reading') as p_mock, patch(
+        'core.utils.scorer.gpt_candidates', return_value=['ミチコ']
+    ):
+        second = process_dataframe(df, '名前', 'フリガナ', db_conn=conn)
+    p_mock.assert_not_called()
+    assert list(second['信頼度'][:2]) == list(first['信頼度'])
+    assert second['理由'][2] == '辞書候補一致'
+
+
+def test_process_dataframe_passes_stored_sudachi_to_gpt(tmp_path):
+    conn = db.init_db(tmp_path / 'c.db')
+    db.save_sudachi_readings([('未知', 'ミチ')], conn)
+    df = pd.DataFrame({'名前': ['未知'], 'フリガナ': ['ミチコ']})
+    with patch('core.utils.parser.sudachi_reading') as p_mock, patch(
+        'core.utils.scorer.gpt_candidates', return_value=['ミチ', 'ミチコ']
+    ) as g_mock:
+        process_dataframe(df, '名前', 'フリガナ', db_conn=conn)
+    p_mock.assert_not_called()
+    g_mock.assert_called_once_with('未知', 'ミチ')
@@ -0,0 +1,101 @@
+import pandas as pd
+import pytest
+from unittest.mock import patch
+
+from core import db, distributed, scorer
+
+
+def _frame():
+    return pd.DataFrame({
+        '名前': ['太郎', '山田', '未知', '花子', '未知', None, '既知'],
+        'フリガナ': ['タロウ', 'ヤマダ', 'ミチ', 'ハナコ', 'ミチコ', '', 'スデチ'],
+        'ID': range(7),
+    })
+
+
+def test_split_work_partitions_by_name(tmp_path):
+    df = _frame()
+    conn = db.init_db(tmp_path / 'main.db')
+    parts = distributed.split_work(df, '名前', 'フリガナ', 3, tmp_path / 'w', conn)
+
+    assert len(parts) == 3
+    frames = [pd.read_parquet(p) for p in parts]
+    assert sorted(sum((list(f['row']) for f in frames), [])) == list(range(7))
+    owners = [i for i, f in enumerate(frames) if '未知' in set(f['name'].dropna())]
+    assert len(owners) == 1
+    assert all(distributed.worker_paths(p)[0].exists() for p in parts)
+
+
+class _FixedModel:
+    """Reading model answering every name, so workers never call the API.
+
+    It is passed to the workers explicitly (and pickled), which unlike a
+    mock also works with the spawn and forkserver start methods.
+    """
+
+    def candidates(self, name, threshold):
+        return ['ミチコ', 'ミチ']
+
+
+def test_split_work_writes_partition_sized_shards(tmp_path):
+    df = _frame()
+    conn = db.init_db(tmp_path / 'main.db')
+    names = ['太郎', '山田', '未知', '花子', '既知', '他人']
+    db.save_many_readings([(n, 'ヨミ', 90, 'r') for n in names], conn)
+    db.save_many_candidates([(n, ['ヨミ']) for n in names], conn)
+    workdir = tmp_path / 'w'
+    workdir.mkdir()
+    (workdir / 'result-5.parquet').write_bytes(b'stale')
+    (workdir / 'part-5.parquet').write_bytes(b'stale')
+
+    parts = distributed.split_work(df, '名前', 'フリガナ', 3, workdir, conn)
+
+    assert sorted(p.name for p in workdir.glob('*.parquet')) == [
+        'part-0.parquet', 'part-1.parquet', 'part-2.parquet'
+    ]
+    seen = []
+    for part in parts:
+        shard = db.init_db(distributed.worker_paths(part)[0])
+        cached = {r[0] for r in shard.execute('SELECT name FROM readings')}
+        assert cached == {r[0] for r in shard.execute('SELECT name FROM candidates')}
+        rows = set(pd.read_parquet(part)['name'].dropna())
+        assert rows & set(names) <= cached
+        seen.extend(cached)
+        shard.close()
+    assert sorted(seen) == sorted(names)
+
+
+def test_run_local_merges_results_and_cache_shards(tmp_path):
+    df = _frame()
+    conn = db.init_db(tmp_path / 'main.db')
+    db.save_reading('山田', 'ヤマダ', 95, 'cached', conn, scorer.CACHE_VERSION)
+    db.save_many_candidates([('既知', ['スデチ'])], conn, scorer.CACHE_VERSION)
+
+    out = distributed.run_local(
+        df, '名前', 'フリガナ', 2, tmp_path / 'w', conn,
+        reading_model=_FixedModel(), model_threshold=0.0,
+    )
+
+    assert list(out.columns) == ['名前', 'フリガナ', 'ID', '信頼度', '理由']
+    assert list(out['ID']) == list(range(7))
+    assert out['信頼度'][0] == 100
+    assert out['理由'][1] == 'cached'
+    assert out['信頼度'][5] == 0
+    assert (out['信頼度'][6], out['理由'][6]) == scorer.calc_confidence(
+        'スデチ', ['スデチ'], 'キチ'
+    )
+    # the injected model's candidates scored the reading Sudachi disagrees with
+    assert (out['信頼度'][4], out['理由'][4]) == scorer.calc_confidence(
+        'ミチコ', ['ミチコ', 'ミチ'], 'ミチ'
+    )
+    # results computed on the workers are merged into the coordinator cache
+    assert db.get_reading('未知', 'ミチコ', conn, scorer.CACHE_VERSION) is not None
+
+
+def test_merge_work_requires_every_result(tmp_path):
+    df = _frame()
+    parts = distributed.split_work(df, '名前', 'フリガナ', 2, tmp_path)
+    with patch('core.utils.scorer.gpt_candidates', return_value=[]):
+        distributed.run_worker(parts[0])
+    with pytest.raises(ValueError, match='part-1'):
+        distributed.merge_work(df, tmp_path)
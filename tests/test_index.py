@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+from unittest.mock import patch
+
+from core import db, scorer
+from core.index import ReadingIndex, build_index
+from core.utils import process_dataframe
+
+
+@pytest.fixture
+def index(tmp_path):
+    conn = db.init_db(tmp_path / 'c.db')
+    db.save_many_readings(
+        [
+            ('鈴木　昇', 'ｽｽﾞｷ ﾉﾎﾞﾙ', 100, '辞書候補一致'),
+            ('鈴木　幸佳', 'ｽｽﾞｷ ﾕｷｶ', 85, '候補1位一致'),
+            ('林　孝子', 'ﾊﾔｼ ﾀｶｺ', 85, '候補1位一致'),
+            ('林　孝子', 'ﾘﾝ ﾀｶｺ', 60, '5位内一致'),
+        ],
+        conn,
+        scorer.CACHE_VERSION,
+    )
+    path = tmp_path / 'index.bin'
+    assert build_index(conn, path) == 5
+    idx = ReadingIndex(path)
+    yield idx
+    idx.close()
+
+
+def test_lookup(index):
+    assert index.lookup('鈴木') == ['スズキ']
+    assert index.lookup('林') == ['ハヤシ']
+    assert index.lookup('田中') == []
+
+
+def test_match_spaced_and_unspaced(index):
+    assert index.match('林　昇', 'ﾊﾔｼ ﾉﾎﾞﾙ')
+    assert index.match('鈴木　孝子', 'スズキタカコ')
+    assert not index.match('鈴木　孝子', 'スズキ タカシ')
+    assert not index.match('田中　昇', 'タナカ ノボル')
+
+
+def test_empty_index(tmp_path):
+    conn = db.init_db(tmp_path / 'empty.db')
+    path = tmp_path / 'empty.bin'
+    assert build_index(conn, path) == 0
+    idx = ReadingIndex(path)
+    assert idx.lookup('林') == []
+    idx.close()
+
+
+def test_invalid_file(tmp_path):
+    path = tmp_path / 'bad.bin'
+    path.write_bytes(b'not an index')
+    with pytest.raises(ValueError):
+        ReadingIndex(path)
+
+
+def test_process_dataframe_resolves_from_index(index):
+    df = pd.DataFrame({'名前': ['林　幸佳', '未知'], 'フリガナ': ['ﾊﾔｼ ﾕｷｶ', 'ミチ']})
+
+    with patch('core.utils.parser.sudachi_reading', return_value=None) as p_mock, patch(
+        'core.utils.scorer.gpt_candidates', return_value=['ミチ']
+    ) as g_mock:
+        out = process_dataframe(df, '名前', 'フリガナ', reading_index=index)
+
+    p_mock.assert_called_once_with('未知')
+    g_mock.assert_called_once_with('未知', None)
+    assert list(out['信頼度']) == [90, 85]
+    assert out['理由'][0] == '既知構成一致'
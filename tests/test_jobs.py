@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+
+import pandas as pd
+from unittest.mock import patch
+
+from core import utils
+from core.jobs import JobManager, throttle_progress
+
+
+def _wait(job, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while job.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+def test_job_runs_pipeline_in_background():
+    df = pd.DataFrame({'名前': ['未知', '未知'], 'フリガナ': ['ミチ', 'ミチ']})
+    manager = JobManager()
+    with patch('core.utils.parser.sudachi_reading', return_value=None), patch(
+        'core.utils.scorer.async_gpt_candidates', return_value=['ミチ']
+    ):
+        job = manager.submit(
+            lambda on_progress: utils.async_process_dataframe(
+                df, '名前', 'フリガナ', on_progress
+            )
+        )
+        _wait(job)
+
+    assert job.status == 'done'
+    assert (job.done, job.total) == (2, 2)
+    assert list(job.result['信頼度']) == [85, 85]
+    assert manager.get(job.id) is job
+
+
+def test_job_cancel_and_error():
+    manager = JobManager()
+    started = threading.Event()
+
+    async def slow(on_progress):
+        started.set()
+        await asyncio.sleep(10)
+
+    job = manager.submit(slow)
+    started.wait(5)
+    job.cancel()
+    assert _wait(job).status == 'cancelled'
+
+    def boom(on_progress):
+        raise ValueError('bad input')
+
+    failed = _wait(manager.submit(boom))
+    assert failed.status == 'error'
+    assert isinstance(failed.error, ValueError)
+
+
+def test_job_cancel_from_progress_callback():
+    manager = JobManager()
+    release = threading.Event()
+
+    def work(on_progress):
+        on_progress(1, 3)
+        release.wait(5)
+        on_progress(2, 3)
+        return 'never'
+
+    job = manager.submit(work)
+    job.cancel()
+    release.set()
+    assert _wait(job).status == 'cancelled'
+    assert job.result is None
+
+
+def test_finished_jobs_are_pruned():
+    manager = JobManager(keep_finished=2)
+    jobs = [_wait(manager.submit(lambda p, i=i: i)) for i in range(4)]
+    manager.submit(lambda p: None)
+    assert manager.get(jobs[0].id) is None
+    assert manager.get(jobs[3].id).result == 3
+
+
+def test_throttle_progress():
+    calls = []
+    cb = throttle_progress(lambda d, t: calls.append(d), interval=60)
+    for i in range(1, 101):
+        cb(i, 100)
+    assert calls == [1, 100]
@@ -0,0 +1,106 @@
+import pandas as pd
+from unittest.mock import patch
+
+from core import db, scorer
+from core.model import ReadingModel, train_model
+from core.utils import process_dataframe
+
+
+def _trained(tmp_path):
+    conn = db.init_db(tmp_path / 'c.db')
+    db.save_many_readings(
+        [
+            ('鈴木　昇', 'ｽｽﾞｷ ﾉﾎﾞﾙ', 100, '辞書候補一致'),
+            ('鈴木　幸佳', 'ｽｽﾞｷ ﾕｷｶ', 85, '候補1位一致'),
+            ('林　孝子', 'ﾊﾔｼ ﾀｶｺ', 85, '候補1位一致'),
+            ('林　たき子', 'ﾊﾔｼ ﾀｷｺ', 0, '候補外･要確認'),
+            ('幸佳', 'サチカ ヨシカ', 85, '候補1位一致'),
+        ],
+        conn,
+        scorer.CACHE_VERSION,
+    )
+    return train_model(conn)
+
+
+def test_train_model_skips_derived_and_stale_verdicts(tmp_path):
+    conn = db.init_db(tmp_path / 'c.db')
+    version = scorer.CACHE_VERSION
+    db.save_many_readings([('林　昇', 'ﾊﾔｼ ﾉﾎﾞﾙ', 85, 'r')], conn, version, 'candidates')
+    db.save_many_readings([('林　孝子', 'ﾘﾝ ﾀｶｺ', 90, 'r')], conn, version, 'index')
+    db.save_many_readings([('林　幸佳', 'ﾘﾝ ﾕｷｶ', 85, 'r')], conn, version, 'model')
+    db.save_many_readings([('林　昌', 'ﾘﾝ ｼｮｳ', 85, 'r')], conn, ('old', 1), 'candidates')
+
+    model = train_model(conn)
+
+    assert model.counts == {'林': {'ハヤシ': 1}, '昇': {'ノボル': 1}}
+
+
+def test_train_model_counts_components(tmp_path):
+    model = _trained(tmp_path)
+    assert model.counts['鈴木'] == {'スズキ': 2}
+    assert model.counts['幸佳'] == {'ユキカ': 1}
+    # low confidence rows and misaligned readings are ignored
+    assert 'たき子' not in model.counts
+
+
+def test_predict_combines_components(tmp_path):
+    model = _trained(tmp_path)
+    assert model.predict('鈴木　孝子') == [('スズキタカコ', 1.0)]
+    assert model.predict('鈴木　未知') == []
+
+
+def test_candidates_escalates_low_confidence():
+    model = ReadingModel({'林': {'ハヤシ': 9, 'リン': 1}, '孝子': {'タカコ': 3}})
+    assert model.candidates('林　孝子', threshold=0.8) == ['ハヤシタカコ', 'リンタカコ']
+    assert model.candidates('林　孝子', threshold=0.95) is None
+
+
+def test_candidates_escalates_rare_components():
+    model = ReadingModel({'林': {'ハヤシ': 9}, '幸佳': {'ユキカ': 1}})
+    assert model.candidates('林　幸佳') is None
+    assert model.candidates('林　幸佳', min_count=1) == ['ハヤシユキカ']
+
+
+def test_save_and_load_round_trip(tmp_path):
+    model = _trained(tmp_path)
+    path = tmp_path / 'model.json'
+    model.save(path)
+    loaded = ReadingModel.load(path)
+    assert loaded.counts == model.counts
+    assert loaded.predict('林　昇') == model.predict('林　昇')
+
+
+def test_process_dataframe_uses_model_before_gpt(tmp_path):
+    model = ReadingModel({'林': {'ハヤシ': 3}, '孝子': {'タカコ': 3}})
+    df = pd.DataFrame({'名前': ['林　孝子', '未知'], 'フリガナ': ['ﾊﾔｼ ﾀｶｺ', 'ミチ']})
+    conn = db.init_db(tmp_path / 'c.db')
+
+    with patch('core.utils.parser.sudachi_reading', return_value=None), patch(
+        'core.utils.scorer.gpt_candidates', return_value=['ミチ']
+    ) as g_mock:
+        out = process_dataframe(
+            df, '名前', 'フリガナ', db_conn=conn, reading_model=model
+        )
+
+    g_mock.assert_called_once_with('未知', None)
+    assert list(out['信頼度']) == [85, 85]
+    # model verdicts are marked so training does not feed on them
+    sources = dict(conn.execute('SELECT name, source FROM readings'))
+    assert sources == {'林　孝子': 'model', '未知': 'candidates'}
+
+
+def test_process_dataframe_escalates_readings_the_model_lacks():
+    model = ReadingModel({'鈴木': {'スズキ': 5}, '幸佳': {'ユキカ': 5}})
+    df = pd.DataFrame({
+        '名前': ['鈴木　幸佳', '鈴木　幸佳', '鈴木　幸佳'],
+        'フリガナ': ['ｽｽﾞｷ ﾕｷｶ', 'ｽｽﾞｷ ﾕｷｶ', 'ｽｽﾞｷ ｻﾁｶ'],
+    })
+
+    with patch('core.utils.parser.sudachi_reading', return_value=None), patch(
+        'core.utils.scorer.gpt_candidates', return_value=['スズキサチカ', 'スズキユキカ']
+    ) as g_mock:
+        out = process_dataframe(df, '名前', 'フリガナ', reading_model=model)
+
+    # サチカ is unknown to the model, so the name is sent to GPT
+    g_mock.assert_called_once_with('鈴木　幸佳', None)
+    assert list(out['信頼度']) == [80, 80, 85]
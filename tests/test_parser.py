@@ -34,3 +34,14 @@ def test_sudachi_reading_cached():
 def test_sudachi_reading_ignores_spaces():
     # Sudachi should skip space tokens rather than output "キゴウ"
     assert parser.sudachi_reading("野々村　美枝子") == "ノノムラミエコ"
+
+
+def test_sudachi_reading_concurrent_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    names = [f"山田{i}" for i in range(2000)]
+    with ThreadPoolExecutor(4) as pool:
+        readings = list(pool.map(parser.sudachi_reading, names))
+
+    assert all(r.startswith("ヤマダ") for r in readings)
+    assert parser.get_tokenizer() is parser.TOKENIZER
@@ -0,0 +1,75 @@
+import asyncio
+import pandas as pd
+from unittest.mock import patch, AsyncMock
+
+from core import db, scorer
+from core.prefetch import prefetch_candidates, read_names
+from core.utils import process_dataframe
+
+
+def test_read_names_text_and_csv(tmp_path):
+    txt = tmp_path / 'names.txt'
+    txt.write_text('太郎\n\n花子\n', encoding='utf-8')
+    csv = tmp_path / 'names.csv'
+    pd.DataFrame({'ID': [1, 2], '名前': ['次郎', None]}).to_csv(csv, index=False)
+
+    assert read_names(txt) == ['太郎', '花子']
+    assert read_names(csv, '名前') == ['次郎']
+
+
+def test_prefetch_skips_cached_and_resumes(tmp_path):
+    conn = db.init_db(tmp_path / 'c.db')
+    db.save_many_candidates([('太郎', ['タロウ'])], conn, scorer.CACHE_VERSION)
+
+    async def gpt_side(name):
+        if name == '失敗':
+            raise RuntimeError('boom')
+        return [name + 'ヨミ']
+
+    progress = []
+    with patch(
+        'core.prefetch.scorer.async_gpt_candidates', new=AsyncMock(side_effect=gpt_side)
+    ) as g_mock:
+        stored = asyncio.run(
+            prefetch_candidates(
+                ['太郎', '花子', '花子', '失敗', 'あ' * 51],
+                conn,
+                rate_per_minute=0,
+                on_progress=lambda d, t: progress.append((d, t)),
+            )
+        )
+
+    assert stored == 1
+    assert g_mock.call_count == 2
+    assert progress[-1] == (2, 2)
+    assert db.get_candidates('花子', conn, scorer.CACHE_VERSION) == ['花子ヨミ']
+    # failed names stay missing so the next run retries them
+    assert db.missing_candidates(
+        ['太郎', '花子', '失敗'], conn, scorer.CACHE_VERSION
+    ) == ['失敗']
+
+
+def test_prefetch_respects_limit(tmp_path):
+    conn = db.init_db(tmp_path / 'c.db')
+    with patch(
+        'core.prefetch.scorer.async_gpt_candidates', new=AsyncMock(return_value=['ヨミ'])
+    ) as g_mock:
+        stored = asyncio.run(
+            prefetch_candidates(['一', '二', '三'], conn, rate_per_minute=0, limit=2)
+        )
+    assert stored == 2
+    assert g_mock.call_count == 2
+
+
+def test_process_dataframe_uses_prefetched_candidates(tmp_path):
+    conn = db.init_db(tmp_path / 'c.db')
+    db.save_many_candidates([('未知', ['ミチ'])], conn, scorer.CACHE_VERSION)
+    df = pd.DataFrame({'名前': ['未知'], 'フリガナ': ['ミチ']})
+
+    with patch('core.utils.parser.sudachi_reading', return_value=None), patch(
+        'core.utils.scorer.gpt_candidates'
+    ) as g_mock:
+        out = process_dataframe(df, '名前', 'フリガナ', db_conn=conn)
+
+    g_mock.assert_not_called()
+    assert out['信頼度'][0] == 85
@@ -0,0 +1,81 @@
+from unittest.mock import patch
+
+from core import db, scorer
+from core.rescore import rescore_cache
+
+
+def _verdicts(conn):
+    return {
+        (n, r): (c, reason, src)
+        for n, r, c, reason, src in conn.execute(
+            'SELECT name, reading, confidence, reason, source FROM readings'
+        )
+    }
+
+
+def test_rescore_recomputes_from_stored_candidates(tmp_path):
+    conn = db.init_db(tmp_path / 'c.db')
+    version = scorer.CACHE_VERSION
+    db.save_many_candidates([('未知', ['ミチコ', 'ミチ'])], conn, version)
+    db.save_sudachi_readings([('未知', 'ミチ')], conn)
+    db.save_many_readings(
+        [('未知', 'ミチコ', 0, 'old rule'), ('未知', 'ミチヨ', 70, 'old rule')],
+        conn, version, 'candidates',
+    )
+    db.save_many_readings([('未知', 'ミチ', 0, 'old rule')], conn, version, 'candidates')
+    db.save_many_readings([('山田太郎', 'ヤマダタロウ', 95, 'index')], conn, version, 'index')
+    db.save_many_readings([('謎', 'メイ', 50, 'model')], conn, version, 'candidates')
+    db.save_many_readings([('他', 'ホカ', 50, 'other')], conn, ('old', 1), 'candidates')
+
+    progress = []
+    with patch('core.rescore.scorer.gpt_candidates') as g_mock:
+        counts = rescore_cache(
+            conn, chunk_size=2, on_progress=lambda d, t: progress.append((d, t))
+        )
+    g_mock.assert_not_called()
+
+    verdicts = _verdicts(conn)
+    assert verdicts[('未知', 'ミチコ')] == (
+        *scorer.calc_confidence('ミチコ', ['ミチコ', 'ミチ'], 'ミチ'), 'candidates'
+    )
+    assert verdicts[('未知', 'ミチ')] == (100, '辞書候補一致', 'sudachi')
+    assert verdicts[('山田太郎', 'ヤマダタロウ')] == (95, 'index', 'index')
+    assert verdicts[('他', 'ホカ')] == (50, 'other', 'candidates')
+    assert counts == {
+        'rescored': 3, 'changed': 3, 'kept': 1, 'missing': 1, 'manifests': 0
+    }
+    assert progress[-1] == (5, 5)
+    # names without stored Sudachi readings were tokenized once and stored
+    assert '謎' in db.get_sudachi_readings(['謎'], conn)
+
+
+def test_rescore_drops_verdicts_without_candidates(tmp_path):
+    conn = db.init_db(tmp_path / 'c.db')
+    db.save_many_readings([('謎', 'メイ', 50, 'model')], conn, scorer.CACHE_VERSION)
+
+    counts = rescore_cache(conn, drop_missing=True)
+
+    assert counts['dropped'] == 1
+    assert _verdicts(conn) == {}
+
+
+def test_rescore_resets_manifests(tmp_path):
+    import pandas as pd
+    from core.utils import process_incremental
+
+    conn = db.init_db(tmp_path / 'c.db')
+    df = pd.DataFrame({'名前': ['未知'], 'フリガナ': ['ミチコ']})
+    with patch('core.utils.parser.sudachi_reading', return_value=None), patch(
+        'core.utils.scorer.gpt_candidates', return_value=['ミチ', 'ミチコ']
+    ):
+        first = process_incremental(df, '名前', 'フリガナ', 'f', conn)
+    assert first['信頼度'][0] == 80
+
+    with patch('core.rescore.scorer.calc_confidence', return_value=(75, 'new rule')):
+        counts = rescore_cache(conn)
+    assert counts['changed'] == 1 and counts['manifests'] == 1
+
+    with patch('core.utils.parser.sudachi_reading') as p_mock:
+        again = process_incremental(df, '名前', 'フリガナ', 'f', conn)
+    p_mock.assert_not_called()
+    assert again['信頼度'][0] == 75
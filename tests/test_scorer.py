@@ -1,5 +1,6 @@
 from unittest.mock import patch, AsyncMock
 import types
+import math
 import openai
 import asyncio
 
@@ -241,3 +242,144 @@ def test_calc_confidence_outside_top_five_returns_zero():
     conf, reason = scorer.calc_confidence("タロウ5", candidates)
     assert conf == 0
     assert reason == "候補外･要確認"
+
+
+def _token(token, logprob, alts=()):
+    top = [
+        types.SimpleNamespace(token=t, logprob=lp, bytes=list(t.encode()))
+        for t, lp in alts
+    ]
+    return types.SimpleNamespace(
+        token=token, logprob=logprob, bytes=list(token.encode()), top_logprobs=top
+    )
+
+
+def _logprob_response():
+    tokens = [
+        _token("カワイ", math.log(0.9), [("カワイ", math.log(0.9)), ("カワアイ", math.log(0.1))]),
+        _token("ヨシト", math.log(0.6), [("ヨシト", math.log(0.6)), ("ヨシヒト", math.log(0.4))]),
+    ]
+    return types.SimpleNamespace(
+        choices=[types.SimpleNamespace(logprobs=types.SimpleNamespace(content=tokens))]
+    )
+
+
+def test_ranked_readings_from_logprobs():
+    ranked = scorer._ranked_readings(_logprob_response().choices[0].logprobs.content)
+    assert [r for r, _ in ranked] == ["カワイヨシト", "カワイヨシヒト", "カワアイヨシト", "カワアイヨシヒト"]
+    assert abs(ranked[0][1] - 0.54) < 1e-9
+    assert abs(sum(p for _, p in ranked) - 1.0) < 1e-9
+
+
+def test_ranked_readings_join_partial_token_bytes():
+    # "ヨ" (e3 83 a8) split across two tokens, as byte-level tokenizers do
+    head, tail = "ヨ".encode()[:2], "ヨ".encode()[2:]
+    tokens = [
+        types.SimpleNamespace(
+            token="カワイ", logprob=0.0, bytes=list("カワイ".encode()), top_logprobs=[]
+        ),
+        types.SimpleNamespace(
+            token="bytes:\\xe3\\x83", logprob=0.0, bytes=list(head), top_logprobs=[]
+        ),
+        types.SimpleNamespace(
+            token="bytes:\\xa8",
+            logprob=math.log(0.5),
+            bytes=list(tail),
+            top_logprobs=[],
+        ),
+    ]
+    ranked = scorer._ranked_readings(tokens)
+    assert ranked[0][0] == "カワイヨ"
+    assert abs(ranked[0][1] - 0.5) < 1e-9
+
+
+def test_calc_confidence_uses_candidate_probabilities():
+    sure = ["タロウ", ["フトシ", 0.99], ["タカオ", 0.01]]
+    unsure = ["タロウ", ["フトシ", 0.3], ["タカオ", 0.2]]
+    assert scorer.calc_confidence("フトシ", sure, "タロウ") == (89, "候補1位一致")
+    assert scorer.calc_confidence("フトシ", unsure, "タロウ") == (86, "候補1位一致")
+    # each rank stays inside its own band
+    assert scorer.calc_confidence("タカオ", sure, "タロウ") == (80, "候補2位一致")
+    assert scorer.calc_confidence("タカオ", [["タカオ", 1.0]]) == (89, "候補1位一致")
+    assert scorer.calc_confidence("フトシ", ["タロウ", ["フトシ", 1.0]]) == (
+        84, "候補2位一致"
+    )
+    assert scorer.calc_confidence("ジロウ", sure, "タロウ") == (0, "候補外･要確認")
+
+
+def test_logprobs_mode_uses_single_request():
+    scorer.gpt_candidates.cache_clear()
+    scorer.gpt_ranked_candidates.cache_clear()
+    with patch.object(scorer, "CANDIDATE_MODE", "logprobs"), patch(
+        "core.scorer.parser.sudachi_reading", return_value="カワイヨシト"
+    ), patch(
+        "core.scorer._call_with_backoff", return_value=_logprob_response()
+    ) as mock_call:
+        cands = scorer.gpt_candidates("河合良人")
+
+    assert mock_call.call_count == 1
+    assert mock_call.call_args.kwargs["logprobs"] is True
+    assert cands[0] == "カワイヨシト"
+    assert cands[1][0] == "カワイヨシヒト" and abs(cands[1][1] - 0.36) < 1e-9
+    # the first rank's band 85-89, raised by the probability 0.36
+    assert scorer.calc_confidence("カワイヨシヒト", cands, "カワイヨシト") == (
+        86, "候補1位一致"
+    )
+
+    async def run():
+        with patch.object(scorer, "CANDIDATE_MODE", "logprobs"), patch(
+            "core.scorer.parser.sudachi_reading", return_value=None
+        ), patch(
+            "core.scorer._acall_with_backoff",
+            AsyncMock(return_value=_logprob_response()),
+        ) as amock:
+            return await scorer.async_gpt_candidates("河合良人"), amock.await_count
+
+    acands, calls = asyncio.run(run())
+    assert calls == 1
+    assert acands[0][0] == "カワイヨシト" and abs(acands[0][1] - 0.54) < 1e-9
+
+
+def test_scorer_ranked_candidates_use_probabilities():
+    ranked = [("カワイヨシヒト", 0.7), ("カワイヨシト", 0.3)]
+    res = scorer.Scorer().get_ranked_candidates(ranked, "カワイヨシト")
+    assert res["status"] == "warning"
+    assert [c["furigana"] for c in res["candidates"]] == ["カワイヨシヒト", "カワイヨシト"]
+    assert scorer.Scorer().get_ranked_candidates([], "カワイ")["status"] == "error"
+
+
+def _choices(*contents):
+    return types.SimpleNamespace(
+        choices=[
+            types.SimpleNamespace(message=types.SimpleNamespace(content=c))
+            for c in contents
+        ]
+    )
+
+
+def test_staged_candidates_exit_early():
+    from collections import Counter
+
+    stats = Counter()
+    with patch("core.scorer.parser.sudachi_reading", return_value=None), patch(
+        "core.scorer._call_with_backoff",
+        side_effect=[_choices("ミチ"), _choices("ミチ"), _choices("ミチコ", "ミチオ")],
+    ) as mock_call:
+        cands, complete = scorer.staged_candidates("未知", ["ﾐﾁ"], stats)
+        assert (cands, complete) == (["ミチ"], False)
+        cands, complete = scorer.staged_candidates("未知", ["ミチ", "ミチコ"], stats)
+
+    assert (cands, complete) == (["ミチ", "ミチコ", "ミチオ"], True)
+    assert mock_call.call_count == 3
+    assert mock_call.call_args_list[0].kwargs["temperature"] == 0.0
+    assert stats == {"stage1": 2, "stage2": 1, "early_exit": 1}
+
+
+def test_staged_candidates_reuses_known_sudachi_reading():
+    with patch("core.scorer.parser.sudachi_reading") as p_mock, patch(
+        "core.scorer._call_with_backoff", return_value=_choices("ミチコ")
+    ):
+        cands, _ = scorer.staged_candidates("未知", ["ミチ"], sudachi="ミチ")
+
+    p_mock.assert_not_called()
+    assert cands[0] == "ミチ"
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import threading
+import time
+import urllib.request
+import warnings
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from core.client import check_remote, ensure_daemon, ping, scorer_response
+from core.model import MIN_TRAIN_CONFIDENCE
+from core.service import CheckService, make_server, serve
+
+
+def test_check_service_coalesces_requests(tmp_path):
+    service = CheckService(tmp_path / 'cache.db', batch_window=0.2).start()
+    gpt = AsyncMock(return_value=['ミチ', 'ミチコ'])
+    try:
+        with patch('core.utils.parser.sudachi_reading', return_value=None), patch(
+            'core.utils.scorer.async_gpt_candidates', gpt
+        ):
+            futures = [
+                service.submit('未知', r) for r in ['ミチ', 'ミチコ', 'ミチ', 'ハナ']
+            ]
+            results = [f.result(5) for f in futures]
+    finally:
+        service.close()
+
+    gpt.assert_awaited_once_with('未知', None)
+    assert [r['confidence'] for r in results] == [85, 80, 85, 0]
+    assert all(r['batch_size'] == 4 for r in results)
+    assert all(r['latency_ms'] >= 0 for r in results)
+
+
+def test_check_service_flushes_full_batch(tmp_path):
+    service = CheckService(tmp_path / 'cache.db', batch_window=10, max_batch=2).start()
+    try:
+        with patch('core.utils.parser.sudachi_reading', return_value='タロウ'):
+            futures = [service.submit('太郎', 'タロウ') for _ in range(2)]
+            assert [f.result(5)['reason'] for f in futures] == ['辞書候補一致'] * 2
+    finally:
+        service.close()
+
+
+def test_http_server_json_and_ndjson(tmp_path):
+    service = CheckService(tmp_path / 'cache.db', batch_window=0.01).start()
+    server = make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f'http://127.0.0.1:{server.server_port}'
+
+    def post(body, content_type):
+        req = urllib.request.Request(
+            url + '/check', body.encode(), {'Content-Type': content_type}
+        )
+        with urllib.request.urlopen(req, timeout=5) as res:
+            return res.read().decode()
+
+    try:
+        with patch('core.utils.parser.sudachi_reading', return_value='タロウ'):
+            single = json.loads(post(
+                json.dumps({'name': '太郎', 'reading': 'タロウ'}), 'application/json'
+            ))
+            lines = post(
+                '{"name": "太郎", "reading": "タロウ"}\n{"name": "", "reading": ""}\n',
+                'application/x-ndjson',
+            ).splitlines()
+        with urllib.request.urlopen(url + '/stats', timeout=5) as res:
+            stats = json.loads(res.read())
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
+
+    assert single['confidence'] == 100
+    assert [json.loads(line)['confidence'] for line in lines] == [100, 0]
+    assert stats['requests'] == 3
+
+
+def test_serve_stops_when_idle_and_client_helpers(tmp_path):
+    service = CheckService(tmp_path / 'cache.db', batch_window=0.01).start()
+    server = make_server(service, port=0)
+    port = server.server_port
+    thread = threading.Thread(target=serve, args=(server, service, 0.5))
+    thread.start()
+    try:
+        assert ping(port=port)
+        assert not ensure_daemon(port=port)
+        with patch('core.utils.parser.sudachi_reading', return_value='タロウ'):
+            result = check_remote('太郎', 'タロウ', port=port)
+        thread.join(5)
+        assert not thread.is_alive()
+    finally:
+        server.server_close()
+        service.close()
+
+    assert not ping(port=port)
+    response = scorer_response(result)
+    assert response['status'] == 'success'
+    assert response['input_kanji'] == '太郎'
+    assert scorer_response({**result, 'confidence': 60})['status'] == 'warning'
+    assert scorer_response({**result, 'confidence': 0})['status'] == 'error'
+
+
+def test_logprobs_first_rank_reported_as_success(tmp_path):
+    # a first-rank logprobs match with a low probability still counts as one
+    gpt = AsyncMock(return_value=[['ミチコ', 0.2], ['ミチ', 0.1]])
+    service = CheckService(tmp_path / 'cache.db', batch_window=0.01).start()
+    try:
+        with patch('core.utils.parser.sudachi_reading', return_value=None), patch(
+            'core.utils.scorer.async_gpt_candidates', gpt
+        ):
+            first = service.submit('未知', 'ミチコ').result(5)
+            second = service.submit('未知', 'ミチ').result(5)
+    finally:
+        service.close()
+
+    assert first['confidence'] >= MIN_TRAIN_CONFIDENCE
+    assert scorer_response(first)['status'] == 'success'
+    assert scorer_response(second)['status'] == 'warning'
+
+
+def test_ensure_daemon_resolves_and_checks_the_cache_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with patch('core.client.ping', side_effect=[False, True]), patch(
+        'core.client.subprocess.Popen'
+    ) as popen:
+        assert ensure_daemon(db_path='rel.db')
+    cmd = popen.call_args.args[0]
+    assert cmd[cmd.index('--db') + 1] == str(tmp_path / 'rel.db')
+
+    service = CheckService(tmp_path / 'cache.db', batch_window=0.01).start()
+    server = make_server(service, port=0)
+    port = server.server_port
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            assert not ensure_daemon(port=port, db_path='cache.db')
+        with pytest.warns(UserWarning, match='other.db'):
+            assert not ensure_daemon(port=port, db_path='other.db')
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
+
+
+def test_check_service_start_raises_cache_errors(tmp_path):
+    blocker = tmp_path / 'notadir'
+    blocker.write_text('')
+    service = CheckService(blocker / 'x.db')
+    with pytest.raises(OSError):
+        service.start()
+    with pytest.raises(RuntimeError):
+        service.submit('太郎', 'タロウ')
+
+
+def test_check_service_keeps_batch_tasks_until_done(tmp_path):
+    service = CheckService(tmp_path / 'cache.db', batch_window=0.01).start()
+    try:
+        with patch('core.utils.parser.sudachi_reading', return_value='タロウ'):
+            assert service.submit('太郎', 'タロウ').result(5)['confidence'] == 100
+    finally:
+        service.close()
+    assert not service._tasks
+
+
+def test_check_service_close_drains_or_fails_pending_checks(tmp_path):
+    async def slow(delay):
+        await asyncio.sleep(delay)
+        return ['ミチ']
+
+    service = CheckService(tmp_path / 'cache.db', batch_window=0.01).start()
+    with patch('core.utils.parser.sudachi_reading', return_value=None), patch(
+        'core.utils.scorer.async_gpt_candidates', lambda name, sudachi: slow(0.2)
+    ):
+        queued = service.submit('未知', 'ミチ')
+        service.close()
+    assert queued.result(0)['confidence'] == 85
+
+    service = CheckService(tmp_path / 'cache.db', batch_window=0.01).start()
+    with patch('core.utils.parser.sudachi_reading', return_value=None), patch(
+        'core.utils.scorer.async_gpt_candidates', lambda name, sudachi: slow(10)
+    ):
+        stuck = service.submit('謎々', 'ナゾナゾ')
+        time.sleep(0.1)
+        service.close(timeout=0.1)
+    with pytest.raises(RuntimeError, match='closed'):
+        stuck.result(0)
@@ -100,7 +100,7 @@ def test_process_dataframe_nan_furigana():
 
     assert out['信頼度'][0] == 0
     assert out['理由'][0] == '候補外･要確認'
-    mock.assert_called_once_with('太郎')
+    mock.assert_called_once_with('太郎', 'タロウ')
 
 
 def test_to_excel_bytes_template():
@@ -221,7 +221,7 @@ def test_process_dataframe_uses_correct_sudachi():
     def sudachi_side(name: str) -> str:
         return {'太郎': 'タロウ', '花子': 'ハナコ'}[name]
 
-    def gpt_side(name: str) -> list[str]:
+    def gpt_side(name: str, sudachi: str | None) -> list[str]:
         return {'太郎': ['タロウ'], '花子': ['ハナコ']}[name]
 
     with patch('core.utils.parser.sudachi_reading', side_effect=sudachi_side), patch(
@@ -242,7 +242,7 @@ def test_async_process_dataframe_uses_correct_sudachi():
     def sudachi_side(name: str) -> str:
         return {'太郎': 'タロウ', '花子': 'ハナコ'}[name]
 
-    def gpt_side(name: str) -> list[str]:
+    def gpt_side(name: str, sudachi: str | None) -> list[str]:
         return {'太郎': ['タロウ'], '花子': ['ハナコ']}[name]
 
     async def run_test():
@@ -256,3 +256,420 @@ def test_async_process_dataframe_uses_correct_sudachi():
     assert count == 1
     assert list(result['信頼度']) == [0, 100]
     assert list(result['理由']) == ['候補外･要確認', '辞書候補一致']
+
+
+def _template(rows, bold_header=True):
+    wb = Workbook()
+    ws = wb.active
+    for row in rows:
+        ws.append(row)
+    if bold_header:
+        from openpyxl.styles import Font
+        ws['A1'].font = Font(bold=True)
+    wb.create_sheet('Other')['A1'] = 'keep'
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def test_append_result_columns_preserves_template():
+    tmpl = _template([['名前', 'フリガナ'], ['太郎', 'タロウ'], [None, None], ['花子', 'ハナコ']])
+    results = pd.DataFrame({
+        '信頼度': [100, 0, 85],
+        '理由': ['辞書候補一致', '長すぎる', '候補1位一致 <&>'],
+    })
+
+    out = utils.append_result_columns(tmpl, results)
+
+    wb = load_workbook(BytesIO(out))
+    ws = wb.worksheets[0]
+    assert [c.value for c in ws[1]] == ['名前', 'フリガナ', '信頼度', '理由']
+    assert [c.value for c in ws[2]] == ['太郎', 'タロウ', 100, '辞書候補一致']
+    assert [c.value for c in ws[3]] == [None, None, 0, '長すぎる']
+    assert ws['D4'].value == '候補1位一致 <&>'
+    assert ws['A1'].font.bold
+    assert wb['Other']['A1'].value == 'keep'
+    assert ws.dimensions == 'A1:D4'
+
+    back = pd.read_excel(BytesIO(out))
+    assert list(back['信頼度']) == [100, 0, 85]
+
+
+def test_append_result_columns_missing_rows_and_shared_strings():
+    # xlsxwriter uses shared strings and omits empty rows entirely
+    buf = BytesIO()
+    pd.DataFrame({'名前': ['太郎'], 'フリガナ': ['タロウ']}).to_excel(
+        buf, index=False, engine='xlsxwriter'
+    )
+    results = pd.DataFrame({'信頼度': [100, None, 60], '理由': ['a', None, 'c']})
+
+    out = utils.append_result_columns(buf.getvalue(), results)
+
+    ws = load_workbook(BytesIO(out)).active
+    assert ws['A2'].value == '太郎'
+    assert (ws['C1'].value, ws['D1'].value) == ('信頼度', '理由')
+    assert (ws['C2'].value, ws['D2'].value) == (100, 'a')
+    assert ws['C3'].value is None
+    assert (ws['C4'].value, ws['D4'].value) == (60, 'c')
+
+
+def test_csv_and_parquet_bytes():
+    df = pd.DataFrame({'名前': ['太郎'], '信頼度': [100], '理由': ['辞書候補一致']})
+    csv = utils.to_csv_bytes(df)
+    assert csv.startswith(b'\xef\xbb\xbf')
+    pd.testing.assert_frame_equal(pd.read_csv(BytesIO(csv), encoding='utf-8-sig'), df)
+    pd.testing.assert_frame_equal(
+        pd.read_parquet(BytesIO(utils.to_parquet_bytes(df))), df
+    )
+
+
+def test_export_cache_builds_each_format_once():
+    df = pd.DataFrame({'名前': ['太郎'], '信頼度': [100], '理由': ['辞書候補一致']})
+    cache = utils.ExportCache('job-1', df)
+    assert 'csv' not in cache
+
+    with patch('core.utils.to_csv_bytes', wraps=utils.to_csv_bytes) as csv_mock:
+        first = cache.get('csv')
+        second = cache.get('csv')
+
+    assert first is second
+    assert csv_mock.call_count == 1
+    assert 'csv' in cache and 'xlsx' not in cache
+    assert load_workbook(BytesIO(cache.get('xlsx'))).active['B2'].value == 100
+
+
+def test_export_cache_appends_to_template():
+    tmpl = _template([['名前'], ['太郎']], bold_header=False)
+    df = pd.DataFrame({'名前': ['太郎'], '信頼度': [100], '理由': ['辞書候補一致']})
+    cache = utils.ExportCache('job-1', df, template_bytes=tmpl, append=True)
+    with patch('core.utils.to_excel_bytes') as full_mock:
+        out = cache.get('xlsx')
+    full_mock.assert_not_called()
+    assert load_workbook(BytesIO(out)).active['C2'].value == '辞書候補一致'
+
+
+def test_read_columns_prunes_parquet_and_csv(tmp_path):
+    df = pd.DataFrame({'ID': [1, 2], '名前': ['太郎', '花子'], 'フリガナ': ['タロウ', None]})
+    df.to_parquet(tmp_path / 'in.parquet', index=False)
+    df.to_csv(tmp_path / 'in.csv', index=False)
+
+    for path in (tmp_path / 'in.parquet', tmp_path / 'in.csv'):
+        out = utils.read_columns(path, ['名前', 'フリガナ'])
+        assert list(out.columns) == ['名前', 'フリガナ']
+        assert list(out['名前']) == ['太郎', '花子']
+        assert pd.isna(out['フリガナ'][1])
+
+    assert utils.input_format(tmp_path / 'IN.XLSX') == 'xlsx'
+
+
+def test_process_csv_chunks_matches_process_dataframe(tmp_path):
+    df = pd.DataFrame({
+        '名前': ['太郎', '未知', '花子'],
+        'フリガナ': ['タロウ', 'ミチ', 'ハナコ'],
+        'メモ': ['x', 'y', 'z'],
+    })
+    path = tmp_path / 'in.csv'
+    df.to_csv(path, index=False)
+
+    with patch('core.utils.scorer.gpt_candidates', return_value=['ミチ']):
+        chunks = list(utils.process_csv_chunks(path, '名前', 'フリガナ', chunksize=2))
+        expected = process_dataframe(df[['名前', 'フリガナ']], '名前', 'フリガナ')
+
+    assert len(chunks) == 2
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected)
+
+
+def test_read_preview_formats(tmp_path):
+    df = pd.DataFrame({'名前': [f'名{i}' for i in range(20)], 'フリガナ': ['ヨミ'] * 20})
+    df.to_parquet(tmp_path / 'in.parquet', index=False)
+    df.to_csv(tmp_path / 'in.csv', index=False)
+    buf = BytesIO()
+    df.to_excel(buf, index=False)
+
+    for source in (tmp_path / 'in.parquet', tmp_path / 'in.csv'):
+        pd.testing.assert_frame_equal(utils.read_preview(source, nrows=3), df.head(3))
+
+    buf.name = 'upload.xlsx'
+    preview = utils.read_preview(buf, nrows=3)
+    pd.testing.assert_frame_equal(preview, df.head(3))
+    # file objects are rewound for the full load
+    assert buf.tell() == 0
+    assert len(utils.read_columns(buf, ['フリガナ'])) == 20
+
+
+def test_read_preview_unnamed_header():
+    wb = Workbook()
+    wb.active.append(['名前', None])
+    wb.active.append(['太郎', 'タロウ'])
+    buf = BytesIO()
+    wb.save(buf)
+    preview = utils.read_preview(buf, fmt='xlsx')
+    assert list(preview.columns) == ['名前', 'Unnamed: 1']
+
+
+def test_process_frames_dedupes_across_sources():
+    frames = {
+        ('a.xlsx', '1月'): pd.DataFrame(
+            {'名前': ['未知', '太郎'], 'フリガナ': ['ミチ', 'タロウ'], 'ID': [1, 2]}
+        ),
+        ('a.xlsx', '2月'): pd.DataFrame({'名前': ['未知'], 'フリガナ': ['ミチコ']}),
+        ('b.csv', None): pd.DataFrame({'名前': ['未知']}),
+    }
+
+    def sudachi_side(name):
+        return {'太郎': 'タロウ'}.get(name)
+
+    with patch('core.utils.parser.sudachi_reading', side_effect=sudachi_side), patch(
+        'core.utils.scorer.gpt_candidates', return_value=['ミチ', 'ミチコ']
+    ) as g_mock:
+        out = utils.process_frames(frames, '名前', 'フリガナ')
+
+    g_mock.assert_called_once_with('未知', None)
+    assert list(out) == list(frames)
+    jan = out[('a.xlsx', '1月')]
+    assert list(jan.columns) == ['名前', 'フリガナ', 'ID', '信頼度', '理由']
+    assert list(jan['信頼度']) == [85, 100]
+    assert list(out[('a.xlsx', '2月')]['信頼度']) == [80]
+    assert list(out[('b.csv', None)]['理由']) == ['候補外･要確認']
+
+
+def test_async_process_frames_and_read_sources(tmp_path):
+    path = tmp_path / 'book.xlsx'
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({'名前': ['未知'], 'フリガナ': ['ミチ'], 'メモ': ['x']}).to_excel(
+            writer, sheet_name='S1', index=False
+        )
+        pd.DataFrame({'名前': ['未知'], 'フリガナ': ['ミチ']}).to_excel(
+            writer, sheet_name='S2', index=False
+        )
+    pd.DataFrame({'名前': ['未知'], 'フリガナ': ['ミチ']}).to_csv(
+        tmp_path / 'c.csv', index=False
+    )
+    # files lacking a column omit it like sheets do
+    pd.DataFrame({'名前': ['未知']}).to_csv(tmp_path / 'd.csv', index=False)
+    pd.DataFrame({'名前': ['未知']}).to_parquet(tmp_path / 'e.parquet')
+
+    sources = [path, tmp_path / 'c.csv', tmp_path / 'd.csv', tmp_path / 'e.parquet']
+    frames = utils.read_sources(sources, ['名前', 'フリガナ'])
+    assert [k[1] for k in frames] == ['S1', 'S2', None, None, None]
+    assert list(frames[(str(path), 'S1')].columns) == ['名前', 'フリガナ']
+    assert list(frames[(str(tmp_path / 'd.csv'), None)].columns) == ['名前']
+    assert list(frames[(str(tmp_path / 'e.parquet'), None)].columns) == ['名前']
+
+    async def run_test():
+        with patch('core.utils.parser.sudachi_reading', return_value=None), patch(
+            'core.utils.scorer.async_gpt_candidates', return_value=['ミチ']
+        ) as g_mock:
+            out = await utils.async_process_frames(frames, '名前', 'フリガナ')
+        return out, g_mock.call_count
+
+    out, count = asyncio.run(run_test())
+    assert count == 1
+    assert [list(f['信頼度']) for f in out.values()][:3] == [[85]] * 3
+
+
+def test_process_dataframe_sharded_matches_serial(tmp_path):
+    from core import db
+
+    conn = db.init_db(tmp_path / 'cache.db')
+    db.save_reading('山田', 'ヤマダ', 95, 'cached', conn, scorer.CACHE_VERSION)
+    df = pd.DataFrame({
+        '名前': ['太郎', '山田', 'あ' * 51, '未知', '花子', '未知', None],
+        'フリガナ': ['タロウ', 'ヤマダ', '', 'ミチ', 'ハナコ', 'ミチコ', ''],
+    })
+
+    progress = []
+    with patch('core.utils.scorer.gpt_candidates', return_value=['ミチ']) as g_mock:
+        sharded = process_dataframe(
+            df, '名前', 'フリガナ', db_conn=conn, processes=2,
+            on_progress=lambda d, t: progress.append(d),
+        )
+    assert g_mock.call_count == 1
+    assert progress[-1] == len(df)
+
+    with patch('core.utils.scorer.gpt_candidates', return_value=['ミチ']):
+        serial = process_dataframe(df, '名前', 'フリガナ', db_conn=conn)
+
+    assert list(sharded['信頼度']) == list(serial['信頼度'])
+    assert list(sharded['理由']) == list(serial['理由'])
+    assert sharded['理由'][1] == 'cached'
+    assert sharded['信頼度'][0] == 100
+
+
+def test_process_incremental_rechecks_changed_rows(tmp_path):
+    from core import db
+
+    conn = db.init_db(tmp_path / 'cache.db')
+    df = pd.DataFrame({
+        '名前': ['太郎', '花子', '未知', None],
+        'フリガナ': ['タロウ', 'ハナコ', 'ミチ', ''],
+        'メモ': ['a', 'b', 'c', 'd'],
+    })
+    with patch('core.utils.scorer.gpt_candidates', return_value=['ミチ']):
+        first = utils.process_incremental(df, '名前', 'フリガナ', 'book.xlsx', conn)
+    assert list(first['信頼度']) == [100, 100, 100, 0]
+
+    edited = df.copy()
+    edited.loc[1, 'フリガナ'] = 'ハナヨ'
+    edited.loc[4] = ['新人', 'シンジン', 'e']
+    progress = []
+    with patch(
+        'core.utils.process_dataframe', wraps=utils.process_dataframe
+    ) as p_mock, patch('core.utils.scorer.gpt_candidates', return_value=['ハナコ']):
+        second = utils.process_incremental(
+            edited, '名前', 'フリガナ', 'book.xlsx', conn,
+            on_progress=lambda d, t: progress.append((d, t)),
+        )
+
+    assert list(p_mock.call_args.args[0].index) == [1, 4]
+    assert progress[0] == (3, 5) and progress[-1] == (5, 5)
+    assert list(second['メモ']) == list(edited['メモ'])
+    assert list(second['信頼度'][[0, 2, 3]]) == [100, 100, 0]
+    assert second['信頼度'][1] == 0
+    assert len(db.load_manifest('book.xlsx', conn, scorer.CACHE_VERSION)) == 5
+    # same result dtypes as process_dataframe, whether rows were reused or not
+    direct = utils.process_dataframe(edited.iloc[[0]], '名前', 'フリガナ')
+    for out in (direct, first, second):
+        assert out['信頼度'].dtype == 'int8'
+        assert out['理由'].dtype.name == 'category'
+
+    async def run_again():
+        with patch('core.utils.async_process_dataframe') as a_mock:
+            out = await utils.async_process_incremental(
+                edited, '名前', 'フリガナ', 'book.xlsx', conn
+            )
+        return out, a_mock.call_count
+
+    third, calls = asyncio.run(run_again())
+    assert calls == 0
+    assert list(third['理由']) == list(second['理由'])
+
+
+def test_async_staged_mode_records_stats(tmp_path):
+    from collections import Counter
+    from core import db
+
+    conn = db.init_db(tmp_path / 'cache.db')
+    df = pd.DataFrame({'名前': ['未知', '未知', '不明'], 'フリガナ': ['ミチ', 'ミチ', 'フメイ']})
+    stats = Counter()
+
+    async def staged(name, readings, stats, sudachi):
+        stats['stage1'] += 1
+        if name == '未知':
+            stats['early_exit'] += 1
+            return ['ミチ'], False
+        stats['stage2'] += 1
+        return ['フメイ', 'フミョウ'], True
+
+    with patch.object(scorer, 'CANDIDATE_MODE', 'staged'), patch(
+        'core.utils.parser.sudachi_reading', return_value=None
+    ), patch('core.utils.scorer.async_staged_candidates', side_effect=staged) as s_mock:
+        out = asyncio.run(utils.async_process_dataframe(
+            df, '名前', 'フリガナ', db_conn=conn, stats=stats
+        ))
+
+    assert list(out['信頼度']) == [85, 85, 85]
+    # readings are passed once per unique pair
+    assert s_mock.call_args_list[0].args[1] in (['ミチ'], ['フメイ'])
+    assert stats == {'stage1': 2, 'stage2': 1, 'early_exit': 1}
+    # only lists from every stage are cached for later readings
+    assert db.get_candidates('未知', conn, scorer.CACHE_VERSION) is None
+    assert db.get_candidates('不明', conn, scorer.CACHE_VERSION) == ['フメイ', 'フミョウ']
+
+
+def test_process_dataframe_thread_pool_matches_serial():
+    import threading
+    import time
+
+    names = [f'未知{i}' for i in range(8)]
+    df = pd.DataFrame({'名前': names * 2, 'フリガナ': ['ミチ', 'ミチコ'] * 8})
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def gpt(name, sudachi):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.02)
+        with lock:
+            active -= 1
+        return ['ミチコ', 'ミチ'] if name.endswith(('1', '3')) else ['ミチ']
+
+    with patch('core.utils.parser.sudachi_reading', return_value=None), patch(
+        'core.utils.scorer.gpt_candidates', side_effect=gpt
+    ) as g_mock:
+        serial = process_dataframe(df, '名前', 'フリガナ', batch_size=5)
+        assert peak == 1
+
+        async def inside_loop():
+            # asyncio.run is unavailable here; the thread pool still works
+            return process_dataframe(df, '名前', 'フリガナ', batch_size=5, concurrency=4)
+
+        pooled = asyncio.run(inside_loop())
+
+    assert g_mock.call_count == 16
+    assert peak > 1
+    pd.testing.assert_frame_equal(serial, pooled)
+
+
+def test_process_dataframe_output_modes():
+    df = pd.DataFrame({'名前': ['太郎', None, '花子'], 'フリガナ': ['タロウ', '', 'ハナコ']})
+
+    copied = process_dataframe(df, '名前', 'フリガナ')
+    assert copied['信頼度'].dtype == 'int8'
+    assert isinstance(copied['理由'].dtype, pd.CategoricalDtype)
+    assert list(copied['理由']) == ['辞書候補一致', '長すぎる', '辞書候補一致']
+    assert list(df.columns) == ['名前', 'フリガナ']
+
+    cols = process_dataframe(df, '名前', 'フリガナ', output='columns')
+    assert list(cols.columns) == ['信頼度', '理由']
+    assert list(cols.index) == list(df.index)
+
+    attached = process_dataframe(df, '名前', 'フリガナ', output='attach')
+    assert attached is df
+    pd.testing.assert_frame_equal(attached, copied)
+
+
+def test_process_dataframe_scores_each_pair_once():
+    df = pd.DataFrame({
+        '名前': ['未知', '未知', '未知', '不明', None, '未知', '不明'],
+        'フリガナ': ['ミチコ', 'ミチコ', 'ミチ', 'フメイ', None, 'ミチコ', 'フメイ'],
+    })
+    progress = []
+    with patch('core.utils.parser.sudachi_reading', return_value=None), patch(
+        'core.utils.scorer.gpt_candidates', return_value=['ミチコ']
+    ), patch(
+        'core.utils.scorer.calc_confidence', wraps=scorer.calc_confidence
+    ) as c_mock:
+        out = process_dataframe(
+            df, '名前', 'フリガナ', on_progress=lambda d, t: progress.append((d, t))
+        )
+
+    # (未知, ミチコ), (未知, ミチ) and (不明, フメイ); the empty name is not scored
+    assert c_mock.call_count == 3
+    assert list(out['信頼度']) == [85, 85, 0, 0, 0, 85, 0]
+    assert out['理由'][0] == out['理由'][1] == out['理由'][5]
+    assert out['理由'][4] == '長すぎる'
+    assert progress[-1] == (7, 7)
+
+
+def test_export_cache_joins_results_onto_full_source():
+    full = pd.DataFrame({'ID': [1, 2], '名前': ['太郎', '花子'], 'メモ': ['a', 'b']})
+    pruned = pd.DataFrame({
+        '名前': ['太郎', '花子'], '信頼度': [100, 0], '理由': ['辞書候補一致', 'x']
+    })
+    loads = []
+
+    def source():
+        loads.append(1)
+        return full.copy()
+
+    cache = utils.ExportCache('job-1', pruned, source=source)
+    out = pd.read_csv(BytesIO(cache.get('csv')))
+    assert list(out.columns) == ['ID', '名前', 'メモ', '信頼度', '理由']
+    assert list(out['信頼度']) == [100, 0]
+    back = pd.read_parquet(BytesIO(cache.get('parquet')))
+    assert list(back['メモ']) == ['a', 'b']
+    assert len(loads) == 1